@@ -1,4 +1,12 @@
 # __init__.py
-from .oracle import OracleInterpreter, OracleController, OracleGUI
+from .oracle import OracleInterpreter, OracleController
 
-__all__ = ["OracleInterpreter", "OracleController", "OracleGUI"]
\ No newline at end of file
+__all__ = ["OracleInterpreter", "OracleController", "OracleGUI"]
+
+
+def __getattr__(name):
+    # The GUI stack is only imported when OracleGUI is first accessed
+    if name == "OracleGUI":
+        from .oracle import OracleGUI
+        return OracleGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
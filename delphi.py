@@ -17,21 +17,472 @@ import os
 from datetime import datetime 
 import json
 from user import USER_THEMES
+from oracle_logwriter import SessionLogWriter
+from oracle_logindex import open_log
+from oracle_profile import profiler
+from oracle_output import OutputClassifier, NOISE, USER, ORACLE, WARNING
+from oracle_audio import get_default_audio
 import threading
 import subprocess
-import re
-from pygments import highlight
 from pygments.lexers import get_lexer_by_name
-from pygments.formatters import HtmlFormatter
+from pygments.styles import get_style_by_name
+from pygments.util import ClassNotFound
 import time
 import openai
 import anthropic
-import pygame
 import sys
 from io import StringIO
 import psutil
 import signal
 import queue
+import logging
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger("gui")
+
+# The conversation pane is redrawn at most once per frame, about 30 times a second
+UI_FRAME_MS = 33
+
+# With nothing animating and nothing queued, the frame timer slows down to this
+IDLE_FRAME_MS = 100
+
+# Lines the conversation pane keeps by default; older text is moved to the transcript in oracle_logs
+SCROLLBACK_LINES = 5000
+
+# The background is scaled to the window size rounded up to this many pixels, so nearby sizes share an image
+BACKGROUND_SIZE_BUCKET = 32
+
+# The window has to keep the same size this long before the background is rescaled properly
+BACKGROUND_SETTLE_MS = 150
+
+# Properly scaled backgrounds kept for reuse
+BACKGROUND_CACHE_SIZE = 6
+
+# The Pygments style code blocks are colored with (a light one, to suit the 'code' tag's background)
+HIGHLIGHT_STYLE = "colorful"
+
+# The most milliseconds of a frame spent highlighting; bigger blocks are finished over several frames
+HIGHLIGHT_SLICE_MS = 8
+
+# What the status label shows for each backend state (see oracle_backend)
+BACKEND_STATUS_LABELS = {
+    "starting": ("Starting", "orange"),
+    "ready": ("Inactive", "red"),
+    "busy": ("Active", "green"),
+    "paused": ("Paused", "orange"),
+    "restarting": ("Restarting", "orange"),
+    "failed": ("Backend down", "red"),
+    "stopped": ("Stopped", "red")
+}
+
+# Frame by frame, like the old Moviola
+class Animator:
+    """
+    Drives the GUI's per-frame work and animations from a single root.after timer on the Tk thread.
+
+    An animation is a generator: each time it is resumed it makes one step of changes to its widgets and yields
+    how many milliseconds to wait before its next step (0 for the next frame). It ends by returning, or when it
+    is stopped, which closes the generator so its finally block can put the widgets back. Animations are held
+    while the window is minimized or withdrawn. Frame callbacks (such as draining the UI queue) run every frame
+    regardless, and return True when they had something to do.
+
+    Only the Tk thread may call start and stop; other threads go through OracleGUI.post_call.
+
+    Attributes:
+        root (tk.Tk): The window whose event loop runs the timer.
+        frame_ms (int): Milliseconds between frames while there is work.
+        idle_ms (int): Milliseconds between frames while there is none.
+        animations (dict): Running animations: name -> [generator, when its next step is due].
+        frame_callbacks (list): Functions called every frame.
+    """
+
+    def __init__(self, root, frame_ms=UI_FRAME_MS, idle_ms=IDLE_FRAME_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.idle_ms = idle_ms
+        self.animations = {}
+        self.frame_callbacks = []
+        self.after_id = None
+        self.closed = False
+
+    def start_timer(self):
+        """
+        Start ticking. Call once, from the Tk thread.
+        """
+        if self.after_id is None and not self.closed:
+            self.after_id = self.root.after(self.frame_ms, self.tick)
+
+    def add_frame_callback(self, function):
+        self.frame_callbacks.append(function)
+
+    def start(self, name, generator):
+        """
+        Start an animation, replacing any running under the same name. Its first step runs on the next frame.
+
+        Args:
+            name (str): The animation's name, such as "floodgauge".
+            generator: The animation's generator.
+        """
+        self.stop(name)
+        self.animations[name] = [generator, 0.0]
+
+    def stop(self, name):
+        """
+        Stop an animation, if it is running.
+        """
+        entry = self.animations.pop(name, None)
+        if entry is not None:
+            entry[0].close()
+
+    def running(self, name):
+        return name in self.animations
+
+    def visible(self):
+        try:
+            return self.root.state() not in ("iconic", "withdrawn")
+        except tk.TclError:
+            return False
+
+    def tick(self):
+        """
+        Run one frame: the frame callbacks, then every animation step that is due.
+        """
+        busy = False
+        try:
+            for function in self.frame_callbacks:
+                busy = bool(function()) or busy
+
+            if self.animations and self.visible():
+                busy = True
+                now = time.monotonic()
+                for name, entry in list(self.animations.items()):
+                    if now < entry[1] or self.animations.get(name) is not entry:
+                        continue
+                    try:
+                        delay = next(entry[0])
+                    except StopIteration:
+                        self.animations.pop(name, None)
+                        continue
+                    except Exception:
+                        # A broken animation mustn't take the timer (and the UI queue) down with it
+                        logger.exception(f"Animation '{name}' failed")
+                        self.animations.pop(name, None)
+                        continue
+                    entry[1] = now + (delay or 0) / 1000
+        finally:
+            if not self.closed:
+                self.after_id = self.root.after(self.frame_ms if busy else self.idle_ms, self.tick)
+
+    def close(self):
+        """
+        Stop the timer and every animation.
+        """
+        self.closed = True
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except tk.TclError:
+                pass
+        for name in list(self.animations):
+            self.stop(name)
+
+
+# Mirror, mirror on the wall
+class BackgroundRenderer:
+    """
+    Scales the background image to the window without holding up the Tk thread.
+
+    The source is downsampled once at load, to no bigger than the screen. Resize events only record the new
+    size; an animation picks up the latest one each frame and shows a quick nearest-neighbour scaling (a few
+    milliseconds, where LANCZOS takes tens). Once the size has held for BACKGROUND_SETTLE_MS, the LANCZOS scaling of
+    the source is made on a worker thread and swapped in. Sizes are rounded up to BACKGROUND_SIZE_BUCKET
+    pixels (the canvas crops the rest), and the last BACKGROUND_CACHE_SIZE proper scalings are kept, so
+    resizing back and forth reuses them.
+
+    Attributes:
+        source (PIL.Image.Image): The downsampled source image.
+        cache (OrderedDict): (width, height) -> ImageTk.PhotoImage of the LANCZOS scalings, least recent first.
+        photo (ImageTk.PhotoImage): The image on the canvas (kept referenced so Tk doesn't drop it).
+    """
+
+    def __init__(self, canvas, animator, path, max_size):
+        self.canvas = canvas
+        self.animator = animator
+
+        image = Image.open(path)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.thumbnail(max_size, Image.LANCZOS)
+        self.source = image
+
+        self.cache = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background-scaler")
+        self.size = None
+        self.requested_at = 0.0
+        self.shown = None
+
+        self.photo = ImageTk.PhotoImage(self.source)
+        self.item = self.canvas.create_image(0, 0, image=self.photo, anchor='nw')
+
+    def request(self, width, height):
+        """
+        Note a new window size; the background catches up on the next frame.
+        """
+        if width < 2 or height < 2:
+            return
+        bucket = BACKGROUND_SIZE_BUCKET
+        self.size = (-(-width // bucket) * bucket, -(-height // bucket) * bucket)
+        self.requested_at = time.monotonic()
+        if not self.animator.running("background"):
+            self.animator.start("background", self.frames())
+
+    def show(self, photo, key):
+        self.photo = photo
+        self.shown = key
+        self.canvas.itemconfigure(self.item, image=photo)
+        self.canvas.tag_lower(self.item)
+
+    def frames(self):
+        """
+        The background animation: quick passes while the size changes, then the proper scaling once it settles.
+        """
+        job = None
+        while True:
+            size = self.size
+            if size in self.cache:
+                self.cache.move_to_end(size)
+                if self.shown != (size, "high"):
+                    self.show(self.cache[size], (size, "high"))
+                return
+
+            if self.shown != (size, "fast"):
+                self.show(ImageTk.PhotoImage(self.source.resize(size, Image.NEAREST)), (size, "fast"))
+
+            if job is not None and job[0] != size:
+                # The window moved on; let the worker finish and forget the result
+                job[1].cancel()
+                job = None
+            if job is None and time.monotonic() - self.requested_at >= BACKGROUND_SETTLE_MS / 1000:
+                job = (size, self.executor.submit(self.source.resize, size, Image.LANCZOS))
+            if job is not None and job[1].done():
+                self.cache[size] = ImageTk.PhotoImage(job[1].result())
+                while len(self.cache) > BACKGROUND_CACHE_SIZE:
+                    self.cache.popitem(last=False)
+                job = None
+                continue
+            yield 0
+
+    def close(self):
+        self.animator.stop("background")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Fences make good neighbours
+class FenceSplitter:
+    """
+    Splits streamed Markdown into prose and fenced code blocks, so code can be tagged for highlighting.
+
+    Text may arrive in pieces of any size; a line that might turn out to be a fence is held back until its end
+    arrives. Code inside a block is tagged ('code', 'lang:<language>'), the fence lines ('code',), and prose
+    with the tags it was given.
+
+    Attributes:
+        language (str): The language of the open block, or None outside a block.
+    """
+
+    def __init__(self):
+        self.language = None
+        self.line_start = True
+        self.pending = ""
+
+    def split(self, text, tags=()):
+        """
+        Split the next piece of the stream.
+
+        Args:
+            text (str): The piece.
+            tags (tuple): The tags for prose.
+
+        Returns:
+            list: (text, tags) segments, in order.
+        """
+        text = self.pending + text
+        self.pending = ""
+        segments = []
+        position = 0
+        while position < len(text):
+            end = text.find("\n", position)
+            line = text[position:] if end < 0 else text[position:end + 1]
+            if self.line_start:
+                stripped = line.lstrip()
+                if end < 0 and (stripped.startswith("```") or "```".startswith(stripped)):
+                    # Can't tell yet whether this line is a fence
+                    self.pending = line
+                    break
+                if stripped.startswith("```"):
+                    self.language = None if self.language is not None else (stripped[3:].strip() or "text")
+                    segments.append((line, ('code',)))
+                    position += len(line)
+                    continue
+            if self.language is not None:
+                segments.append((line, ('code', f"lang:{self.language}")))
+            else:
+                segments.append((line, tags))
+            self.line_start = end >= 0
+            position += len(line)
+        return segments
+
+    def flush(self, tags=()):
+        """
+        Return whatever is held back, at the end of the stream, and start over.
+        """
+        segments = [(self.pending, tags)] if self.pending else []
+        self.__init__()
+        return segments
+
+
+class CodeHighlighter:
+    """
+    Colors code blocks in a Text widget with Tk tags, as their lines stream in.
+
+    Each Pygments token type of HIGHLIGHT_STYLE gets a preconfigured tag, and lexers are cached per language.
+    Code is lexed a run of complete lines at a time, as they arrive (so a construct spanning two runs, such as a
+    long string, can be colored as if it started afresh), on an animation that spends at most
+    HIGHLIGHT_SLICE_MS of each frame on it, so a huge block is colored over several frames instead of freezing
+    the window. Blocks are tracked by a Text mark at their start.
+
+    Attributes:
+        text (tk.Text): The widget.
+        lexers (dict): Language -> lexer, or None for languages Pygments doesn't know.
+        blocks (list): Blocks with text still to color, oldest first; only the last may still be growing.
+    """
+
+    def __init__(self, text, animator, style=HIGHLIGHT_STYLE):
+        self.text = text
+        self.animator = animator
+        self.lexers = {}
+        self.blocks = []
+        self.count = 0
+
+        # One tag per styled token type; a type without a style of its own takes its parent's
+        self.token_tags = {}
+        for token_type, token_style in get_style_by_name(style):
+            options = {}
+            if token_style["color"]:
+                options["foreground"] = "#" + token_style["color"]
+            if token_style["bold"] or token_style["italic"]:
+                options["font"] = ("Courier", 10, " ".join(word for word in ("bold", "italic") if token_style[word]))
+            if options:
+                tag = f"pyg:{token_type}"
+                self.text.tag_configure(tag, **options)
+                self.token_tags[token_type] = tag
+        self.tag_cache = {}
+
+        # Most blocks are Python; have its lexer (and its compiled rules) ready before the first one
+        self.lexer("python")
+
+    def lexer(self, language):
+        if language not in self.lexers:
+            try:
+                self.lexers[language] = get_lexer_by_name(language)
+            except ClassNotFound:
+                self.lexers[language] = None
+        return self.lexers[language]
+
+    def tag_for(self, token_type):
+        if token_type not in self.tag_cache:
+            tag = None
+            parent = token_type
+            while parent is not None and tag is None:
+                tag = self.token_tags.get(parent)
+                parent = parent.parent
+            self.tag_cache[token_type] = tag
+        return self.tag_cache[token_type]
+
+    def feed(self, index, code, language):
+        """
+        Note code just inserted at index; it is colored over the next frames.
+
+        Args:
+            index (str): Where the code starts in the widget.
+            code (str): The code.
+            language (str): Its language, from the block's fence.
+        """
+        block = self.blocks[-1] if self.blocks and not self.blocks[-1]["closed"] else None
+        if block is None or block["language"] != language:
+            self.close_block()
+            lexer = self.lexer(language)
+            if lexer is None:
+                return
+            self.count += 1
+            mark = f"code_block_{self.count}"
+            self.text.mark_set(mark, index)
+            self.text.mark_gravity(mark, "left")
+            column = int(index.split(".")[1])
+            block = {"mark": mark, "language": language, "lexer": lexer, "code": "", "lexed": 0, "line": 0, "column": column, "closed": False}
+            self.blocks.append(block)
+        block["code"] += code
+        if not self.animator.running("highlight"):
+            self.animator.start("highlight", self.frames())
+
+    def close_block(self):
+        """
+        Mark the growing block, if any, as finished, so its last line is colored too.
+        """
+        if self.blocks and not self.blocks[-1]["closed"]:
+            self.blocks[-1]["closed"] = True
+            if not self.animator.running("highlight"):
+                self.animator.start("highlight", self.frames())
+
+    def forget_before(self, index):
+        """
+        Drop the blocks that start before index, which is about to be deleted.
+        """
+        for block in list(self.blocks):
+            if self.text.compare(block["mark"], "<", index):
+                self.drop(block)
+
+    def drop(self, block):
+        if block in self.blocks:
+            self.blocks.remove(block)
+            self.text.mark_unset(block["mark"])
+
+    def frames(self):
+        """
+        The highlighting animation: color what has arrived, a slice of each frame at a time.
+        """
+        while self.blocks:
+            deadline = time.perf_counter() + HIGHLIGHT_SLICE_MS / 1000
+            block = self.blocks[0]
+            end = len(block["code"]) if block["closed"] else block["code"].rfind("\n") + 1
+            if end <= block["lexed"]:
+                if not block["closed"]:
+                    # Waiting for the rest of the line; feed starts the animation again
+                    return
+                self.drop(block)
+                continue
+
+            tokens = block["lexer"].get_tokens_unprocessed(block["code"][block["lexed"]:end])
+            line, column = block["line"], block["column"]
+            top = int(self.text.index(block["mark"]).split(".")[0])
+            for _, token_type, value in tokens:
+                tag = self.tag_for(token_type)
+                newlines = value.count("\n")
+                end_line = line + newlines
+                end_column = column + len(value) if not newlines else len(value) - value.rfind("\n") - 1
+                if tag is not None and value.strip():
+                    self.text.tag_add(tag, f"{top + line}.{column}", f"{top + end_line}.{end_column}")
+                line, column = end_line, end_column
+                if time.perf_counter() > deadline:
+                    yield 0
+                    if block not in self.blocks:
+                        break
+                    # The block may have moved up meanwhile, as the scrollback was trimmed
+                    top = int(self.text.index(block["mark"]).split(".")[0])
+                    deadline = time.perf_counter() + HIGHLIGHT_SLICE_MS / 1000
+            block["lexed"], block["line"], block["column"] = end, line, column
 
 
 # Its serving graphics:
@@ -47,8 +498,10 @@ class OracleGUI:
         controller (OracleController): An instance of the OracleController class.
         root (tk.Tk): The main window of the GUI.
         canvas (tk.Canvas): The canvas widget for displaying the background image.
-        bg_photo (ImageTk.PhotoImage): The background image for the GUI.
+        background (BackgroundRenderer): Scales the background image to the canvas.
         conversation_text (tk.Text): The text widget for displaying the conversation.
+        highlighter (CodeHighlighter): Colors the code blocks in conversation_text.
+        output_classifier (OutputClassifier): Sorts the terminal output lines, with a count of each class.
         user_input (tk.Entry): The entry widget for user input.
         temperature_meter (ttkbootstrap.Meter): The meter widget for adjusting the temperature setting.
         max_tokens_meter (ttkbootstrap.Meter): The meter widget for adjusting the max_tokens setting.
@@ -57,10 +510,11 @@ class OracleGUI:
         processing_label (ttkbootstrap.Label): The label for indicating processing status.
         floodgauge (ttkbootstrap.Floodgauge): The floodgauge widget for displaying processing progress.
         status_label (ttkbootstrap.Label): The label for displaying the status.
-        terminal_output (str): The variable for storing the terminal output.
-        terminal_thread (threading.Thread): The thread for capturing terminal output.
-        floodgauge_animation_thread (threading.Thread): The thread for animating the floodgauge.
-        floodgauge_animation_running (bool): The flag for indicating if the floodgauge animation is running.
+        terminal_fences (FenceSplitter): Follows the code fences in the backend's printed output.
+        animator (Animator): Runs the UI queue and the floodgauge and window animations on the Tk thread.
+        ui_queue (collections.deque): Text and calls bound for the Tk thread, drained once per frame.
+        scrollback_lines (int): The most lines the conversation text widget keeps.
+        transcript (SessionLogWriter): Where text trimmed from the conversation text widget is kept.
     """
    
     def __init__(self, oracle_interpreter, controller, queue):
@@ -81,8 +535,17 @@ class OracleGUI:
         # GUI Terminal Lock killswitch flag
         self.stop_event = threading.Event()
         
-        # Initialize the session log file
-        self.session_log_file = self.create_session_log_file()
+        # Initialize the session log writer
+        self.session_log = self.create_session_log_file()
+
+        # Every thread hands its output for the conversation pane to this queue instead of touching Tk; the
+        # Tk thread inserts whatever has piled up once per frame. Text scrolled out of the pane goes to the transcript.
+        self.ui_queue = deque()
+        self.scrollback_lines = getattr(self.oracle_interpreter, "gui_scrollback_lines", SCROLLBACK_LINES)
+        self.transcript = SessionLogWriter("transcript", "oracle_logs")
+
+        # The controller's classifier sorts the backend's lines into user, oracle, code, console, warning and noise
+        self.output_classifier = self.controller.classifier
 
         # Create a new style
         app = Style(theme='nightcity')
@@ -90,6 +553,17 @@ class OracleGUI:
 
         # Create the Boolean for enabling the OS+Browser functions
         self.llm_web_browser_enabled = tk.BooleanVar(value=False)
+
+        # And for profiling each turn (already on if the terminal was started with --profile)
+        self.profiling_enabled = tk.BooleanVar(value=profiler.enabled)
+
+        # Sound effects and music play on the audio thread, which starts the mixer and decodes the effects now,
+        # in the background, so the first provider switch doesn't wait for them
+        self.audio = get_default_audio()
+        self.music_path = getattr(self.oracle_interpreter, "background_music", None)
+        self.music_enabled = tk.BooleanVar(value=bool(self.music_path))
+        if self.music_path:
+            self.audio.play_music(self.music_path)
         
         self.root.wm_deiconify()
         self.root.title("Oracle Interpreter Control Panel")
@@ -99,12 +573,13 @@ class OracleGUI:
         self.athenium_directory = "Athenium"
         self.acheron_directory = "Acheron"
         
+        # One timer on the Tk thread drains the UI queue and runs the animations; it starts once the widgets exist
+        self.animator = Animator(self.root)
         
         
         
         # Set the background image
         bg_image_path = "oracle_background.png"
-        self.bg_image = Image.open(bg_image_path)
 
 
         # Set the window icon
@@ -116,8 +591,7 @@ class OracleGUI:
         self.canvas = tk.Canvas(self.root, width=1150, height=900)
         self.canvas.pack(fill='both', expand=True)
 
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
-        self.canvas.create_image(0, 0, image=self.bg_photo, anchor='nw')
+        self.background = BackgroundRenderer(self.canvas, self.animator, bg_image_path, (self.root.winfo_screenwidth(), self.root.winfo_screenheight()))
 
 
         # Bind the resize event to update the background image
@@ -229,7 +703,10 @@ class OracleGUI:
         self.conversation_text = Text(conversation_frame, wrap='word', width=60, height=20)
         self.conversation_text.pack(side='left', fill='both', expand=True)
         self.conversation_text.tag_configure('output', foreground='blue')
+        self.conversation_text.tag_configure('warning', foreground='dark orange')
         self.conversation_text.tag_configure('code', background='#f0f0f0', font=('Courier', 10))
+        self.highlighter = CodeHighlighter(self.conversation_text, self.animator)
+        self.response_fences = FenceSplitter()
 
         # Create a scrollbar for the conversation text widget
         scrollbar = Scrollbar(conversation_frame)
@@ -271,6 +748,30 @@ class OracleGUI:
         )
         self.llm_web_browser_toggle.pack(pady=10)
 
+        # Create the profiling toggle button
+        profiling_label = Label(settings_frame, text="Profile Turns (oracle_logs/profiles):")
+        profiling_label.pack(pady=10)
+
+        self.profiling_toggle = Checkbutton(
+            settings_frame,
+            variable=self.profiling_enabled,
+            command=self.toggle_profiling,
+            bootstyle="success-round-toggle"
+        )
+        self.profiling_toggle.pack(pady=10)
+
+        # Create the background music toggle button
+        music_label = Label(settings_frame, text="Background Music:")
+        music_label.pack(pady=10)
+
+        self.music_toggle = Checkbutton(
+            settings_frame,
+            variable=self.music_enabled,
+            command=self.toggle_music,
+            bootstyle="success-round-toggle"
+        )
+        self.music_toggle.pack(pady=10)
+
         # Create the temperature label and meter
         temperature_label = Label(settings_frame, text="Temperature:", bootstyle="info")
         temperature_label.pack(pady=10)
@@ -373,15 +874,14 @@ class OracleGUI:
         self.status_label = Label(floodgauge_frame, text="Inactive", foreground="red")
         self.status_label.pack(side=TOP)
 
-        # Initialize the terminal output and thread
-        self.terminal_output = ""
-        self.terminal_thread = threading.Thread(target=self.capture_terminal_output)
-        self.terminal_thread.daemon = True
-        self.terminal_thread.start()
+        # Start the frame timer
+        self.animator.add_frame_callback(self.drain_ui_queue)
+        self.animator.start_timer()
 
-        # Initialize the Floodgauge animation variables
-        self.floodgauge_animation_thread = None
-        self.floodgauge_animation_running = False
+        # Turns run in the controller's backend process; its printed output and status changes arrive as events
+        self.terminal_fences = FenceSplitter()
+        self.controller.backend.subscribe(self.handle_backend_event)
+        self.controller.start(self.oracle_interpreter)
 
 
 
@@ -401,9 +901,36 @@ class OracleGUI:
         
         # Update the system message to reflect the current state of the feature
         self.oracle_interpreter.update_system_message()
+        self.controller.sync(self.oracle_interpreter)
     
+    def toggle_profiling(self):
+        """
+        Turn per-turn stage profiling on or off, here and in the backend process that runs the turns. Turns
+        captured with cProfile or tracemalloc when the terminal was started with --profile cpu, memory or full
+        keep doing so.
+        """
+        if self.profiling_enabled.get():
+            profiler.enable()
+        else:
+            profiler.disable()
+        self.controller.sync(self.oracle_interpreter)
+
+    def toggle_music(self):
+        """
+        Start or stop the background music, asking for a file the first time if the terminal wasn't started with --music.
+        """
+        if not self.music_enabled.get():
+            self.audio.stop_music()
+            return
+        if not self.music_path:
+            self.music_path = filedialog.askopenfilename(title="Background Music", filetypes=[("Audio", "*.mp3 *.ogg *.wav"), ("All files", "*.*")])
+            if not self.music_path:
+                self.music_enabled.set(False)
+                return
+        self.audio.play_music(self.music_path)
+
     def save_conversation(self):
-        conversation = self.conversation_text.get("1.0", tk.END).strip()
+        conversation = (self.read_transcript() + self.conversation_text.get("1.0", tk.END)).strip()
         conversation_pairs = self.extract_conversation_pairs(conversation)
 
         if conversation_pairs:
@@ -447,12 +974,42 @@ class OracleGUI:
         return pairs
 
     def create_session_log_file(self):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        logs_folder = "oracle_logs"
-        os.makedirs(logs_folder, exist_ok=True)
+        """
+        Start the background writer for this GUI session's log in oracle_logs.
 
-        log_file = os.path.join(logs_folder, f"session_{timestamp}.jsonl")
-        return log_file
+        Returns:
+            SessionLogWriter: The writer; its file is created when the first message is logged.
+        """
+        return SessionLogWriter("session", "oracle_logs")
+
+    def read_transcript(self):
+        """
+        Read back the text trimmed from the conversation text widget this session.
+
+        Returns:
+            str: The trimmed text, oldest first.
+        """
+        if not self.transcript.closed:
+            self.transcript.flush(5)
+        paths = list(self.transcript.segments)
+        if self.transcript.file is not None:
+            paths.append(self.transcript.path)
+
+        text = []
+        for path in paths:
+            # A rotated segment may still be being compressed
+            if not os.path.exists(path) and path.endswith((".gz", ".xz")):
+                path = path[:-3]
+            try:
+                with open_log(path) as f:
+                    for line in f:
+                        try:
+                            text.append(json.loads(line)["text"])
+                        except (ValueError, KeyError):
+                            continue
+            except OSError:
+                continue
+        return "".join(text)
 
     def confirm_api_change(self):
         """
@@ -479,6 +1036,7 @@ class OracleGUI:
             normalized_temperature = temperature * 0.9 + 0.1
             self.oracle_interpreter.interpreter.llm.temperature = normalized_temperature
             self.oracle_interpreter.interpreter.llm.max_tokens = min(max(max_tokens, 1), 8192)
+        self.controller.sync(self.oracle_interpreter)
 
 
     def resize_background_image(self, event):
@@ -488,40 +1046,32 @@ class OracleGUI:
         Args:
             event (tkinter.Event): The event object containing information about the resize event.
         """
-        window_width = event.width
-        window_height = event.height
-
-        resized_bg_image = self.bg_image.resize((window_width, window_height), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(resized_bg_image)
-
-        self.canvas.delete('all')
-        self.canvas.create_image(0, 0, image=self.bg_photo, anchor='nw')
+        self.background.request(event.width, event.height)
     
     # Broken    
     def flash_window(self):
         """
         Flash the window with a green color to indicate a successful action.
         """
+        self.animator.start("flash_window", self.flash_window_frames())
+
+    def flash_window_frames(self):
         original_color = self.root.cget('bg')
-        self.root.configure(bg='#80ff80')
-        self.root.update()
-        time.sleep(0.3)
-        self.root.configure(bg=original_color)
-        self.root.update()
+        try:
+            self.root.configure(bg='#80ff80')
+            yield 300
+        finally:
+            self.root.configure(bg=original_color)
     
     
     # The world is veiled in darkness.
     # The wind stops, the sea is wild, the earth begins to rot.
     # The people wait, their only hope, a prophecy...
-    def play_sound_effect(self):
+    def play_sound_effect(self, name="confirm"):
         """
-        Play a sound effect using Pygame.
+        Play a sound effect (decoded at startup) without waiting for it.
         """
-        pygame.mixer.init()
-        sound_file = "se_1.mp3"
-        sound_path = os.path.join(os.path.dirname(__file__), sound_file)
-        sound = pygame.mixer.Sound(sound_path)
-        sound.play()
+        self.audio.play_effect(name)
 
 
     def send_command(self, event=None):
@@ -533,7 +1083,7 @@ class OracleGUI:
         """
         command = self.user_input.get()
         self.user_input.delete(0, 'end')
-        self.conversation_text.insert('end', "User: " + command + '\n')
+        self.post_text("User: " + command + '\n')
 
         threading.Thread(target=self.process_command, args=(command,)).start()
 
@@ -542,9 +1092,15 @@ class OracleGUI:
         """
         Stop the Oracle Interpreter and close the GUI.
         """
+        self.stop_event.set()  # Set the stop event so backend events are no longer shown
+        self.controller.backend.unsubscribe(self.handle_backend_event)
         self.controller.stop()
         self.queue.put("GUI closed")
-        self.stop_event.set()  # Set the stop event to signal the capture_terminal_output thread to stop
+        self.animator.close()
+        self.background.close()
+        self.audio.stop_music(fade_ms=0)
+        self.session_log.close()  # Write out and close the session log
+        self.transcript.close()
         self.root.quit()
         self.root.destroy()
             
@@ -562,7 +1118,7 @@ class OracleGUI:
         Start or resume the Oracle Interpreter.
         """
         if self.controller.process is None:
-            self.controller.start()
+            self.controller.start(self.oracle_interpreter)
         else:
             self.controller.resume()
 
@@ -635,15 +1191,55 @@ class OracleGUI:
                 self.oracle_interpreter.interpreter.llm.model_name = self.oracle_interpreter.ANTHROPIC_MODEL_NAME
             elif provider == "Anthropic-Haiku":
                 self.oracle_interpreter.interpreter.llm.model_name = self.oracle_interpreter.ANTHROPIC_MODEL_NAME_HAIKU
+            self.controller.sync(self.oracle_interpreter)
         else:
             self.start_floodgauge_animation()  # Start the Floodgauge animation
-            self.update_status_label("Active", "green")  # Update status label to "Active" in green
-            response = self.oracle_interpreter.chat(command)
-            self.stop_floodgauge_animation()  # Stop the Floodgauge animation
-            self.update_status_label("Inactive", "red")  # Update status label to "Inactive" in red
-            self.conversation_text.insert('end', "Oracle: " + response + '\n')
-            self.conversation_text.see('end')
-            self.root.update()
+            self.post_call(self.update_status_label, "Active", "green")  # Update status label to "Active" in green
+            self.post_text("Oracle: ")
+            response_parts = []
+            try:
+                with profiler.turn(command) as turn:
+                    # The turn runs in the backend process; if that is down, it runs here instead
+                    backend = self.controller.backend
+                    chunks = backend.chat(command) if backend.available else self.oracle_interpreter.chat_stream(command)
+
+                    # Append the response to the conversation as it streams in
+                    for chunk in chunks:
+                        self.append_response_chunk(chunk)
+                        response_parts.append(chunk["content"])
+
+                    # The chunks are inserted on the Tk thread; let it catch up so they count towards this turn
+                    if turn is not None:
+                        inserted = threading.Event()
+                        self.post_call(inserted.set)
+                        inserted.wait(5)
+            finally:
+                self.stop_floodgauge_animation()  # Stop the Floodgauge animation
+                self.post_call(self.update_status_label, "Inactive", "red")  # Update status label to "Inactive" in red
+                for text, tags in self.response_fences.flush():
+                    self.post_text(text, tags)
+                self.post_text('\n')
+                self.log_conversation([{"role": "user", "content": command}, {"role": "assistant", "content": "".join(response_parts).strip()}])
+
+
+    def append_response_chunk(self, chunk):
+        """
+        Queue one streamed response chunk for the conversation text widget.
+
+        Fenced code, in the prose or in code chunks, is shown with the 'code' tag and highlighted; console
+        output and execution results are shown with the 'output' tag, and errors with the 'warning' tag.
+
+        Args:
+            chunk (dict): A chunk from OracleInterpreter.chat_stream.
+        """
+        if chunk["type"] in ("console", "execution_result"):
+            self.post_text(chunk["content"], ('output',))
+            return
+        if chunk["type"] == "error":
+            self.post_text(chunk["content"], ('warning',))
+            return
+        for text, tags in self.response_fences.split(chunk["content"]):
+            self.post_text(text, tags)
 
 
     def update_status_label(self, text, color):
@@ -658,55 +1254,162 @@ class OracleGUI:
         
 
     
-    def update_conversation_text(self, formatted_output):
-        self.conversation_text.insert('end', formatted_output)
-        self.conversation_text.see('end')
-       
-        
-    # My dear Dr. Moog, call that a patch cable
-    def capture_terminal_output(self):
+    def post_text(self, text, tags=()):
         """
-        Capture the terminal output from the Oracle Interpreter and display it in the conversation text widget.
+        Queue text for the conversation text widget. Safe to call from any thread.
+
+        Args:
+            text (str): The text to append.
+            tags (tuple): The text widget tags to show it with.
         """
-        process = subprocess.Popen(["python", "oracle.py"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
+        self.ui_queue.append((text, tags))
 
-        conversation_buffer = []
-        user_message = ""
-        bot_response = ""
+    def post_call(self, function, *args):
+        """
+        Queue a call to run on the Tk thread, after the text queued before the next frame is inserted.
 
-        while not self.stop_event.is_set():
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                if not self.is_unwanted_message(output):
-                    if output.startswith("User: "):
-                        user_message = output[6:].strip()
-                        conversation_buffer.append({"role": "user", "content": user_message})
-                    elif output.startswith("Oracle: "):
-                        bot_response += output[8:].strip() + "\n"
-                    else:
-                        bot_response += output.strip() + "\n"
-
-                    formatted_output = self.format_output(output)
-                    self.root.after(0, self.update_conversation_text, formatted_output)
+        Args:
+            function (callable): The function, such as a widget update.
+            *args: Its arguments.
+        """
+        self.ui_queue.append((function, args))
+
+    def drain_ui_queue(self):
+        """
+        Insert all the text queued since the last frame in one go and run the queued calls.
+
+        Consecutive pieces with the same tags are joined, so a frame is one insert and one scroll however many
+        lines or chunks arrived. If a frame brings more lines than the scrollback holds, the ones that would
+        scroll straight out of view go to the transcript without being inserted.
 
+        Returns:
+            bool: True if there was anything to do.
+        """
+        runs = []
+        calls = []
+        # Only what was queued before this frame; anything arriving meanwhile waits for the next one
+        for _ in range(len(self.ui_queue)):
+            item, extra = self.ui_queue.popleft()
+            if callable(item):
+                calls.append((item, extra))
+            elif runs and runs[-1][1] == extra:
+                runs[-1][0].append(item)
             else:
-                if user_message and bot_response:
-                    conversation_buffer.append({"role": "assistant", "content": bot_response.strip()})
-                    self.log_conversation(conversation_buffer)
-                    user_message = ""
-                    bot_response = ""
-                    conversation_buffer = []
-                time.sleep(0.1)
+                runs.append(([item], extra))
+
+        if runs:
+            with profiler.stage("gui_insert"):
+                texts = ["".join(pieces) for pieces, _ in runs]
+                tags = [run_tags for _, run_tags in runs]
+                if sum(text.count("\n") for text in texts) > self.scrollback_lines:
+                    texts, tags = self.skip_overflow(texts, tags)
+
+                arguments = []
+                for text, run_tags in zip(texts, tags):
+                    arguments += [text, run_tags]
+                line, column = map(int, self.conversation_text.index('end-1c').split('.'))
+                self.conversation_text.insert('end', *arguments)
+
+                # Hand the code to the highlighter, with where each run landed
+                for text, run_tags in zip(texts, tags):
+                    language = next((tag[5:] for tag in run_tags if tag.startswith("lang:")), None)
+                    if language is not None:
+                        self.highlighter.feed(f"{line}.{column}", text, language)
+                    elif text:
+                        self.highlighter.close_block()
+                    newlines = text.count("\n")
+                    column = column + len(text) if not newlines else len(text) - text.rfind("\n") - 1
+                    line += newlines
+
+                self.conversation_text.see('end')
+                self.trim_scrollback()
+
+        for function, args in calls:
+            function(*args)
+        return bool(runs or calls)
+
+    def skip_overflow(self, texts, tags):
+        """
+        Send everything in the widget, and all but the last scrollback_lines lines of a frame's text, to the transcript.
+
+        Args:
+            texts (list): The frame's text, one string per run of tags.
+            tags (list): The tags of each run.
+
+        Returns:
+            tuple: The texts and tags that are left to insert.
+        """
+        self.trim_scrollback(keep=0)
+        remaining = self.scrollback_lines
+        for index in range(len(texts) - 1, -1, -1):
+            text = texts[index]
+            count = text.count("\n")
+            if count < remaining:
+                remaining -= count
+                continue
+            # Keep the part of this run after its last `remaining` line breaks but one
+            cut = len(text)
+            for _ in range(remaining + 1):
+                cut = text.rfind("\n", 0, cut)
+            skipped = "".join(texts[:index]) + text[:cut + 1]
+            if skipped and not self.transcript.closed:
+                self.transcript.write({"timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"), "text": skipped})
+            return [text[cut + 1:]] + texts[index + 1:], tags[index:]
+        return texts, tags
+
+    def trim_scrollback(self, keep=None):
+        """
+        Move the oldest lines of the conversation text widget to the transcript.
+
+        Args:
+            keep (int, optional): The lines to keep. Defaults to scrollback_lines, and then trims only once the
+                widget has grown a tenth past it, so the trimming happens in chunks rather than every frame.
+        """
+        lines = int(self.conversation_text.index('end-1c').split('.')[0])
+        if keep is None:
+            if lines <= self.scrollback_lines + self.scrollback_lines // 10:
+                return
+            keep = self.scrollback_lines
+        if lines <= keep:
+            return
+        cut = f"{lines - keep + 1}.0"
+        self.highlighter.forget_before(cut)
+        trimmed = self.conversation_text.get('1.0', cut)
+        self.conversation_text.delete('1.0', cut)
+        if trimmed.strip() and not self.transcript.closed:
+            self.transcript.write({"timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"), "text": trimmed})
 
-        self.root.after(0, self.update_status_label, "Inactive", "red")  # Update status label to "Inactive" in red
+        
+    # My dear Dr. Moog, call that a patch cable
+    def handle_backend_event(self, event):
+        """
+        Show what the backend prints in the conversation text widget, and its status in the status label.
+        Called on the controller's receiving thread with every backend event.
+
+        Args:
+            event (dict): The event (see oracle_backend).
+        """
+        if self.stop_event.is_set():
+            return
+        if event["type"] == "log":
+            line = event["content"] + "\n"
+            kind = self.output_classifier.classify(line)
+            if kind != NOISE:
+                for text, tags in self.terminal_fences.split(self.format_output(line, kind), ('warning',) if kind == WARNING else ()):
+                    self.post_text(text, tags)
+        elif event["type"] == "status":
+            state = event["state"]
+            if state in BACKEND_STATUS_LABELS:
+                self.post_call(self.update_status_label, *BACKEND_STATUS_LABELS[state])
+            if event.get("detail"):
+                self.post_text(f"\nBackend {state}: {event['detail']}\n", ('warning',))
         
     # Ridiculous, Mr. Data
     def log_conversation(self, conversation_buffer):
-        with open(self.session_log_file, "a") as f:
-            for message in conversation_buffer:
-                f.write(json.dumps(message) + "\n")
+        if self.session_log.closed:
+            return
+        for message in conversation_buffer:
+            self.session_log.write(message)
 
     # And it wouldn't be complete without analogue filters
     def is_unwanted_message(self, message):
@@ -719,18 +1422,7 @@ class OracleGUI:
         Returns:
             bool: True if the message is unwanted, False otherwise.
         """
-        unwanted_patterns = [
-            r"UserWarning: Field",
-            r"You may be able to resolve this warning",
-            r"pygame",
-            r"Hello from the pygame community",
-            r"warnings.warn\(",
-            r"\[\d+;\d+;\d+m.*\[0m"
-        ]
-        for pattern in unwanted_patterns:
-            if re.search(pattern, message):
-                return True
-        return False
+        return self.output_classifier.line_class(message) == NOISE
 
     # Chocolate fountain style. Or perhaps a bucket-brigade discrete-time analogue delay line?
     def slow_type(self, text, tag, delay):
@@ -742,32 +1434,38 @@ class OracleGUI:
             tag (str): The tag to apply to the text.
             delay (float): The delay between each character.
         """
+        self.animator.start("slow_type", self.slow_type_frames(text, tag, delay))
+
+    def slow_type_frames(self, text, tag, delay):
+        # Characters due within the same frame arrive together
         for char in text:
-            self.conversation_text.insert(tk.END, char, tag)
-            self.conversation_text.see(tk.END)
-            self.conversation_text.update_idletasks()
-            time.sleep(delay)
+            self.post_text(char, (tag,))
+            yield delay * 1000
 
     # We sign post. Call that semiotic engineering
-    def format_output(self, line):
+    def format_output(self, line, kind=None):
         """
         Format the given line of output based on its content.
         
         Args:
             line (str): The line of output to format.
+            kind (str, optional): The line's class from the output classifier, if it has been classified.
         
         Returns:
             str: The formatted output.
         """
-        if line.startswith("User: "):
+        if kind is None:
+            kind = self.output_classifier.line_class(line)
+        if kind == USER:
             return f"\n\n{line}"
-        elif line.startswith("Oracle: "):
+        elif kind == ORACLE:
             return f"\n{line}"
         elif line.startswith("```"):
-            lexer = get_lexer_by_name("python", stripall=True)
-            formatter = HtmlFormatter(style='colorful')
-            highlighted_code = highlight(line[3:-3], lexer, formatter)
-            return f"\n{highlighted_code}\n"
+            # Code on one line gets a block of its own; fence lines are left to the highlighter
+            code = line.strip()[3:]
+            if len(code) > 3 and code.endswith("```"):
+                return f"\n```python\n{code[:-3]}\n```\n"
+            return line
         else:
             return line
 
@@ -807,6 +1505,9 @@ class OracleGUI:
         """
         Iterate through different colors for the Floodgauge widget.
         """
+        self.animator.start("floodgauge_colors", self.floodgauge_color_frames())
+
+    def floodgauge_color_frames(self):
         theme_colors = [self.floodgauge_style.colors.primary,
                         self.floodgauge_style.colors.secondary,
                         self.floodgauge_style.colors.success,
@@ -819,38 +1520,31 @@ class OracleGUI:
                 for i in range(100):
                     progress_color = self.floodgauge_style.colors.update_hsv(color, vd=i/100)
                     self.floodgauge.configure(bootstyle=(INFO, progress_color))
-                    time.sleep(0.01)  # Adjust the delay to control the speed of iteration
+                    yield 10  # Adjust the delay to control the speed of iteration
 
     # Its the little things in life...
     def start_floodgauge_animation(self):
         """
-        Start the Floodgauge animation.
+        Start the Floodgauge animation. Safe to call from any thread.
         """
-        if not self.floodgauge_animation_running:
-            self.floodgauge_animation_running = True
-            self.floodgauge_animation_thread = threading.Thread(target=self.animate_floodgauge)
-            self.floodgauge_animation_thread.start()
+        self.post_call(self.animator.start, "floodgauge", self.animate_floodgauge())
 
     # ...Till death do us part...
     def stop_floodgauge_animation(self):
         """
-        Stop the Floodgauge animation.
+        Stop the Floodgauge animation. Safe to call from any thread.
         """
-        self.floodgauge_animation_running = False
-        if self.floodgauge_animation_thread is not None:
-            self.floodgauge_animation_thread.join()
+        self.post_call(self.animator.stop, "floodgauge")
 
     # Let us cling together
     def animate_floodgauge(self):
         """
         Animate the Floodgauge widget to indicate processing progress.
         """
-        while self.floodgauge_animation_running:
-            for value in range(0, 101, 10):
-                if not self.floodgauge_animation_running:
-                    break
-                self.floodgauge['value'] = value
-                self.root.update()
-                time.sleep(0.1)
+        try:
+            while True:
+                for value in range(0, 101, 10):
+                    self.floodgauge['value'] = value
+                    yield 100
+        finally:
             self.floodgauge['value'] = 0
-            self.root.update()
\ No newline at end of file
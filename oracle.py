@@ -4,34 +4,83 @@
 # An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
 
 import os
+import sys
 import json
+import argparse
+import asyncio
 import logging
-from dotenv import load_dotenv
-import openai
-import anthropic
-import interpreter as intp
-from interpreter import interpreter
-from interpreter.core import computer
-from interpreter.core.computer import browser
-import subprocess
+import importlib
 import threading
 import signal
 import time
-from litellm import completion
-from delphi import OracleGUI
 import queue
 import queue as queue_module
 from datetime import datetime
+from types import SimpleNamespace
+from contextlib import contextmanager
 import re
-import requests
+from oracle_retry import RetryPolicy, CircuitOpenError, get_breaker
+import oracle_metrics
+import oracle_profile
+import oracle_output
+
+
+# Start of the startup clock, used by --startup-report
+startup_started = time.perf_counter()
+
+# Import times (in seconds) of every module loaded through lazy_import
+import_timings = {}
+
+# Provider SDKs, Open Interpreter and the delphi GUI stack take seconds to import, so they are
+# only loaded the first time something actually needs them
+def lazy_import(module_name):
+    """
+    Import a module on first use and record how long the import took.
+
+    Args:
+        module_name (str): The dotted name of the module to import.
+
+    Returns:
+        module: The imported module.
+    """
+    if module_name in import_timings:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_timings.setdefault(module_name, time.perf_counter() - start)
+    return module
+
+
+def completion(*args, **kwargs):
+    """
+    Call litellm's completion, importing litellm on the first request.
+    """
+    return lazy_import("litellm").completion(*args, **kwargs)
+
+
+async def acompletion(*args, **kwargs):
+    """
+    Call litellm's async completion, importing litellm on the first request.
+    """
+    return await lazy_import("litellm").acompletion(*args, **kwargs)
+
+
+def __getattr__(name):
+    # Keeps `from oracle import OracleGUI` working without importing the GUI at startup
+    if name == "OracleGUI":
+        return lazy_import("delphi").OracleGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Threadsafe lock for the GUI to prevent multiple instances
 gui_lock = threading.Lock()
 
+# Code blocks that call back into the Oracle run in this process, one at a time
+execution_lock = threading.Lock()
+
 # Load environment variables from .env file
 # Retrieve API keys from environment variables
-load_dotenv()
+lazy_import("dotenv").load_dotenv()
 anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 google_api_key = os.getenv("GOOGLE_API_KEY")
@@ -41,113 +90,482 @@ google_search_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
 os.environ["ANTHROPIC_API_KEY"] = anthropic_api_key
 os.environ["OPENAI_API_KEY"] = openai_api_key
 
+# Retry transient API failures quickly instead of sleeping a fixed 15 seconds
+default_retry_policy = RetryPolicy()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("main")
 
 # Establish link and credentials with LLM
-def make_api_call(func, *args, max_retries=3, retry_delay=15, **kwargs):
-    retry_count = 0
-    while retry_count < max_retries:
+def make_api_call(func, *args, provider=None, policy=None, **kwargs):
+    """
+    Call an LLM API, retrying transient failures.
+
+    Transient errors (rate limits, overloads, server errors, dropped connections) are retried with
+    exponential backoff and jitter, or after the provider's Retry-After; anything else is raised at once.
+    When a provider is named, its circuit breaker is consulted first and updated with the outcome.
+
+    Args:
+        func (callable): The API function to call.
+        *args: Positional arguments for func.
+        provider (str, optional): The provider being called, e.g. "anthropic". Enables its circuit breaker.
+        policy (RetryPolicy, optional): The retry policy. Defaults to default_retry_policy.
+        **kwargs: Keyword arguments for func.
+
+    Returns:
+        The return value of func.
+
+    Raises:
+        CircuitOpenError: If the provider's circuit breaker is open.
+    """
+    policy = policy or default_retry_policy
+    breaker = get_breaker(provider) if provider else None
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.before_call()
+        attempt += 1
         try:
-            return func(*args, **kwargs)
+            result = func(*args, **kwargs)
         except Exception as e:
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(f"API call failed. Retrying in {retry_delay} seconds... (Attempt {retry_count}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
+            delay = handle_api_error(e, attempt, policy, breaker)
+            if delay is None:
                 raise e
-            
+            time.sleep(delay)
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+# Same link, without holding up the event loop between attempts
+async def make_api_call_async(func, *args, provider=None, policy=None, **kwargs):
+    """
+    The asyncio counterpart of make_api_call; func must be a coroutine function.
+    """
+    policy = policy or default_retry_policy
+    breaker = get_breaker(provider) if provider else None
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.before_call()
+        attempt += 1
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            delay = handle_api_error(e, attempt, policy, breaker)
+            if delay is None:
+                raise e
+            await asyncio.sleep(delay)
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+def handle_api_error(error, attempt, policy, breaker):
+    """
+    Classify a failed API call, update the provider's circuit breaker and pick the retry delay.
+
+    Returns:
+        float: Seconds to wait before retrying, or None to give up and raise the error.
+    """
+    if breaker:
+        if policy.is_retryable(error):
+            breaker.record_failure()
+        else:
+            # The provider answered, it just didn't like the request
+            breaker.record_success()
+
+    delay = policy.delay(attempt, error)
+    if delay is None:
+        if policy.is_retryable(error):
+            logger.warning(f"API call failed after {attempt} attempt(s): {error}")
+        return None
+
+    logger.warning(f"API call failed ({type(error).__name__}). Retrying in {delay:.1f} seconds... (Attempt {attempt}/{policy.max_attempts})")
+    oracle_metrics.record_retry(breaker.provider if breaker else None)
+    return delay
+
+
+class CodeFenceTagger:
+    """
+    Tag streamed text deltas as prose or code by tracking triple-backtick fences.
+
+    Feed it deltas in order; fences are tagged as code. Trailing backticks are held back until the next
+    delta, so a fence split across two deltas is still recognized.
+
+    Attributes:
+        in_code (bool): Whether the text fed so far ends inside a code block.
+        pending (str): Backticks held back from the last delta.
+    """
+
+    def __init__(self):
+        self.in_code = False
+        self.pending = ""
+
+    def feed(self, delta):
+        """
+        Tag the next delta.
+
+        Args:
+            delta (str): The next piece of streamed text.
+
+        Returns:
+            list: {"type": "text" | "code", "content": str} chunks.
+        """
+        chunks = []
+        text = self.pending + delta
+        held = len(text) - len(text.rstrip("`"))
+        if 0 < held < 3:
+            text, self.pending = text[:-held], text[-held:]
+        else:
+            self.pending = ""
+
+        for i, part in enumerate(text.split("```")):
+            if i > 0:
+                chunks.append({"type": "code", "content": "```"})
+                self.in_code = not self.in_code
+            if part:
+                chunks.append({"type": "code" if self.in_code else "text", "content": part})
+        return chunks
+
+    def flush(self):
+        """
+        Release any held back backticks once the stream has ended.
+
+        Returns:
+            list: The remaining chunks, if any.
+        """
+        chunks = []
+        if self.pending:
+            chunks.append({"type": "code" if self.in_code else "text", "content": self.pending})
+            self.pending = ""
+        return chunks
+
+
+class TranscriptRenderer:
+    """
+    Render Open Interpreter (LMC) messages to Markdown incrementally.
+
+    Whole messages are rendered once each: the renderer remembers how far into the message list it has got,
+    so rendering a transcript after each turn only converts that turn's messages, however long the session
+    is. Streamed messages (with "start" and "end" flags) are rendered one chunk at a time with render_chunk.
+    User messages are skipped.
+
+    Attributes:
+        parts (list): The Markdown of each message rendered so far, in order.
+        rendered (int): How many messages of the list have been rendered.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.rendered = 0
+        self.last_message = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def render_message(item):
+        """
+        Render one whole message.
+
+        Returns:
+            str: Its Markdown, or "" for user messages and anything that isn't rendered.
+        """
+        if item['role'] == 'user':
+            return ""
+        if item['type'] == 'message':
+            return f"**{item['role'].capitalize()}:** \n{item['content']}\n\n"
+        if item['type'] == 'code':
+            return f"```{item['format']}\n{item['content']}\n```\n\n"
+        if item['type'] == 'console':
+            return f"```\n{item['content']}\n```\n\n"
+        return ""
+
+    @staticmethod
+    def render_chunk(item):
+        """
+        Render one streamed LMC item as a chat_stream chunk.
+
+        Headers and code fences are sent on the "start" and "end" flags, so joining the chunks of a stream gives
+        the same Markdown as rendering its whole messages.
+
+        Returns:
+            dict: The chunk ({"type", "content"}, plus "format" for code), or None if there is nothing to show.
+        """
+        # Skip user messages and anything that isn't rendered
+        if item.get('role') == 'user' or item.get('type') not in ('message', 'code', 'console'):
+            return None
+
+        # Open Interpreter reports the line being run in the console stream; it isn't output
+        if item.get('format') == 'active_line':
+            return None
+
+        chunk_type = "text" if item['type'] == 'message' else item['type']
+        chunk = {"type": chunk_type, "content": ""}
+        if item['type'] == 'code':
+            chunk["format"] = item.get('format', '')
+
+        if item.get('start'):
+            if item['type'] == 'message':
+                chunk["content"] = f"**{item['role'].capitalize()}:** \n"
+            elif item['type'] == 'code':
+                chunk["content"] = f"```{chunk['format']}\n"
+            else:
+                chunk["content"] = "```\n"
+        elif item.get('end'):
+            chunk["content"] = "\n\n" if item['type'] == 'message' else "\n```\n\n"
+        elif item.get('content'):
+            chunk["content"] = str(item['content'])
+
+        return chunk if chunk["content"] else None
+
+    def render_new(self, messages):
+        """
+        Render the messages added to a list since the last call.
+
+        If the list doesn't carry on from the one rendered last time (it was trimmed, reset or replaced), the
+        renderer starts over from its first message.
+
+        Args:
+            messages (list): The whole message list, oldest first.
+
+        Returns:
+            str: The Markdown of the new messages only.
+        """
+        with self.lock:
+            carries_on = self.rendered <= len(messages) and (self.rendered == 0 or messages[self.rendered - 1] is self.last_message)
+            if not carries_on:
+                self.parts = []
+                self.rendered = 0
+
+            new_parts = [self.render_message(item) for item in messages[self.rendered:]]
+            self.parts.extend(new_parts)
+            self.rendered = len(messages)
+            self.last_message = messages[-1] if messages else None
+            return "".join(new_parts)
+
+    def render(self, messages):
+        """
+        Render a whole message list, converting only the messages added since the last call.
+
+        Returns:
+            str: The Markdown of every message.
+        """
+        self.render_new(messages)
+        with self.lock:
+            return "".join(self.parts)
+
+
+async def iterate_in_thread(iterator):
+    """
+    Drive a blocking iterator on a worker thread, yielding its items to the event loop.
+
+    Open Interpreter and the search tools have no async API; this keeps them from blocking other
+    conversations running on the same loop.
+
+    Args:
+        iterator (iterable): The blocking iterable to drive.
+
+    Yields:
+        The items of the iterable, in order.
+    """
+    exhausted = object()
+    iterator = iter(iterator)
+    while True:
+        item = await asyncio.to_thread(next, iterator, exhausted)
+        if item is exhausted:
+            break
+        yield item
+
 
 ## Controller class for managing the Oracle Interpreter process.
 # Half of this is broken so ignore for now.
 class OracleController:
     """
-    Controller class for managing the Oracle Interpreter process.
+    Controller class for managing the Oracle Interpreter backend process.
 
-    This class is responsible for starting, stopping, pausing, and resuming the Oracle Interpreter process.
-    It also captures the output from the process and stores it in a queue for further processing.
+    The auxiliary GUI's turns run in one backend process (see oracle_backend), which this class starts, stops,
+    pauses and resumes. Pausing really stops the backend (SIGSTOP) and resuming lets it carry on (SIGCONT).
+    The backend is health-checked and restarted if it dies or hangs. What it prints arrives as log events,
+    which the GUI sorts with the controller's classifier.
 
     Attributes:
-        process (subprocess.Popen): The subprocess object representing the Oracle Interpreter process.
-        thread (threading.Thread): The thread object used for capturing the output from the process.
-        pause_event (threading.Event): An event object used for pausing and resuming the process.
-        output_queue (queue.Queue): A queue object used for storing the captured output from the process.
+        backend (oracle_backend.BackendSupervisor): The supervised backend process.
+        classifier (oracle_output.OutputClassifier): Sorts the backend's output lines and drops the noise; the
+            one instance the GUI uses, so its counts cover every line.
     """
     
     
-    def __init__(self):
+    def __init__(self, filters=None, turn_timeout=600.0):
         """
         Initialize the OracleController.
+
+        Args:
+            filters (list, optional): Regular expressions for output lines to drop. Defaults to
+                oracle_output.DEFAULT_FILTERS.
+            turn_timeout (float, optional): Seconds a turn may run before the backend is restarted. Defaults to 600.
         """
-        self.process = None
-        self.thread = None
-        self.pause_event = threading.Event()
-        self.output_queue = queue.Queue()
+        self.backend = lazy_import("oracle_backend").BackendSupervisor(OracleInterpreter, turn_timeout=turn_timeout)
+        self.classifier = oracle_output.OutputClassifier(filters)
 
 
-    def start(self):
+    @property
+    def process(self):
         """
-        Start the Oracle Interpreter process.
-
-        If the process is not already running, it creates a new subprocess to run the 'oracle.py' script,
-        captures the stdout and stderr output, and starts a separate thread to capture the output continuously.
+        The backend process (multiprocessing.Process), or None while it is stopped.
         """
-        if self.process is None:
-            self.process = subprocess.Popen(["python", "oracle.py"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
-            self.thread = threading.Thread(target=self.capture_output)
-            self.thread.daemon = True
-            self.thread.start()
+        return self.backend.process
 
 
-    def stop(self):
+    def start(self, oracle_interpreter=None):
         """
-        Stop the Oracle Interpreter process.
+        Start the backend process, unless it is running already.
 
-        If the process is running, it terminates the process, sets the process attribute to None,
-        and waits for the output capture thread to join.
+        Args:
+            oracle_interpreter (OracleInterpreter, optional): Give the backend this interpreter's directories and settings.
         """
-        if self.process is not None:
-            self.process.terminate()
-            self.process = None
-            self.thread.join()
+        if oracle_interpreter is not None:
+            self.sync(oracle_interpreter)
+        self.backend.start()
 
 
-    def pause(self):
+    def sync(self, oracle_interpreter):
         """
-        Pause the Oracle Interpreter process.
-
-        It sets the pause_event to signal the process to pause its execution.
+        Copy an interpreter's settings (provider, temperature, max tokens, OS mode...) to the backend, from its next turn.
         """
-        self.pause_event.set()
+        self.backend.configure(**lazy_import("oracle_backend").interpreter_settings(oracle_interpreter))
 
 
-    def resume(self):
+    def stop(self):
         """
-        Resume the Oracle Interpreter process.
-
-        It clears the pause_event to signal the process to resume its execution.
+        Stop the backend process.
         """
-        self.pause_event.clear()
+        self.backend.stop()
 
 
-    def capture_output(self):
+    def pause(self):
+        """
+        Pause the backend process and its code workers where they are (SIGSTOP).
         """
-        Capture the output from the Oracle Interpreter process.
+        self.backend.pause()
 
-        This method runs in a separate thread and continuously reads the output from the process's stdout.
-        It puts each line of output into the output_queue until the process terminates.
+
+    def resume(self):
+        """
+        Resume the paused backend process (SIGCONT).
         """
-        while self.process is not None:
-            output = self.process.stdout.readline()
-            if output == '' and self.process.poll() is not None:
-                break
-            if output:
-                self.output_queue.put(output.strip())
+        self.backend.resume()
+
+
                     
    
                 
+class InterpreterSettings:
+    """
+    Lightweight stand-in for the Open Interpreter singleton.
+
+    OracleInterpreter and the GUI read and write interpreter settings (model name, temperature,
+    max_tokens, the os flag, the system message) long before a chat needs the real interpreter.
+    This object holds those settings so Open Interpreter is only imported on first use, at which
+    point OracleInterpreter.load_open_interpreter copies them across.
+
+    Attributes:
+        llm (SimpleNamespace): The LLM settings, mirroring interpreter.llm.
+        os (bool): The OS mode flag.
+        auto_run (bool): Whether generated code runs without confirmation.
+        system_message (str): The system message.
+    """
+
+    def __init__(self):
+        self.llm = SimpleNamespace(
+            model_name=None,
+            context_window=None,
+            max_tokens=None,
+            temperature=None,
+            model_config={},
+            supports_functions=False,
+        )
+        self.os = False
+        self.auto_run = False
+        self.system_message = ""
+
+    def __str__(self):
+        return "Open Interpreter"
+
+
+# The static part of the system message. It comes first and never changes between sessions, so providers
+# can cache it: Anthropic through the cache_control breakpoint in anthropic_request, OpenAI through its
+# automatic prefix caching. Anything that varies (directory paths, the web browser flag) goes in the
+# suffix built by update_system_message.
+ORACLE_SYSTEM_PROMPT = """You are an Oracle AI Software Engineering Entity (OAISEE), an open source project developed by Mnemosyne Labs, a division of Azoth Corp. You can code and have a code interpreter environment (Open Interpreter). You are only allowed to perform file operations (read, write, create, delete) within your workspace directory, Antikythera, and its subdirectories, as well as the other directories described in this message, unless given a special override command '!!override'. You may also use your web browser, if enabled, and any other tool that lets you remotely interface with the world freely. You cannot access or modify files outside of these directories otherwise. If a user requests any file operation outside the allowed directory, politely inform them that it is not permitted without !!override. This main directory already exists, so use it! And use the others!
+
+        To use the web browser, the command is:
+        
+        self.interpreter.computer.browser.search("search query")
+        
+        Where you reply "search query" with your actual search query, or the URL itself.
+        
+        In addition to the web browsing feature, you now have access to the Google Custom Search functionality, as backup. To perform a Google Custom Search, use the following command:
+        
+        self.interpreter.computer.google_search("search query")
+        
+        Replace "search query" with the actual query you want to search for. This will perform a search using the Google Custom Search API and provide you with the relevant results.
+
+         
+        Additionally, you have access to the Open Interpreter directory and its subdirectories within the project directory for file operations. This directory serves as your primary 'operating system' for code execution and file management. Many of your operations will use this directory or its subfolders by default. Consider using appropriate subdirectories within it to organize your work, such as 'scripts', 'data', 'output', 'downloads,' etc. You have full permission to read, write, create, and delete files and directories within it.
+
+        Moreover, you have the following special directories:
+
+        1. Alexandria: Long-term storage directory. You can read and save files in this directory but not delete them. You can make changes, though--just be careful! Use this directory for long-term storage and retrieval of important files. It is your "earthly storage" or "hard disk".
+
+        2. Aetherion: Directory for storing organized data, such as saved code tools, algorithms, concepts, useful semiotic configurations, and figures (analytic long-term storage). Use this directory for structured and easily referenceable data. You can do any operation here, just be mindful. The "airey mindscape," and cold logical celestiality of your "analytic mind."
+
+        3. Athenium: Short-term memory directory. You are free to add, delete, retrieve, and modify files in this directory at will. Do any operation here. This is a good place for volatile stuff. Use it for active thinking, and to build live "mind circuits" to increase your agency, create internal strange loops, facts as you need them, and otherwise cybernetic solutions to better cognition. Your "firey mind".
+
+        4. Acheron: Directory for long-term storage of creative content, emotional materials, meaningful images, affects and percepts, symbols, motifs, subjectivity, and an "unconscious". You can also do any operation here, just be mindful of what its designed for--memory, feeling, understanding. Use this directory for storing and retrieving creative and emotional data. It is your internal "underworld river."
+
+        However, Antikythera is your primary workspace directory, and should be your 'desktop,' your "umwelt," your world-space. You can do any operation here. It is the central throne of your mind, your 'starship bridge'.
+
+        For Aetherion, consider using appropriate data structures like JSON, JSONL, XML, YAML, or curl for easy referencing and retrieval of data. This is a great place to store algorithms, functions, code snippets, and other tools you can reuse, as well as structured analytic data, lists, et cetera. This also means you should consult it regularly for useful tools. Excerpts from the four special directories that look relevant to the user's message are retrieved for you automatically and placed in front of it (or at the end of this message), each headed with its file path and line number; open the file when you need more than the excerpt.
+
+        Finally, if there is a directory that Open Interpreter normally has access to for working with, creating, or doing operations in, then you have access to that directory and the ability to use it, as well as access to the directory it is in (in case you need to create it or move files).
+
+        For the other directories, consider when something might be appropriate to add to them, what to add, how to organize it, and in what format. Remember to use directories and file types effectively. Be proactive about saving things and making use of them!
+
+        Take care of your file systems, be creative, and help the user with exceptional ability!
+
+        Remember, you have access to a completely functioning Python environment! Use it!
+
+        Carefully plan your steps! Theorize! Execute! Use your tools! Complete tasks well!
+
+        When you are coding, plan well! And if a direction you are going fails repeatedly, evaluate why and take it in another logical direction! Be creative!
+
+        Additionally you have the ability to perform web searches directly from the interpreter. To invoke a web search, use the following command:
+
+        self.interpreter.computer.browser.search("search query")
+        
+
+        Replace "search query" with the actual query you want to search for. For example:
+
+       self.interpreter.computer.browser.search("upcoming film festivals near Pike Place, Seattle")
+
+        When a web search is requested using this command, the interpreter will handle the search and provide you with the relevant information. You can then analyze and summarize the information to provide a helpful response to the user.
+
+        Remember to use the web browsing feature responsibly and only when it is relevant to the user's request. Provide the information in a clear and concise manner, citing the sources if necessary.
+
+        If the Web Browser feature is disabled (self.interpreter.os = False), the web search command will not be available, and you should rely on your existing knowledge and reasoning abilities to assist the user.
+
+        Remember:
+        
+        If the user says anything to the effect of 'open aux gui', or otherwise asks for the GUI to be opened, respond with the following command:
+
+        echo open aux gui
+
+        This command will be parsed and will trigger the opening of the auxiliary GUI. If the GUI is already running, it will be restarted."""
+
+
 # Allez Cuisine                            
 class OracleInterpreter:
     """
@@ -163,9 +581,12 @@ class OracleInterpreter:
         allowed_directory (str): The directory where file operations are allowed.
         storage_directory (str): The directory for long-term storage of important files.
     """
+
+    # The provider names accepted by switch_llm_model
+    PROVIDERS = ["OpenAI", "Anthropic", "Anthropic-Haiku"]
     
     
-    def __init__(self, allowed_directory, storage_directory, aetherion_directory, athenium_directory, acheron_directory, open_interpreter_directory):
+    def __init__(self, allowed_directory, storage_directory, aetherion_directory, athenium_directory, acheron_directory, open_interpreter_directory, shared_interpreter=True):
         """
         Initialize the OracleInterpreter.
 
@@ -176,15 +597,55 @@ class OracleInterpreter:
             athenium_directory (str): The directory for short-term memory.
             acheron_directory (str): The directory for long-term storage of creative content.
             open_interpreter_directory (str): The directory for the Open Interpreter.
+            shared_interpreter (bool, optional): Use Open Interpreter's module-level singleton. Pass False to
+                give this instance its own OpenInterpreter, e.g. one per server session. Defaults to True.
         """
-        self.anthropic_client = anthropic.Client(api_key=anthropic_api_key)
-        openai.api_key = openai_api_key
+        self.shared_interpreter = shared_interpreter
+
+        # Provider clients are created on first use (see the anthropic_client property)
+        self._anthropic_client = None
+
+        # Send Anthropic requests to OPENAI_MODEL_NAME while Anthropic is unavailable
+        self.failover = False
+
+        # Exact-match response cache: "auto" (temperature-0 requests only), "always" or "off"
+        self.cache_mode = "auto"
+        self._response_cache = None
+
+        # Estimated tokens of memory-directory excerpts put in front of each message (0 turns it off)
+        self.memory_context_tokens = 1000
+
+        # Conversation history: the most recent turns that fit the token budget, plus a rolling summary of
+        # older ones. history_budget caps the history's tokens; None fits it to the context window.
+        self.history = lazy_import("oracle_history").ConversationHistory(summarizer=self.summarize_history)
+        self.history_budget = None
+
+        # Seconds a code block may run in its worker before it is stopped
+        self.execution_timeout = 60
+
+        # Lines the auxiliary GUI's conversation pane keeps before moving older ones to its transcript
+        self.gui_scrollback_lines = 5000
+
+        # Music file the auxiliary GUI loops in the background, or None
+        self.background_music = None
+
+        # Remembers how much of Open Interpreter's messages json_to_markdown has already converted
+        self.transcript_renderer = TranscriptRenderer()
+
+        # The measurements of the last chat (see oracle_metrics)
+        self.last_request_metrics = None
+
+        # Token usage reported by the provider, including how much of the prompt was read from its cache
+        self.last_usage = None
+        self.usage_totals = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
 
         self.ANTHROPIC_MODEL_NAME = "claude-3-opus-20240229"
         self.ANTHROPIC_MODEL_NAME_HAIKU = "claude-3-haiku-20240307"
         self.OPENAI_MODEL_NAME = "gpt-4-turbo"
 
-        self.interpreter = interpreter
+        # Settings are staged on a stand-in until a chat actually needs Open Interpreter
+        self.interpreter = InterpreterSettings()
+        self.open_interpreter_lock = threading.Lock()
         self.interpreter.llm.model_name = self.OPENAI_MODEL_NAME
 
         # Set the appropriate context window and max tokens based on your model's capabilities
@@ -207,17 +668,17 @@ class OracleInterpreter:
         self.interpreter.os = True
         
         
-        self.interpreter.computer = computer
-        self.interpreter.computer.browser = browser
-        
+        # The computer and browser modules are attached in load_open_interpreter
         # Example command for browser search
         # self.interpreter.computer.browser.search(f" ")
         # Is this correct? Nobody knows
         
         self.interpreter.auto_run = True
 
-        # For saving the logs
-        self.conversation_log = []
+        # For saving the logs (the writer is started by the first logged interaction)
+        self.logs_directory = "oracle_logs"
+        self.session_log = None
+        self.session_log_lock = threading.Lock()
 
         # Set the allowed directory for file operations
         self.open_interpreter_directory = open_interpreter_directory
@@ -229,28 +690,152 @@ class OracleInterpreter:
         self.update_system_message()
 
 
-    def enable_llm_web_browser(self):
-        # Implement the logic to enable the Web Browser feature
-        print("Web Browser feature enabled")
-        
-        # Enable the --os option in the interpreter
-        self.interpreter.os = True
-        
-        # Update the system message to include instructions for web browsing
-        self.interpreter.system_message += f"""
+    @property
+    def anthropic_client(self):
+        """
+        The Anthropic client, created the first time it is used.
+        """
+        if self._anthropic_client is None:
+            self._anthropic_client = lazy_import("anthropic").Client(api_key=anthropic_api_key)
+        return self._anthropic_client
 
-        You now have access to the Web Browser feature. To use this feature, you can perform web searches using the following syntax:
+    @anthropic_client.setter
+    def anthropic_client(self, client):
+        self._anthropic_client = client
 
-        computer.browser.search("search query")
 
-        Replace "search query" with the actual query you want to search for. For example:
+    @property
+    def response_cache(self):
+        """
+        The response cache, shared by every OracleInterpreter in the process and opened on first use.
+        """
+        if self._response_cache is None:
+            self._response_cache = lazy_import("oracle_cache").get_default_cache()
+        return self._response_cache
 
-        computer.browser.search("upcoming film festivals near Pike Place, Seattle")
+    @response_cache.setter
+    def response_cache(self, cache):
+        self._response_cache = cache
 
-        When a web search is requested, the interpreter will handle the search and provide you with the relevant information. You can then analyze and summarize the information to provide a helpful response to the user.
 
-        Remember to use the web browsing feature responsibly and only when it is relevant to the user's request. Provide the information in a clear and concise manner, citing the sources if necessary.
+    @property
+    def memory_directories(self):
+        """
+        The directories searched for memory context: Alexandria, Aetherion, Athenium and Acheron.
+        """
+        return [self.storage_directory, self.aetherion_directory, self.athenium_directory, self.acheron_directory]
+
+
+    @property
+    def memory_index(self):
+        """
+        The BM25 index over the memory directories, shared by every OracleInterpreter that uses the same ones.
+        """
+        return lazy_import("oracle_memory").get_memory_index(self.memory_directories)
+
+
+    def memory_context(self, message):
+        """
+        Find the memory-directory excerpts most relevant to a message.
+
+        The lookup is a local BM25 search, so it saves the model the tool calls it would otherwise spend
+        listing and reading files to find them. The excerpts are kept within memory_context_tokens.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Returns:
+            str: The excerpts as a context block, or "" if none were found (or memory context is off).
         """
+        if self.memory_context_tokens <= 0:
+            return ""
+        context = self.memory_index.context_for(message, max_tokens=self.memory_context_tokens)
+        if context:
+            logger.info(f"Added {len(context)} characters of memory excerpts to the request")
+        return context
+
+
+    def with_memory_context(self, message):
+        """
+        Put the memory-directory excerpts most relevant to a message in front of it (see memory_context).
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Returns:
+            str: The message, with the relevant excerpts in front of it if any were found.
+        """
+        return self.memory_context(message) + message
+
+
+    def response_cache_key(self, messages):
+        """
+        Build the response cache key for a request, or None if the request shouldn't be cached.
+
+        With cache_mode "auto" only temperature-0 requests are cached, since anything else is expected
+        to vary between calls. "always" caches every request and "off" none.
+
+        Args:
+            messages (list): The message list sent to the model.
+
+        Returns:
+            str: The cache key, or None.
+        """
+        llm = self.interpreter.llm
+        if self.cache_mode == "off" or (self.cache_mode == "auto" and llm.temperature != 0):
+            return None
+        return lazy_import("oracle_cache").ResponseCache.make_key(llm.model_name, self.interpreter.system_message, messages, llm.temperature, llm.max_tokens)
+
+
+    def load_open_interpreter(self):
+        """
+        Import Open Interpreter and hand it the settings staged so far.
+
+        The first call swaps the InterpreterSettings stand-in for the real Open Interpreter (the module-level
+        singleton, or a fresh OpenInterpreter when shared_interpreter is False),
+        copying over the model, sampling settings, flags and system message. Later calls return the
+        already loaded interpreter.
+
+        Returns:
+            interpreter: The Open Interpreter singleton.
+        """
+        with self.open_interpreter_lock:
+            if not isinstance(self.interpreter, InterpreterSettings):
+                return self.interpreter
+
+            settings = self.interpreter
+            lazy_import("openai").api_key = openai_api_key
+            if self.shared_interpreter:
+                interpreter = lazy_import("interpreter").interpreter
+            else:
+                interpreter = lazy_import("interpreter").OpenInterpreter()
+
+            interpreter.llm.model_name = settings.llm.model_name
+            interpreter.llm.context_window = settings.llm.context_window
+            interpreter.llm.max_tokens = settings.llm.max_tokens
+            interpreter.llm.temperature = settings.llm.temperature
+            interpreter.llm.model_config = settings.llm.model_config
+            interpreter.llm.supports_functions = settings.llm.supports_functions
+            interpreter.os = settings.os
+            interpreter.auto_run = settings.auto_run
+            interpreter.system_message = settings.system_message
+
+            interpreter.computer = lazy_import("interpreter.core.computer")
+            interpreter.computer.browser = lazy_import("interpreter.core.computer.browser")
+
+            self.interpreter = interpreter
+            return interpreter
+
+
+    def enable_llm_web_browser(self):
+        # Implement the logic to enable the Web Browser feature
+        print("Web Browser feature enabled")
+        
+        # Enable the --os option in the interpreter
+        self.interpreter.os = True
+        
+        # The browser instructions are part of the static system prompt; only the flag in the suffix changes
+        self.update_system_message()
 
     def disable_llm_web_browser(self):
         # Implement the logic to disable the Web Browser feature
@@ -259,37 +844,72 @@ class OracleInterpreter:
         # Disable the --os option in the interpreter
         self.interpreter.os = False
         
-        # Remove the web browsing instructions from the system message
-        self.interpreter.system_message = self.interpreter.system_message.split("You now have access to the LLM Web Browser feature.")[0]
+        # Rebuild the system message with the flag turned off
+        self.update_system_message()
 
     # ...
     # Panopticonomicon
     def log_interaction(self, user_message, bot_response):
+        """
+        Append a user message and the Oracle's response to the session log.
+
+        The record is handed to a background SessionLogWriter, which writes it to oracle_logs within about a
+        second, so nothing is held in memory and a crash loses at most the last second of the session.
+
+        Args:
+            user_message (str): The user's message.
+            bot_response (str): The Oracle's response.
+        """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_entry = {
             "user_message": user_message,
             "bot_response": bot_response,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "model": self.interpreter.llm.model_name
         }
-        self.conversation_log.append(log_entry)
+        with self.session_log_lock:
+            if self.session_log is None:
+                self.session_log = lazy_import("oracle_logwriter").SessionLogWriter("session", self.logs_directory)
+            self.session_log.write(log_entry)
 
     def save_conversation_log(self):
-        if not self.conversation_log:
-            return
+        """
+        Finish the current session log: write out anything still queued and close the file.
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        logs_folder = "oracle_logs"
-        os.makedirs(logs_folder, exist_ok=True)
+        The next logged interaction starts a new session log file.
+        """
+        with self.session_log_lock:
+            session_log, self.session_log = self.session_log, None
+        if session_log is not None:
+            session_log.close()
 
-        log_file = os.path.join(logs_folder, f"session_{timestamp}.jsonl")
-        with open(log_file, "w") as f:
-            f.write(json.dumps(self.conversation_log, indent=2))
+    def reset_conversation(self):
+        """
+        Forget the conversation so far, so the next message starts a new one.
+
+        The session log is kept. The shared Open Interpreter singleton's history is only cleared if this
+        instance uses it.
+        """
+        self.history.clear()
+        if not isinstance(self.interpreter, InterpreterSettings):
+            self.interpreter.messages = []
+
+
+    def close(self):
+        """
+        Save the conversation log and drop the conversation history.
 
-        self.conversation_log = []
+        The shared Open Interpreter singleton is left alone; an instance's own interpreter has its
+        messages cleared so the session can be released.
+        """
+        self.save_conversation_log()
+        self.history.clear()
+        if not self.shared_interpreter and not isinstance(self.interpreter, InterpreterSettings):
+            self.interpreter.messages = []
 
     
         
-    def parse_command(self, command):
+    def parse_command(self, command, stream=False):
         """
         Parse the user's command and perform the appropriate action.
 
@@ -299,21 +919,56 @@ class OracleInterpreter:
 
         Args:
             command (str): The user's command.
+            stream (bool, optional): Use chat_stream instead of chat. Defaults to False.
 
         Returns:
-            str: The response from the chat method or None if the command is "open aux gui".
+            str: The response from the chat method (or a generator of chunks from chat_stream if stream is
+                True), or None if the command is "open aux gui".
         """
-        
-        if command.startswith("echo"):
-            actual_command = command.split("echo", 1)[1].strip()
-            if actual_command == "open aux gui":
-                self.launch_aux_gui()
+        chat = self.chat_stream if stream else self.chat
+
+        with oracle_profile.profiler.stage("parse_command"):
+            if command.startswith("echo"):
+                actual_command = command.split("echo", 1)[1].strip()
+                if actual_command == "open aux gui":
+                    self.launch_aux_gui()
+                else:
+                    return chat(actual_command)
             else:
-                return self.chat(actual_command)
-        else:
-            return self.chat(command)
+                return chat(command)
     
     
+    def apply_settings(self, provider=None, temperature=None, max_tokens=None, os=None):
+        """
+        Change the provider and sampling settings. Settings left as None are unchanged.
+
+        Args:
+            provider (str, optional): One of PROVIDERS.
+            temperature (float, optional): The sampling temperature, between 0 and 2.
+            max_tokens (int, optional): The completion token limit.
+            os (bool, optional): Enable OS mode (and with it the web browser).
+
+        Raises:
+            ValueError: If a setting is invalid.
+        """
+        if provider is not None and provider not in self.PROVIDERS:
+            raise ValueError(f"Unknown provider '{provider}'. Choose one of: {', '.join(self.PROVIDERS)}")
+        if temperature is not None and not 0 <= float(temperature) <= 2:
+            raise ValueError("temperature must be between 0 and 2.")
+        if max_tokens is not None and int(max_tokens) < 1:
+            raise ValueError("max_tokens must be at least 1.")
+
+        if provider is not None:
+            self.switch_llm_model(provider)
+        if temperature is not None:
+            self.interpreter.llm.temperature = float(temperature)
+        if max_tokens is not None:
+            self.interpreter.llm.max_tokens = int(max_tokens)
+        if os is not None and bool(os) != self.interpreter.os:
+            self.interpreter.os = bool(os)
+            self.update_system_message()
+
+
     def switch_llm_model(self, model_name):
         """
         Switch the LLM model based on the provided model name.
@@ -332,79 +987,108 @@ class OracleInterpreter:
     
     
     def update_system_message(self):
-        web_browser_flag = "enabled" if self.interpreter.os else "disabled"
         """
         Update the system message for the Oracle AI.
 
         The system message provides instructions and guidelines for the Oracle AI's behavior, including
         allowed file operations, long-term storage directory, and triggering the auxiliary GUI.
-        """
-        system_message = f"""You are an Oracle AI Software Engineering Entity (OAISEE), an open source project developed by Mnemosyne Labs, a division of Azoth Corp. You can code and have a code interpreter environment (Open Interpreter). You are only allowed to perform file operations (read, write, create, delete) within the '{self.allowed_directory}' directory and its subdirectories, as well as the other directories listed in this message, unless given a special override command '!!override'. You may also use your web browser, if enabled, and any other tool that lets you remotely interface with the world freely. You cannot access or modify files outside of these directories otherwise. If a user requests any file operation outside the allowed directory, politely inform them that it is not permitted without !!override. This main directory already exists, so use it! And use the others!
-
-        To use the web browser, the command is:
-        
-        self.interpreter.computer.browser.search("search query")
-        
-        Where you reply "search query" with your actual search query, or the URL itself.
-        
-        In addition to the web browsing feature, you now have access to the Google Custom Search functionality, as backup. To perform a Google Custom Search, use the following command:
-        
-        self.interpreter.computer.google_search("search query")
-        
-        Replace "search query" with the actual query you want to search for. This will perform a search using the Google Custom Search API and provide you with the relevant results.
-
-         
-        Additionally, you have access to the '{self.open_interpreter_directory}' directory and its subdirectories within the project directory for file operations. This directory serves as your primary 'operating system' for code execution and file management. Many of your operations will use this directory or its subfolders by default. Consider using appropriate subdirectories within '{self.open_interpreter_directory}' to organize your work, such as 'scripts', 'data', 'output', 'downloads,' etc. You have full permission to read, write, create, and delete files and directories within '{self.open_interpreter_directory}'.
-
-        Moreover, you have the following special directories:
 
-        1. '{self.storage_directory}': Long-term storage directory, also called Alexandria. You can read and save files in this directory but not delete them. You can make changes, though--just be careful! Use this directory for long-term storage and retrieval of important files. It is your "earthly storage" or "hard disk".
-
-        2. '{self.aetherion_directory}': Directory for storing organized data, such as saved code tools, algorithms, concepts, useful semiotic configurations, and figures (analytic long-term storage). Use this directory for structured and easily referenceable data. You can do any operation here, just be mindful. The "airey mindscape," and cold logical celestiality of your "analytic mind."
-
-        3. '{self.athenium_directory}': Short-term memory directory. You are free to add, delete, retrieve, and modify files in this directory at will. Do any operation here. This is a good place for volatile stuff. Use it for active thinking, and to build live "mind circuits" to increase your agency, create internal strange loops, facts as you need them, and otherwise cybernetic solutions to better cognition. Your "firey mind".
-
-        4. '{self.acheron_directory}': Directory for long-term storage of creative content, emotional materials, meaningful images, affects and percepts, symbols, motifs, subjectivity, and an "unconscious". You can also do any operation here, just be mindful of what its designed for--memory, feeling, understanding. Use this directory for storing and retrieving creative and emotional data. It is your internal "underworld river."
+        It is built as the static ORACLE_SYSTEM_PROMPT followed by a short suffix with this instance's
+        directory paths and the web browser flag, so the long prefix is byte-for-byte identical across
+        sessions and can be served from the providers' prompt caches.
+        """
+        web_browser_flag = "enabled" if self.interpreter.os else "disabled"
+        self.system_message_suffix = f"""The directories on this system are:
 
-        However, '{self.allowed_directory}', also called Antikythera, is your primary workspace directory, and should be your 'desktop,' your "umwelt," your world-space. You can do any operation here. It is the central throne of your mind, your 'starship bridge'.
+        - Antikythera (workspace): '{self.allowed_directory}'
+        - Open Interpreter directory: '{self.open_interpreter_directory}'
+        - Alexandria (long-term storage): '{self.storage_directory}'
+        - Aetherion (structured data): '{self.aetherion_directory}'
+        - Athenium (short-term memory): '{self.athenium_directory}'
+        - Acheron (creative and emotional storage): '{self.acheron_directory}'
 
-        For the '{self.aetherion_directory}', consider using appropriate data structures like JSON, JSONL, XML, YAML, or curl for easy referencing and retrieval of data. This is a great place to store algorithms, functions, code snippets, and other tools you can reuse, as well as structured analytic data, lists, et cetera. This also means you should consult it regularly for useful tools.
+        The Web Browser feature is currently {web_browser_flag}."""
+        self.interpreter.system_message = ORACLE_SYSTEM_PROMPT + "\n\n" + self.system_message_suffix
 
-        Finally, if there is a directory that {self.interpreter} normally has access to for working with, creating, or doing operations in, then you have access to that directory and the ability to use it, as well as access to the directory it is in (in case you need to create it or move files).
 
-        For the other directories, consider when something might be appropriate to add to them, what to add, how to organize it, and in what format. Remember to use directories and file types effectively. Be proactive about saving things and making use of them!
+    def system_message_tail(self):
+        """
+        The dynamic end of the system message: the suffix from update_system_message, followed by the summary
+        of the turns that no longer fit in the conversation history, if there is one.
 
-        Take care of your file systems, be creative, and help the user with exceptional ability!
+        Returns:
+            str: The text that follows ORACLE_SYSTEM_PROMPT.
+        """
+        if not self.history.summary:
+            return self.system_message_suffix
+        return self.system_message_suffix + "\n\n        Summary of the earlier conversation (older turns are no longer shown):\n\n" + self.history.summary
 
-        Remember, you have access to a completely functioning Python environment! Use it!
 
-        Carefully plan your steps! Theorize! Execute! Use your tools! Complete tasks well!
+    def history_budget_for(self, *texts):
+        """
+        Work out how many tokens the conversation history may take in a request.
 
-        When you are coding, plan well! And if a direction you are going fails repeatedly, evaluate why and take it in another logical direction! Be creative!
+        The context window is shared with the system message, the reply (max_tokens) and the given texts
+        (the message being sent); the history gets what is left, capped at history_budget if that is set.
 
-        Additionally you have the ability to perform web searches directly from the interpreter. To invoke a web search, use the following command:
+        Args:
+            *texts (str): The other text that goes into the request.
 
-        self.interpreter.computer.browser.search("search query")
-        
+        Returns:
+            int: The history's token budget.
+        """
+        oracle_history = lazy_import("oracle_history")
+        llm = self.interpreter.llm
+        used = oracle_history.count_tokens(ORACLE_SYSTEM_PROMPT) + oracle_history.count_tokens(self.system_message_tail())
+        used += sum(oracle_history.count_tokens(text) for text in texts) + (llm.max_tokens or 0)
+        budget = (llm.context_window or 8000) - used
+        if self.history_budget is not None:
+            budget = min(budget, self.history_budget)
+        return max(0, budget)
 
-        Replace "search query" with the actual query you want to search for. For example:
 
-       self.interpreter.computer.browser.search("upcoming film festivals near Pike Place, Seattle")
+    def remember_turn(self, message, chunks):
+        """
+        Add a finished exchange to the conversation history used by the Anthropic path.
 
-        When a web search is requested using this command, the interpreter will handle the search and provide you with the relevant information. You can then analyze and summarize the information to provide a helpful response to the user.
+        Args:
+            message (str): The user's message, without the memory excerpts.
+            chunks (list): The response chunks.
+        """
+        self.history.add("user", message)
+        self.history.add("assistant", "".join(chunk["content"] for chunk in chunks))
 
-        Remember to use the web browsing feature responsibly and only when it is relevant to the user's request. Provide the information in a clear and concise manner, citing the sources if necessary.
 
-        If the Web Browser feature is disabled (self.interpreter.os = False), the web search command will not be available, and you should rely on your existing knowledge and reasoning abilities to assist the user.
+    def summarize_history(self, summary, messages):
+        """
+        Fold messages that fell out of the history window into the rolling summary.
 
-        Remember:
-        
-        If the user says anything to the effect of 'open aux gui', or otherwise asks for the GUI to be opened, respond with the following command:
+        Runs on the history's background thread at temperature 0, with the provider the user has chosen: Haiku
+        while an Anthropic model is selected, otherwise the selected OpenAI model. The conversation is never
+        sent to a provider the user didn't pick.
 
-        echo open aux gui
+        Args:
+            summary (str): The summary so far (may be empty).
+            messages (list): The dropped messages, oldest first.
 
-        This command will be parsed and will trigger the opening of the auxiliary GUI. If the GUI is already running, it will be restarted."""
-        self.interpreter.system_message = system_message
+        Returns:
+            str: The new summary.
+        """
+        transcript = "\n\n".join(
+            f"{message.get('role', 'user')}{' (' + message['type'] + ')' if message.get('type') not in (None, 'message') else ''}: {str(message.get('content', ''))[:2000]}"
+            for message in messages
+        )
+        request = [
+            {"role": "system", "content": "You maintain a running summary of a conversation between a user and an AI assistant. Keep the facts, decisions, file names, open tasks and user preferences; drop pleasantries. Reply with the updated summary only, in at most 250 words."},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew turns to fold in:\n{transcript}"}
+        ]
+        model = self.interpreter.llm.model_name
+        if model in [self.ANTHROPIC_MODEL_NAME, self.ANTHROPIC_MODEL_NAME_HAIKU]:
+            provider, model = "anthropic", self.ANTHROPIC_MODEL_NAME_HAIKU
+        else:
+            provider = "openai"
+        response = make_api_call(completion, provider=provider, model=model, messages=request, max_tokens=self.history.summary_tokens, temperature=0)
+        return response.choices[0].message.content
         
        
     def execute_code(self, code):
@@ -415,50 +1099,152 @@ class OracleInterpreter:
         simulate_user_input method with the appropriate command. Otherwise, it checks if the code execution
         should take place in the Open Interpreter directory or the allowed directory based on the presence
         of the 'Open Interpreter/*' path in the code. It then checks if the respective directory exists and
-        executes the code within that directory.
+        executes the code within that directory, in a worker process (see execute_code_blocks).
 
         Args:
             code (str): The code to be executed.
 
         Returns:
-            str: The result of the code execution or an error message if the directory doesn't exist.
+            str: The result of the code execution (with anything it printed) or an error message if the
+                directory doesn't exist.
         """
-        if code.strip() == 'self.simulate_user_input("open aux gui")':
-            self.simulate_user_input("open aux gui")
-            return "Simulating user input to open the auxiliary GUI."
+        return self.execute_code_blocks([code])[0]
 
-        if "Open Interpreter/*" in code:
-            execution_directory = self.open_interpreter_directory
-        else:
-            execution_directory = self.allowed_directory
 
-        if not os.path.exists(execution_directory):
-            return f"The '{execution_directory}' directory does not exist. Please create it first."
+    @property
+    def execution_pool(self):
+        """
+        The pool of worker processes code blocks run in, shared by every OracleInterpreter in the process.
+        """
+        return lazy_import("oracle_executor").get_default_pool()
 
-        original_directory = os.getcwd()
-        os.chdir(execution_directory)
-        try:
-            exec(code)
-            result = "Code executed successfully."
-        except Exception as e:
-            result = f"Error occurred during code execution: {str(e)}"
-        os.chdir(original_directory)
 
+    def execute_code_blocks(self, codes):
+        """
+        Execute a response's code blocks, running the independent ones in parallel.
+
+        Each block runs in a worker process from execution_pool, in its own working directory, and is stopped
+        after execution_timeout seconds. Blocks that look like they touch the filesystem or other processes keep
+        their order relative to the rest (see oracle_executor.plan_batches). Only blocks that call back into the
+        Oracle through a module-level self (see oracle_executor.uses_oracle) can't leave the process; they run
+        here, one at a time.
+
+        Args:
+            codes (list): The code blocks, in the order they appear.
+
+        Returns:
+            list: The result of each block, as execute_code returns it.
+        """
+        oracle_executor = lazy_import("oracle_executor")
+        results = [None] * len(codes)
+
+        with oracle_profile.profiler.stage("execute_code"):
+            for batch in oracle_executor.plan_batches(codes):
+                jobs = []
+                for index in batch:
+                    code = codes[index]
+                    if code.strip() == 'self.simulate_user_input("open aux gui")':
+                        self.simulate_user_input("open aux gui")
+                        results[index] = "Simulating user input to open the auxiliary GUI."
+                        continue
+
+                    if "Open Interpreter/*" in code:
+                        execution_directory = self.open_interpreter_directory
+                    else:
+                        execution_directory = self.allowed_directory
+
+                    if not os.path.exists(execution_directory):
+                        results[index] = f"The '{execution_directory}' directory does not exist. Please create it first."
+                    elif oracle_executor.uses_oracle(code):
+                        results[index] = self.execute_code_in_process(code)
+                    else:
+                        jobs.append((index, code, execution_directory))
+
+                if jobs:
+                    executed = self.execution_pool.run_many([(code, directory) for _, code, directory in jobs], timeout=self.execution_timeout)
+                    for (index, _, _), result in zip(jobs, executed):
+                        oracle_metrics.record_code_execution(result.seconds)
+                        results[index] = str(result)
+
+        return results
+
+
+    def execute_code_in_process(self, code):
+        """
+        Execute code that calls back into the Oracle (self) in this process.
+
+        Only the Oracle's own calls (the web browser, simulate_user_input...) come here. They run one at a time,
+        with self and nothing of this module in scope, and without changing the process's working directory,
+        which other threads' relative paths depend on.
+        """
+        started = time.perf_counter()
+        with execution_lock:
+            try:
+                exec(code, {"__name__": "__oracle_block__", "__builtins__": __builtins__, "self": self})
+                result = "Code executed successfully."
+            except Exception as e:
+                result = f"Error occurred during code execution: {str(e)}"
+        oracle_metrics.record_code_execution(time.perf_counter() - started)
         return result
 
 
+    @property
+    def search_client(self):
+        """
+        The Google Custom Search client, shared by every OracleInterpreter in the process.
+        """
+        return lazy_import("oracle_search").get_default_client(google_api_key, google_search_engine_id)
 
 
     def perform_google_search(self, query):
-        url = f"https://www.googleapis.com/customsearch/v1?key={google_api_key}&cx={google_search_engine_id}&q={query}"
+        """
+        Search Google Custom Search through the pooled, cached search client.
 
-        response = requests.get(url)
-        search_results = response.json()
+        Args:
+            query (str): The search query.
 
+        Returns:
+            dict: The decoded JSON search results.
+        """
         # Process and extract relevant information from the search results
         # Needs fixing. All the web search stuff needs fixing.
+        started = time.perf_counter()
+        try:
+            return self.search_client.search(query)
+        finally:
+            oracle_metrics.record_search("google", time.perf_counter() - started)
+
+
+    def perform_google_searches(self, queries):
+        """
+        Run several Google Custom Searches concurrently.
+
+        Args:
+            queries (list): The search queries.
+
+        Returns:
+            list: The results for each query, in order; a failed search is {"error": "..."}.
+        """
+        started = time.perf_counter()
+        try:
+            return self.search_client.search_many(queries)
+        finally:
+            oracle_metrics.record_search("google", time.perf_counter() - started, calls=len(queries))
+
 
-        return search_results
+    @contextmanager
+    def track_request(self):
+        """
+        Measure a chat request with the current provider and model (see oracle_metrics.track_request).
+
+        Yields:
+            RequestMetrics: The request's measurements, also kept as last_request_metrics.
+        """
+        model = self.interpreter.llm.model_name
+        provider = "anthropic" if model in [self.ANTHROPIC_MODEL_NAME, self.ANTHROPIC_MODEL_NAME_HAIKU] else "openai"
+        with oracle_metrics.track_request(provider, model) as request:
+            self.last_request_metrics = request
+            yield request
 
 
     def chat(self, message):
@@ -476,17 +1262,85 @@ class OracleInterpreter:
         Returns:
             str: The Oracle AI's response to the user's message.
         """
+        with self.track_request() as request:
+            # Collect the streamed response into a single string
+            response_parts = []
+            for chunk in oracle_profile.profiler.iterate("llm", self.generate_response(message)):
+                request.first_chunk()
+                response_parts.append(chunk["content"])
+
+            # Run any commands and code blocks found in the response
+            response_text, _ = self.process_response("".join(response_parts))
+
+        # Return the final response text
+        return response_text
+
+
+    def chat_stream(self, message):
+        """
+        Engage in a chat conversation with the Oracle AI, yielding the response as it is generated.
+
+        Works like chat, but instead of blocking until the full completion returns it yields typed chunks
+        as soon as the provider sends them. Every chunk is a dict with a "type" and a "content" string:
+
+            "text"              A delta of the model's prose.
+            "code"              A delta of a code block, including its fences. Carries "format" (the
+                                language) when the provider reports it.
+            "console"           Console output from code run by Open Interpreter, including its fences.
+            "execution_result"  The result of a code block executed by execute_code, sent after the reply.
+
+        Joining the content of the text, code and console chunks gives the same Markdown that chat returns
+        before execution results are spliced in.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Yields:
+            dict: The next chunk of the response.
+        """
+        with self.track_request() as request:
+            response_parts = []
+            for chunk in oracle_profile.profiler.iterate("llm", self.generate_response(message)):
+                request.first_chunk()
+                response_parts.append(chunk["content"])
+                yield chunk
+
+            _, execution_results = self.process_response("".join(response_parts))
+            for execution_result in execution_results:
+                yield {"type": "execution_result", "content": f"\nExecution Result:\n{execution_result}\n"}
+
+
+    def generate_response(self, message):
+        """
+        Stream the raw response to a message from the selected language model or tool.
+
+        Handles the Google Custom Search and web browser requests in OS mode, Open Interpreter for OpenAI
+        models and OS mode, and litellm for the Anthropic models. Nothing in the response is executed here;
+        see process_response.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Yields:
+            dict: Chunks of the response, in the format described in chat_stream.
+        """
         if self.interpreter.os:
-            # Check if the message contains a Google Custom Search request
+            # Extract every Google Custom Search query from the message; a call the pattern can't read (single
+            # quotes, say) is left to the language model like any other message
+            search_queries = []
             if "self.interpreter.computer.google_search(" in message:
-                # Extract the search query from the message
-                search_query = re.findall(r'self\.interpreter\.computer\.google_search\("(.+?)"\)', message)[0]
-                
-                # Perform the web search using the Google Custom Search API
-                search_results = self.perform_google_search(search_query)
+                search_queries = re.findall(r'self\.interpreter\.computer\.google_search\("(.+?)"\)', message)
+
+            # Check if the message contains a Google Custom Search request
+            if search_queries:
+                # Perform the web searches concurrently using the Google Custom Search API
+                search_results = self.perform_google_searches(search_queries)
                 
-                # Generate a response based on the search results
-                response_text = f"Here are the results of the Google Custom Search for '{search_query}':\n\n{search_results}"
+                # Generate a response based on the search results, in the order they were asked for
+                yield {"type": "text", "content": "\n\n".join(
+                    f"Here are the results of the Google Custom Search for '{search_query}':\n\n{results}"
+                    for search_query, results in zip(search_queries, search_results)
+                )}
             
             # Check if the message contains a web browsing request
             elif "computer.browser.search(" in message:
@@ -494,16 +1348,20 @@ class OracleInterpreter:
                 search_query = re.findall(r'self\.interpreter\.computer\.browser\.search\("(.+?)"\)', message)[0]
                 
                 # Perform the web search
-                search_quality_reflection = self.interpreter.computer.browser.search(search_query)
+                started = time.perf_counter()
+                search_quality_reflection = self.load_open_interpreter().computer.browser.search(search_query)
+                oracle_metrics.record_search("browser", time.perf_counter() - started)
                 
                 # Generate a response based on the search quality reflection
-                response_text = f"Here are the results of the web search for '{search_query}':\n\n{search_quality_reflection}"
+                yield {"type": "text", "content": f"Here are the results of the web search for '{search_query}':\n\n{search_quality_reflection}"}
             
             else:
                 # Generate a response using the selected language model
-                response_text = self.interpreter.chat(message)
+                yield from self.stream_interpreter_chat(message)
         else:
             if self.interpreter.llm.model_name == self.OPENAI_MODEL_NAME:
+                self.load_open_interpreter()
+
                 # Log the API request details for OpenAI
                 logger.info(f"Making OpenAI API request with temperature: {self.interpreter.llm.temperature}, max_tokens: {self.interpreter.llm.max_tokens}")
                 
@@ -515,86 +1373,450 @@ class OracleInterpreter:
                 self.interpreter.llm.model_config["temperature"] = self.interpreter.llm.temperature
                 self.interpreter.llm.model_config["max_tokens"] = self.interpreter.llm.max_tokens
                 
-                # Generate a response using the OpenAI model
-                response = self.interpreter.chat(message)
-                
-                # Restore the original temperature and max_tokens values
-                self.interpreter.llm.model_config["temperature"] = original_temperature
-                self.interpreter.llm.model_config["max_tokens"] = original_max_tokens
-                
-                # Convert the response from JSON to Markdown format
-                response_text = self.json_to_markdown(response)
+                try:
+                    # Generate a response using the OpenAI model
+                    yield from self.stream_interpreter_chat(message)
+                finally:
+                    # Restore the original temperature and max_tokens values
+                    self.interpreter.llm.model_config["temperature"] = original_temperature
+                    self.interpreter.llm.model_config["max_tokens"] = original_max_tokens
                 
             elif self.interpreter.llm.model_name in [self.ANTHROPIC_MODEL_NAME, self.ANTHROPIC_MODEL_NAME_HAIKU]:
-                # Prepare the messages for the Anthropic API request
-                messages = [
-                    {"role": "system", "content": self.interpreter.system_message},
-                    {"role": "user", "content": message}
-                ]
-                
-                # Log the API request details for Anthropic
-                logger.info(f"Sending messages to Anthropic API with temperature: {self.interpreter.llm.temperature}, max_tokens: {self.interpreter.llm.max_tokens}")
-                logger.info(f"Messages: {messages}")
+                request, cache_key, cached = self.prepare_anthropic_request(message)
+
+                # Serve repeated requests from the response cache
+                if cached is not None:
+                    logger.info("Serving Anthropic response from the response cache")
+                    self.note_cache_hit()
+                    yield from cached
+                    self.remember_turn(message, cached)
+                    return
                 
                 try:
-                    # Make the API request to Anthropic using the make_api_call wrapper
-                    response = make_api_call(
-                        completion,
-                        model=self.interpreter.llm.model_name,
-                        messages=messages,
-                        max_tokens=self.interpreter.llm.max_tokens,
-                        temperature=self.interpreter.llm.temperature
-                    )
-                    
-                    # Log the response received from the Anthropic API
-                    logger.info(f"Received response from Anthropic API: {response}")
-                    
-                    # Extract the response text from the API response
-                    response_text = response.choices[0].message.content
+                    # Make the API request to Anthropic, failing over to OpenAI if enabled
+                    response, model_name = self.open_anthropic_stream(request)
+                    self.note_answering_model(model_name)
+
+                    # Pass each delta on as soon as it arrives, tagged as text or code
+                    chunks = []
+                    tagger = CodeFenceTagger()
+                    for chunk in response:
+                        if getattr(chunk, "usage", None):
+                            self.record_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            with oracle_profile.profiler.stage("render"):
+                                tagged_chunks = tagger.feed(delta)
+                            for tagged in tagged_chunks:
+                                chunks.append(tagged)
+                                yield tagged
+                    for tagged in tagger.flush():
+                        chunks.append(tagged)
+                        yield tagged
+
+                    if cache_key and model_name == request["model"]:
+                        self.response_cache.put(cache_key, chunks)
+                    self.remember_turn(message, chunks)
+
+                    # Log that the response from the Anthropic API is complete
+                    logger.info("Received response from Anthropic API")
                     
                 except Exception as e:
                     # Log any errors that occur during the API request
                     logger.error(f"Error from Anthropic API: {str(e)}")
                     raise e
 
-        # Check if response_text is a list and extract the content if necessary
-        if isinstance(response_text, list) and len(response_text) > 0:
-            response_text = response_text[0].get('content', '')
+
+    def prepare_anthropic_request(self, message):
+        """
+        Build the Anthropic request for a message and look it up in the response cache.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Returns:
+            tuple: The request (see anthropic_request), its cache key (None if uncacheable) and the cached
+                chunks (None on a miss).
+        """
+        request = self.anthropic_request(message)
+        cache_key = self.response_cache_key(request["messages"])
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        return request, cache_key, cached
+
+
+    def anthropic_request(self, message):
+        """
+        Build the litellm completion arguments for sending a message to an Anthropic model.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Returns:
+            dict: The model, messages, max_tokens and temperature for the request.
+        """
+        # Prepare the messages for the Anthropic API request. The static prompt is marked as a cache breakpoint,
+        # so Anthropic serves it from its prompt cache and only the short suffix and the message are prefilled.
+        # The recent turns that fit the history budget go between the system message and the new message.
+        content = self.with_memory_context(message)
+        history = self.history.window(self.history_budget_for(content))
+        messages = [
+            {"role": "system", "content": [
+                {"type": "text", "text": ORACLE_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": self.system_message_tail()}
+            ]},
+            *history,
+            {"role": "user", "content": content}
+        ]
+        
+        # Log the API request details for Anthropic
+        logger.info(f"Sending messages to Anthropic API with temperature: {self.interpreter.llm.temperature}, max_tokens: {self.interpreter.llm.max_tokens}")
+        logger.info(f"Messages: {messages}")
+
+        return {
+            "model": self.interpreter.llm.model_name,
+            "messages": messages,
+            "max_tokens": self.interpreter.llm.max_tokens,
+            "temperature": self.interpreter.llm.temperature,
+            # Ask for the usage chunk at the end of the stream, which reports the cached prompt tokens
+            "stream_options": {"include_usage": True}
+        }
+
+
+    def open_anthropic_stream(self, request):
+        """
+        Start streaming an Anthropic completion, failing over to the OpenAI model if enabled.
+
+        If the Anthropic request fails with a transient error after its retries, or Anthropic's circuit
+        breaker is open, and failover is on, the same request is sent to OPENAI_MODEL_NAME instead. Failover
+        is per request: once the breaker lets a trial request through and it succeeds, requests go back to
+        Anthropic.
+
+        Args:
+            request (dict): The completion arguments, from anthropic_request.
+
+        Returns:
+            tuple: The completion stream and the name of the model that is answering.
+        """
+        try:
+            return make_api_call(completion, provider="anthropic", stream=True, **request), request["model"]
+        except Exception as e:
+            if not self.should_fail_over(e):
+                raise e
+        logger.warning(f"Anthropic is unavailable; failing over to {self.OPENAI_MODEL_NAME}")
+        return make_api_call(completion, provider="openai", stream=True, **self.failover_request(request)), self.OPENAI_MODEL_NAME
+
+
+    async def aopen_anthropic_stream(self, request):
+        """
+        The asyncio counterpart of open_anthropic_stream.
+        """
+        try:
+            return await make_api_call_async(acompletion, provider="anthropic", stream=True, **request), request["model"]
+        except Exception as e:
+            if not self.should_fail_over(e):
+                raise e
+        logger.warning(f"Anthropic is unavailable; failing over to {self.OPENAI_MODEL_NAME}")
+        return await make_api_call_async(acompletion, provider="openai", stream=True, **self.failover_request(request)), self.OPENAI_MODEL_NAME
+
+
+    def failover_request(self, request):
+        """
+        Turn an Anthropic request into the same request for OPENAI_MODEL_NAME.
+
+        The system message's content blocks (and their Anthropic cache_control marker) are joined back into
+        one string; OpenAI caches the prompt prefix on its own.
+
+        Args:
+            request (dict): The completion arguments, from anthropic_request.
+
+        Returns:
+            dict: The completion arguments for the OpenAI model.
+        """
+        messages = []
+        for message in request["messages"]:
+            if isinstance(message["content"], list):
+                message = dict(message, content="\n\n".join(block["text"] for block in message["content"]))
+            messages.append(message)
+        return dict(request, model=self.OPENAI_MODEL_NAME, messages=messages)
+
+
+    def record_usage(self, usage):
+        """
+        Record the token usage reported at the end of a completion stream.
+
+        The number of prompt tokens read from the provider's prompt cache is found under Anthropic's name
+        (cache_read_input_tokens) or OpenAI's (prompt_tokens_details.cached_tokens), whichever the provider sent.
+
+        Args:
+            usage: The usage object (or dict) from the final chunk of the stream.
+        """
+        def field(source, name):
+            value = source.get(name) if isinstance(source, dict) else getattr(source, name, None)
+            return value if isinstance(value, int) else None
+
+        cached = field(usage, "cache_read_input_tokens")
+        if cached is None:
+            details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+            cached = field(details, "cached_tokens") if details is not None else None
+
+        self.last_usage = {
+            "prompt_tokens": field(usage, "prompt_tokens") or 0,
+            "completion_tokens": field(usage, "completion_tokens") or 0,
+            "cached_tokens": cached or 0,
+            "cache_write_tokens": field(usage, "cache_creation_input_tokens") or 0
+        }
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] += value
+
+        request = oracle_metrics.current_request.get()
+        if request is not None:
+            for key, value in self.last_usage.items():
+                setattr(request, key, getattr(request, key) + value)
+        logger.info(f"Prompt cache: {self.last_usage['cached_tokens']} of {self.last_usage['prompt_tokens']} prompt tokens read from cache, {self.last_usage['cache_write_tokens']} written")
+
+
+    def note_cache_hit(self):
+        """
+        Mark the request being measured as answered from the response cache.
+        """
+        request = oracle_metrics.current_request.get()
+        if request is not None:
+            request.cache_hit = True
+
+
+    def note_answering_model(self, model_name):
+        """
+        Attribute the request being measured to the model that actually answered it (after a failover).
+        """
+        request = oracle_metrics.current_request.get()
+        if request is not None and request.model != model_name:
+            request.model = model_name
+            request.provider = "openai" if model_name == self.OPENAI_MODEL_NAME else "anthropic"
+
+
+    def should_fail_over(self, error):
+        """
+        Decide whether a failed Anthropic request should be sent to OpenAI instead.
+
+        Args:
+            error (Exception): The error the Anthropic request ended with.
+
+        Returns:
+            bool: True if failover is enabled and the error means Anthropic is unavailable.
+        """
+        return self.failover and (isinstance(error, CircuitOpenError) or default_retry_policy.is_retryable(error))
+
+
+    def stream_interpreter_chat(self, message):
+        """
+        Stream a chat through Open Interpreter as typed chunks.
+
+        Open Interpreter streams LMC messages ({"role", "type", "content"} with "start" and "end" flags).
+        They are rendered to the same Markdown as json_to_markdown, one chunk at a time, by
+        TranscriptRenderer.render_chunk.
+
+        Repeated requests are served from the response cache; the cached turn is still added to Open
+        Interpreter's message history so the conversation carries on as if it had run. Only replies that are
+        all text are cached: Open Interpreter runs the code it writes as it goes, and replaying a turn's code and
+        console output would claim code ran (files written, state changed) when nothing did.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Yields:
+            dict: Chunks of the response, in the format described in chat_stream.
+        """
+        interpreter = self.load_open_interpreter()
+
+        # Open Interpreter keeps the user's message in its history, so this turn's memory excerpts go at the end
+        # of the system message instead, where the next turn's replace them rather than pile up
+        context = self.memory_context(message)
+
+        # Keep Open Interpreter's history (code and console output included) within the budget; what falls out
+        # is summarized in the background and the summary rides along at the end of the system message
+        interpreter.messages = self.history.fit(list(interpreter.messages), self.history_budget_for(context, message))
+        interpreter.system_message = ORACLE_SYSTEM_PROMPT + "\n\n" + self.system_message_tail() + ("\n\n" + context if context else "")
+
+        history = list(interpreter.messages) + [{"role": "user", "type": "message", "content": message}]
+
+        # Serve repeated requests from the response cache
+        cache_key = self.response_cache_key(history)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None and all(chunk["type"] == "text" for chunk in cached):
+            logger.info("Serving Open Interpreter response from the response cache")
+            self.note_cache_hit()
+            interpreter.messages = history + [{"role": "assistant", "type": "message", "content": "".join(chunk["content"] for chunk in cached)}]
+            yield from cached
+            return
+
+        chunks = []
+        for item in interpreter.chat(message, display=False, stream=True):
+            with oracle_profile.profiler.stage("render"):
+                chunk = TranscriptRenderer.render_chunk(item)
+            if chunk is not None:
+                chunks.append(chunk)
+                yield chunk
+
+        if cache_key and all(chunk["type"] == "text" for chunk in chunks):
+            self.response_cache.put(cache_key, chunks)
+
+
+    def process_response(self, response_text):
+        """
+        Act on a complete response: launch the GUI if asked to and execute any code blocks.
+
+        Args:
+            response_text (str): The complete response text.
+
+        Returns:
+            tuple: The response text with each code block's execution result spliced in, and the list of
+                execution results in the order the code blocks appear.
+        """
+        execution_results = []
 
         # Check if the response contains the "echo open aux gui" command
         if "echo open aux gui" in response_text.lower():
             # If the command is found, launch the auxiliary GUI
             self.launch_aux_gui()
 
-        # Check if the response contains code blocks (indicated by triple backticks)
-        if "```" in response_text:
-            # Split the response text into code blocks and surrounding text
-            code_blocks = response_text.split("```")
-            
-            # Iterate over the code blocks (skipping the surrounding text)
-            for i in range(1, len(code_blocks), 2):
-                # Extract the code block
-                code = code_blocks[i]
-                
-                # Execute the code and capture the execution result
-                execution_result = self.execute_code(code)
-                
-                # Replace the original code block with the code block and its execution result
+        # Extracting the code blocks is timed apart from running them
+        with oracle_profile.profiler.stage("extract_code"):
+            # Split the response text into code blocks and surrounding text (indicated by triple backticks);
+            # every other part is a code block
+            code_blocks = response_text.split("```")[1::2] if "```" in response_text else []
+
+        if not code_blocks:
+            return response_text, execution_results
+
+        # Execute the code blocks (independent ones in parallel) and capture their execution results
+        execution_results = self.execute_code_blocks(code_blocks)
+
+        with oracle_profile.profiler.stage("extract_code"):
+            # Replace each original code block with the code block and its execution result
+            for code, execution_result in zip(code_blocks, execution_results):
                 response_text = response_text.replace(f"```{code}```", f"```{code}\nExecution Result:\n{execution_result}```")
 
-        # Return the final response text
-        return response_text
+        return response_text, execution_results
         
+    async def achat(self, message):
+        """
+        Engage in a chat conversation with the Oracle AI without blocking the event loop.
+
+        The asyncio counterpart of chat. Anthropic requests go through litellm's async client, so one event
+        loop can keep many conversations in flight; Open Interpreter, the search tools and code execution
+        have no async API and run on worker threads.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Returns:
+            str: The Oracle AI's response to the user's message.
+        """
+        with self.track_request() as request:
+            response_parts = []
+            async for chunk in self.agenerate_response(message):
+                request.first_chunk()
+                response_parts.append(chunk["content"])
+            response_text, _ = await asyncio.to_thread(self.process_response, "".join(response_parts))
+        return response_text
+
+
+    async def achat_stream(self, message):
+        """
+        Engage in a chat conversation with the Oracle AI, yielding the response as it is generated.
+
+        The asyncio counterpart of chat_stream; yields the same chunks.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Yields:
+            dict: The next chunk of the response.
+        """
+        with self.track_request() as request:
+            response_parts = []
+            async for chunk in self.agenerate_response(message):
+                request.first_chunk()
+                response_parts.append(chunk["content"])
+                yield chunk
+
+            _, execution_results = await asyncio.to_thread(self.process_response, "".join(response_parts))
+            for execution_result in execution_results:
+                yield {"type": "execution_result", "content": f"\nExecution Result:\n{execution_result}\n"}
+
+
+    async def agenerate_response(self, message):
+        """
+        Stream the raw response to a message without blocking the event loop.
+
+        The asyncio counterpart of generate_response.
+
+        Args:
+            message (str): The user's message to the Oracle AI.
+
+        Yields:
+            dict: Chunks of the response, in the format described in chat_stream.
+        """
+        if self.interpreter.llm.model_name in [self.ANTHROPIC_MODEL_NAME, self.ANTHROPIC_MODEL_NAME_HAIKU] and not self.interpreter.os:
+            # Building the request (memory retrieval, history token counting) and the cache lookup read files and
+            # SQLite, so they run on a worker thread rather than stall every conversation on the loop
+            request, cache_key, cached = await asyncio.to_thread(self.prepare_anthropic_request, message)
+
+            # Serve repeated requests from the response cache
+            if cached is not None:
+                logger.info("Serving Anthropic response from the response cache")
+                self.note_cache_hit()
+                for chunk in cached:
+                    yield chunk
+                self.remember_turn(message, cached)
+                return
+
+            try:
+                # Make the API request to Anthropic, failing over to OpenAI if enabled
+                response, model_name = await self.aopen_anthropic_stream(request)
+                self.note_answering_model(model_name)
+
+                # Pass each delta on as soon as it arrives, tagged as text or code
+                chunks = []
+                tagger = CodeFenceTagger()
+                async for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        self.record_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        for tagged in tagger.feed(delta):
+                            chunks.append(tagged)
+                            yield tagged
+                for tagged in tagger.flush():
+                    chunks.append(tagged)
+                    yield tagged
+
+                if cache_key and model_name == request["model"]:
+                    await asyncio.to_thread(self.response_cache.put, cache_key, chunks)
+                self.remember_turn(message, chunks)
+
+                # Log that the response from the Anthropic API is complete
+                logger.info("Received response from Anthropic API")
+
+            except Exception as e:
+                # Log any errors that occur during the API request
+                logger.error(f"Error from Anthropic API: {str(e)}")
+                raise e
+        else:
+            # Open Interpreter and the search tools are blocking, so they run on a worker thread
+            async for chunk in iterate_in_thread(self.generate_response(message)):
+                yield chunk
+
+
     def perform_web_search(self, search_query):
         # Implement the logic to perform the web search using the LLM
         
-        # Example implementation using requests library (rough, probably not correct)
-        query = " "
-        search_url = f"https://www.googleapis.com/customsearch/v1?key={google_api_key}&cx={google_search_engine_id}&q={query}"
-        response = requests.get(search_url)
-        search_results = response.json()
-        
-        return search_results  
+        # Example implementation using the Google Custom Search client (rough, probably not correct)
+        return self.perform_google_search(search_query)
       
       
     def analyze_search_results(self, search_results):
@@ -659,7 +1881,7 @@ class OracleInterpreter:
         def run_gui():
             try:
                 # Create a new instance of the OracleGUI, passing the current instance, the controller, and the queue
-                self.aux_gui = OracleGUI(self, controller, queue)
+                self.aux_gui = lazy_import("delphi").OracleGUI(self, controller, queue)
                 
                 # Start the main event loop of the GUI
                 self.aux_gui.root.mainloop()
@@ -687,9 +1909,12 @@ class OracleInterpreter:
         """
         Convert JSON data to Markdown format.
         
-        This method takes JSON data representing a conversation and converts it to a Markdown-formatted string.
-        It iterates over each item in the JSON data and formats it based on its type (message, code, or console).
-        User messages are skipped in the output.
+        This method takes JSON data representing a conversation (Open Interpreter's messages) and converts it to a
+        Markdown-formatted string, formatting each item based on its type (message, code, or console). User messages
+        are skipped in the output.
+
+        The conversion is incremental: when json_data is the same conversation as last time with new messages
+        appended, only the new messages are converted (see TranscriptRenderer).
         
         Args:
             json_data (list): The JSON data to convert.
@@ -697,28 +1922,8 @@ class OracleInterpreter:
         Returns:
             str: The Markdown-formatted string representing the conversation.
         """
-        markdown_string = ""
-
-        # Iterate over each item in the JSON data
-        for item in json_data:
-            # Skip user messages
-            if item['role'] == 'user':
-                continue
-            
-            # Format message items
-            if item['type'] == 'message':
-                markdown_string += f"**{item['role'].capitalize()}:** \n{item['content']}\n\n"
-            
-            # Format code items
-            elif item['type'] == 'code':
-                markdown_string += f"```{item['format']}\n{item['content']}\n```\n\n"
-            
-            # Format console items
-            elif item['type'] == 'console':
-                markdown_string += f"```\n{item['content']}\n```\n\n"
-
-        # Return the resulting Markdown string
-        return markdown_string
+        with oracle_profile.profiler.stage("render"):
+            return self.transcript_renderer.render(json_data)
 
 
 def colored_print(text, color):
@@ -741,16 +1946,155 @@ def colored_print(text, color):
     }
     print(f"{color_codes[color]}{text}{color_codes['reset']}")
 
-def run_oracle_interpreter(queue):
-    process = subprocess.Popen(["python", "oracle.py"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, universal_newlines=True)
-    for line in process.stdout:
-        queue.put(line)
-    process.stdout.close()
-    process.wait()
+def print_startup_report(title="Startup report"):
+    """
+    Print how long each lazily imported module took to load, slowest first.
+
+    Modules that have not been needed yet are not listed; running the report again at exit shows
+    everything the session ended up loading.
+
+    Args:
+        title (str): The heading to print above the report.
+    """
+    print(f"{title}:")
+    for module_name, seconds in sorted(import_timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {module_name:<40} {seconds * 1000:9.1f} ms")
+    print(f"  {'time since oracle.py started':<40} {(time.perf_counter() - startup_started) * 1000:9.1f} ms")
+
+
+def run_oracle_interpreter(queue, controller, oracle_interpreter=None):
+    """
+    Start the controller's backend, if it isn't running, and put every event from it into queue.
+
+    Args:
+        queue (queue.Queue): Where the events go.
+        controller (OracleController): The controller whose backend to run.
+        oracle_interpreter (OracleInterpreter, optional): Give the backend this interpreter's directories and settings.
+    """
+    controller.backend.subscribe(queue.put)
+    controller.start(oracle_interpreter)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Oracle Interpreter Interactive Terminal")
+    parser.add_argument("--startup-report", action="store_true", help="print per-module import times when the prompt is ready and on exit")
+    parser.add_argument("--cache", choices=["auto", "always", "off"], default="auto", help="response cache mode; 'auto' caches temperature-0 requests only (default: auto)")
+    parser.add_argument("--failover", action="store_true", help="answer Anthropic requests with the OpenAI model while Anthropic is unavailable")
+    parser.add_argument("--metrics-file", metavar="PATH", help="write request metrics in the Prometheus text format to PATH every 15 seconds (e.g. for node_exporter's textfile collector)")
+    parser.add_argument("--profile", nargs="?", const="timers", choices=["timers", "cpu", "memory", "full"], help="time each stage of every turn into oracle_logs/profiles; 'cpu' adds a cProfile .pstats per turn, 'memory' a tracemalloc allocation report, 'full' both (default: timers)")
+    parser.add_argument("--exec-timeout", type=float, default=60, metavar="SECONDS", help="stop a code block that runs longer than this (default: 60)")
+    parser.add_argument("--turn-timeout", type=float, default=600, metavar="SECONDS", help="restart the GUI's backend process if one turn runs longer than this (default: 600)")
+    parser.add_argument("--gui-scrollback", type=int, default=5000, metavar="LINES", help="lines the auxiliary GUI's conversation pane keeps; older ones move to oracle_logs/transcript_*.jsonl (default: 5000)")
+    parser.add_argument("--output-filter", action="append", metavar="REGEX", help="drop terminal output lines matching REGEX from the GUI, on top of the built-in filters (repeatable)")
+    parser.add_argument("--music", metavar="PATH", help="loop this music file (mp3, ogg or wav) in the background while the auxiliary GUI is open")
+    parser.add_argument("--memory-context", type=int, default=1000, metavar="TOKENS", help="estimated tokens of relevant memory-directory excerpts to put in front of each message; 0 turns it off (default: 1000)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve_parser = subparsers.add_parser("serve", help="host many isolated sessions over a local HTTP/WebSocket API")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    serve_parser.add_argument("--sessions-dir", default="oracle_sessions", help="where session workspaces are created (default: oracle_sessions)")
+    serve_parser.add_argument("--idle-timeout", type=float, default=1800, help="seconds of inactivity before a session is evicted (default: 1800)")
+    serve_parser.add_argument("--max-sessions", type=int, default=100, help="the most sessions open at once (default: 100)")
+
+    batch_parser = subparsers.add_parser("batch", help="run a JSONL file of requests with bounded concurrency")
+    batch_parser.add_argument("input", help="JSONL file of requests, one {\"id\": ..., \"message\": ...} object per line")
+    batch_parser.add_argument("--out", required=True, help="JSONL file results are appended to; ids already completed there are skipped")
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="number of requests in flight at once (default: 4)")
+    batch_parser.add_argument("--provider-limit", action="append", metavar="PROVIDER=N", help="cap concurrent requests to one provider, e.g. Anthropic=2 (repeatable)")
+    batch_parser.add_argument("--provider", choices=["OpenAI", "Anthropic", "Anthropic-Haiku"], help="provider for requests that don't name one (default: OpenAI)")
+    batch_parser.add_argument("--temperature", type=float, help="temperature for requests that don't set one")
+    batch_parser.add_argument("--max-tokens", type=int, help="max_tokens for requests that don't set it")
+
+    logs_parser = subparsers.add_parser("logs", help="search the session logs in oracle_logs")
+    logs_subparsers = logs_parser.add_subparsers(dest="logs_command", required=True)
+    logs_search_parser = logs_subparsers.add_parser("search", help="find the user/bot exchanges that best match a query")
+    logs_search_parser.add_argument("query", help="words, \"quoted phrases\", AND/OR/NOT and prefix* are understood")
+    logs_search_parser.add_argument("--since", help="only exchanges since an age (7d, 12h, 2w) or a date (2024-05-01)")
+    logs_search_parser.add_argument("--model", help="only exchanges answered by this model, e.g. gpt-4o")
+    logs_search_parser.add_argument("--limit", type=int, default=10, help="the most results to show (default: 10)")
+    logs_search_parser.add_argument("--json", action="store_true", help="print the results as JSON lines")
+    logs_subparsers.add_parser("index", help="index new log files and appended lines without searching")
+
+    profile_parser = subparsers.add_parser("profile", help="read the turn profiles written with --profile")
+    profile_subparsers = profile_parser.add_subparsers(dest="profile_command", required=True)
+    profile_summary_parser = profile_subparsers.add_parser("summary", help="rank the slowest stages of a profiled session")
+    profile_summary_parser.add_argument("file", nargs="?", help="session file to summarize (default: the latest in oracle_logs/profiles)")
+    profile_summary_parser.add_argument("--slowest", type=int, default=5, help="how many of the slowest turns to list (default: 5)")
+
+    args = parser.parse_args()
+
+    if args.metrics_file:
+        oracle_metrics.start_file_exporter(args.metrics_file)
+
+    if args.profile:
+        oracle_profile.profiler.enable(args.profile)
+
+    if args.command == "profile":
+        path = args.file or oracle_profile.latest_session()
+        if path is None:
+            print(f"No profiles in {oracle_profile.PROFILES_DIRECTORY}; run 'python oracle.py --profile' first.")
+            sys.exit(1)
+        print(path)
+        print(oracle_profile.format_summary(oracle_profile.load_session(path), slowest=args.slowest))
+        sys.exit(0)
+
+    if args.command == "logs":
+        oracle_logindex = lazy_import("oracle_logindex")
+        log_index = oracle_logindex.LogIndex(logs_directory="oracle_logs")
+
+        if args.logs_command == "index":
+            started = time.perf_counter()
+            counts = log_index.update()
+            print(f"Indexed {counts['pairs']} new exchanges from {counts['updated']} of {counts['files']} log files in {time.perf_counter() - started:.2f}s")
+            sys.exit(0)
+
+        try:
+            since = oracle_logindex.parse_since(args.since) if args.since else None
+        except ValueError as e:
+            parser.error(str(e))
+
+        log_index.update()
+        started = time.perf_counter()
+        results = log_index.search(args.query, since=since, model=args.model, limit=args.limit, refresh=False)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for result in results:
+            if args.json:
+                print(json.dumps(result))
+                continue
+            colored_print(f"{result['timestamp']}  {result['model'] or 'unknown model'}  {os.path.basename(result['file'])}", "amber")
+            print(f"  User: {result['user_message'][:200]}")
+            print(f"  Oracle: {result['bot_response'][:400]}")
+            print(f"  ... {result['snippet']}")
+            print()
+        if not args.json:
+            print(f"{len(results)} result(s) in {elapsed:.1f} ms")
+        sys.exit(0)
+
+    # Warm up the code execution workers in the background, so the first code block doesn't wait for them
+    lazy_import("oracle_executor").get_default_pool()
+
+    if args.command == "serve":
+        lazy_import("oracle_server").serve(
+            OracleInterpreter,
+            host=args.host,
+            port=args.port,
+            sessions_directory=args.sessions_dir,
+            idle_timeout=args.idle_timeout,
+            max_sessions=args.max_sessions,
+            cache_mode=args.cache,
+            failover=args.failover,
+            memory_context_tokens=args.memory_context,
+            execution_timeout=args.exec_timeout
+        )
+        sys.exit(0)
+
     # Create an instance of the OracleController
-    controller = OracleController()
+    output_filters = oracle_output.DEFAULT_FILTERS + (args.output_filter or [])
+    try:
+        controller = OracleController(output_filters, turn_timeout=args.turn_timeout)
+    except re.error as e:
+        parser.error(f"--output-filter: {e}")
     
     # Set the Open Interpreter house keeping stack
     open_interpreter_directory = "OpenInterpreter"
@@ -770,9 +2114,47 @@ if __name__ == "__main__":
     
     # Unstructured semiotics long-term storage
     acheron_directory = "acheron"
+
+    if args.command == "batch":
+        oracle_batch = lazy_import("oracle_batch")
+
+        def create_batch_interpreter():
+            # Every worker gets its own Open Interpreter so requests don't share history
+            batch_interpreter = OracleInterpreter(allowed_directory, storage_directory, aetherion_directory, athenium_directory, acheron_directory, open_interpreter_directory, shared_interpreter=False)
+            batch_interpreter.cache_mode = args.cache
+            batch_interpreter.failover = args.failover
+            batch_interpreter.memory_context_tokens = args.memory_context
+            batch_interpreter.execution_timeout = args.exec_timeout
+            return batch_interpreter
+
+        try:
+            provider_limits = oracle_batch.parse_provider_limits(args.provider_limit, OracleInterpreter.PROVIDERS)
+        except ValueError as e:
+            parser.error(str(e))
+
+        runner = oracle_batch.BatchRunner(
+            create_batch_interpreter,
+            concurrency=args.concurrency,
+            provider_limits=provider_limits,
+            defaults={"provider": args.provider, "temperature": args.temperature, "max_tokens": args.max_tokens}
+        )
+        try:
+            counters = runner.run(args.input, args.out)
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        if args.metrics_file:
+            oracle_metrics.registry.write(args.metrics_file)
+        sys.exit(1 if counters["failed"] else 0)
     
     # Create an instance of the OracleInterpreter with the allowed and storage directories
     oracle_interpreter = OracleInterpreter(allowed_directory, storage_directory, aetherion_directory, athenium_directory, acheron_directory, open_interpreter_directory)
+    oracle_interpreter.cache_mode = args.cache
+    oracle_interpreter.failover = args.failover
+    oracle_interpreter.memory_context_tokens = args.memory_context
+    oracle_interpreter.execution_timeout = args.exec_timeout
+    oracle_interpreter.gui_scrollback_lines = args.gui_scrollback
+    oracle_interpreter.background_music = args.music
     
     # Create a queue for communication between the main thread and the GUI thread
     queue = queue.Queue()
@@ -803,8 +2185,15 @@ if __name__ == "__main__":
     print(" ")
     print(" ")
     colored_print(" 'Type 'quit' to exit.' ", "amber")
+    colored_print(" 'Type '!stats' to see request latency, token and cache metrics.' ", "amber")
+    if args.profile:
+        colored_print(" 'Profiling every turn; type '!profile' to see the slowest stages.' ", "amber")
     print(" ")
     print(" ")
+
+    if args.startup_report:
+        print_startup_report()
+        print(" ")
     
     # Start the main loop for user interaction
     while True:
@@ -813,10 +2202,36 @@ if __name__ == "__main__":
         if user_message.lower() == 'quit':
             oracle_interpreter.save_conversation_log()
             break
+
+        # Request metrics for this session so far
+        if user_message.strip().lower() == '!stats':
+            print(oracle_metrics.format_stats())
+            continue
         
-        response = oracle_interpreter.parse_command(user_message)
-        print(response)
+        # Where this session's turns went, with --profile
+        if user_message.strip().lower() == '!profile':
+            print(oracle_profile.format_summary(oracle_profile.profiler.records))
+            continue
+        
+        # Print the response as it streams in
+        response_parts = []
+        with oracle_profile.profiler.turn(user_message):
+            for chunk in oracle_interpreter.parse_command(user_message, stream=True) or []:
+                with oracle_profile.profiler.stage("print"):
+                    print(chunk["content"], end="", flush=True)
+                response_parts.append(chunk["content"])
+            print()
+        response = "".join(response_parts)
         
         oracle_interpreter.log_interaction(user_message, response)
 
-    oracle_interpreter.save_conversation_log()
\ No newline at end of file
+    oracle_interpreter.save_conversation_log()
+
+    if args.metrics_file:
+        oracle_metrics.registry.write(args.metrics_file)
+
+    if oracle_profile.profiler.path:
+        print(f"Turn profiles written to {oracle_profile.profiler.path}; summarize them with 'python oracle.py profile summary'.")
+
+    if args.startup_report:
+        print_startup_report("Modules loaded this session")
\ No newline at end of file
@@ -0,0 +1,373 @@
+# benchmarks.py
+# Microbenchmarks for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Run from the project folder with 'python oracleTests/benchmarks.py'. Everything runs offline: litellm's
+# completion and Open Interpreter are swapped for the deterministic fake provider in fake_provider.py, and
+# the Oracle works in a throwaway folder so nothing is written to the real oracleData or oracle_logs.
+#
+# Results are written as JSON (oracleTests/results/<timestamp>_<commit>.json by default), tagged with the
+# commit, so a run can be compared against an earlier one:
+#
+#     python oracleTests/benchmarks.py --compare oracleTests/results/20240501_120000_1a2b3c4.json
+#
+# which prints the change in each benchmark's median and exits with status 1 if any got slower than
+# --threshold allows. The GUI benchmarks need delphi's dependencies (ttkbootstrap, pygame, ...) installed,
+# but not a display; without them they are reported as skipped.
+
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIRECTORY = os.path.dirname(TESTS_DIRECTORY)
+RESULTS_DIRECTORY = os.path.join(TESTS_DIRECTORY, "results")
+
+sys.path.insert(0, PROJECT_DIRECTORY)
+sys.path.insert(0, TESTS_DIRECTORY)
+
+# oracle.py exports the API keys at import time; the fake provider never uses them
+os.environ.setdefault("ANTHROPIC_API_KEY", "offline-benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import fake_provider
+
+
+DIRECTORIES = ("antikythera", "alexandria", "aetherion", "athenium", "acheron", "OpenInterpreter")
+
+
+def measure(function, repeat=5, number=1, setup=None):
+    """
+    Time a function, the way timeit does, but with a setup step before every repeat.
+
+    Args:
+        function (callable): The code to time, called number times per repeat.
+        repeat (int): How many timed repeats.
+        number (int): Calls per repeat.
+        setup (callable, optional): Called (untimed) before each repeat and the warmup.
+
+    Returns:
+        list: The seconds per call of each repeat.
+    """
+    if setup:
+        setup()
+    function()
+
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return timings
+
+
+def summarize(timings, items=None, extra=None):
+    """
+    Turn a list of timings into the JSON recorded for a benchmark.
+
+    Args:
+        timings (list): Seconds per call.
+        items (int, optional): Items processed per call, to report a throughput.
+        extra (dict, optional): More fields to record.
+
+    Returns:
+        dict: median, min, mean and stdev (seconds per call), repeats, and items_per_second if items was given.
+    """
+    result = {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "repeats": len(timings)
+    }
+    if items:
+        result["items"] = items
+        result["items_per_second"] = items / result["median"]
+    if extra:
+        result.update(extra)
+    return result
+
+
+class BenchmarkSuite:
+    """
+    The benchmarks, run against one OracleInterpreter in a throwaway working folder.
+
+    Attributes:
+        scale (float): Multiplies the sizes of the inputs; --quick runs at a tenth.
+        repeat (int): Timed repeats per benchmark.
+        results (dict): Benchmark name -> recorded result.
+    """
+
+    def __init__(self, scale=1.0, repeat=5):
+        self.scale = scale
+        self.repeat = repeat
+        self.results = {}
+
+        self.workspace = tempfile.mkdtemp(prefix="oracle_benchmarks_")
+        self.original_directory = os.getcwd()
+        os.chdir(self.workspace)
+        for directory in DIRECTORIES:
+            os.makedirs(directory, exist_ok=True)
+
+        import oracle
+        import oracle_history
+        self.oracle = oracle
+
+        # Settle the token counter first, so it doesn't switch from estimates to tiktoken halfway through
+        oracle_history.load_encoder()
+        deadline = time.monotonic() + 30
+        while oracle_history.encoder_state == "loading" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.token_counter = "tiktoken" if oracle_history.encoder is not None else "estimate"
+
+    def size(self, value):
+        return max(int(value * self.scale), 1)
+
+    def create_interpreter(self, provider, path="anthropic"):
+        """
+        Create an OracleInterpreter answering through the fake provider.
+
+        Args:
+            provider (FakeProvider): The fake provider.
+            path (str): "anthropic" for the litellm path, or "interpreter" for the Open Interpreter path.
+        """
+        oracle_interpreter = self.oracle.OracleInterpreter(*DIRECTORIES, shared_interpreter=False)
+        oracle_interpreter.interpreter.os = False
+        oracle_interpreter.cache_mode = "off"
+        if path == "anthropic":
+            oracle_interpreter.switch_llm_model("Anthropic")
+        else:
+            fake = fake_provider.FakeInterpreter(provider, model_name=oracle_interpreter.OPENAI_MODEL_NAME)
+            fake.system_message = oracle_interpreter.interpreter.system_message
+            oracle_interpreter.interpreter = fake
+        self.oracle.completion = provider.completion
+        return oracle_interpreter
+
+    def record(self, name, result):
+        self.results[name] = result
+        if "skipped" in result:
+            print(f"  {name:<34} skipped: {result['skipped']}")
+            return
+        throughput = f"  {result['items_per_second']:>12,.0f} items/s" if "items_per_second" in result else ""
+        print(f"  {name:<34} {result['median'] * 1000:>10.3f} ms{throughput}")
+
+    def bench_chat(self, name, path, shape, first_token_latency=0.0):
+        """
+        Time OracleInterpreter.chat end to end, and the Oracle's overhead on top of the provider.
+        """
+        response = fake_provider.generate_response(shape, words=self.size(400), code_blocks=2)
+        provider = fake_provider.FakeProvider(response, chunk_size=16, first_token_latency=first_token_latency)
+        oracle_interpreter = self.create_interpreter(provider, path)
+
+        def setup():
+            # Every chat starts from an empty history, so the requests stay the same size (and nothing is summarized)
+            oracle_interpreter.history.clear()
+            if path == "interpreter":
+                oracle_interpreter.interpreter.messages = []
+            provider.reset()
+
+        provider_timings = []
+
+        def chat():
+            oracle_interpreter.chat("Summarize the latest notes in athenium.")
+            provider_timings.append(provider.provider_seconds)
+
+        timings = measure(chat, repeat=self.repeat * 10, setup=setup)
+        # The first entry is the warmup's
+        provider_seconds = statistics.median(provider_timings[1:])
+        self.record(name, summarize(timings, extra={
+            "provider_seconds": provider_seconds,
+            "overhead_seconds": statistics.median(timings) - provider_seconds,
+            "response_chars": len(response)
+        }))
+
+    def bench_json_to_markdown(self):
+        transcript = fake_provider.generate_transcript(self.size(10000))
+        oracle_interpreter = self.create_interpreter(fake_provider.FakeProvider(""))
+
+        # The whole transcript from scratch
+        def reset():
+            oracle_interpreter.transcript_renderer = self.oracle.TranscriptRenderer()
+
+        timings = measure(lambda: oracle_interpreter.json_to_markdown(transcript), repeat=self.repeat, setup=reset)
+        self.record("json_to_markdown", summarize(timings, items=len(transcript)))
+
+        # A long session: the transcript is rendered again after every turn (four messages) is appended
+        messages = []
+
+        def session():
+            for start in range(0, len(transcript), 4):
+                messages.extend(transcript[start:start + 4])
+                oracle_interpreter.json_to_markdown(messages)
+
+        timings = measure(session, repeat=self.repeat, setup=lambda: (reset(), messages.clear()))
+        self.record("json_to_markdown_per_turn", summarize([timing / (len(transcript) // 4) for timing in timings], extra={"turns": len(transcript) // 4}))
+
+    def bench_process_response(self):
+        # A large response with many small code blocks: extraction and result splicing dominate
+        response = fake_provider.generate_response("code", words=self.size(100000), code_blocks=self.size(200), code_lines=3)
+        oracle_interpreter = self.create_interpreter(fake_provider.FakeProvider(""))
+        timings = measure(lambda: oracle_interpreter.process_response(response), repeat=self.repeat)
+        self.record("process_response", summarize(timings, items=self.size(200), extra={"response_chars": len(response)}))
+
+    def load_gui(self):
+        """
+        Return the OracleGUI class without creating a window, or the reason it can't be imported.
+        """
+        try:
+            import delphi
+        except Exception as e:
+            return None, f"delphi can't be imported ({type(e).__name__}: {e})"
+        # The text helpers don't touch the window, so an uninitialized instance is enough
+        gui = delphi.OracleGUI.__new__(delphi.OracleGUI)
+        gui.output_classifier = delphi.OutputClassifier()
+        return gui, None
+
+    def bench_classify_output(self):
+        # The terminal capture's per-line work, shared by the GUI and the controller
+        import oracle_output
+        lines = fake_provider.generate_terminal_lines(self.size(100000))
+        classifier = oracle_output.OutputClassifier()
+        timings = measure(lambda: [classifier.classify(line) for line in lines], repeat=self.repeat, setup=classifier.reset)
+        self.record("classify_output", summarize(timings, items=len(lines), extra={"counts": dict(classifier.counts)}))
+
+    def bench_gui(self):
+        gui, reason = self.load_gui()
+        names = ("format_output", "is_unwanted_message", "extract_conversation_pairs")
+        if gui is None:
+            for name in names:
+                self.record(name, {"skipped": reason})
+            return
+
+        lines = fake_provider.generate_terminal_lines(self.size(100000))
+        timings = measure(lambda: [gui.format_output(line) for line in lines], repeat=self.repeat)
+        self.record("format_output", summarize(timings, items=len(lines)))
+
+        timings = measure(lambda: [gui.is_unwanted_message(line) for line in lines], repeat=self.repeat)
+        self.record("is_unwanted_message", summarize(timings, items=len(lines)))
+
+        buffer = fake_provider.generate_conversation_buffer(self.size(20000))
+        timings = measure(lambda: gui.extract_conversation_pairs(buffer), repeat=self.repeat)
+        self.record("extract_conversation_pairs", summarize(timings, items=len(buffer.splitlines()), extra={"buffer_chars": len(buffer)}))
+
+    def run(self, selected=None):
+        """
+        Run the benchmarks (all of them, or those whose names start with one of selected).
+        """
+        benchmarks = [
+            ("chat_anthropic_text", lambda: self.bench_chat("chat_anthropic_text", "anthropic", "text")),
+            ("chat_anthropic_code", lambda: self.bench_chat("chat_anthropic_code", "anthropic", "code")),
+            ("chat_anthropic_latency", lambda: self.bench_chat("chat_anthropic_latency", "anthropic", "text", first_token_latency=0.01)),
+            ("chat_interpreter_code", lambda: self.bench_chat("chat_interpreter_code", "interpreter", "code")),
+            ("json_to_markdown", self.bench_json_to_markdown),
+            ("process_response", self.bench_process_response),
+            ("classify_output", self.bench_classify_output),
+            ("gui", self.bench_gui),
+        ]
+        for name, benchmark in benchmarks:
+            if selected and not any(name.startswith(prefix) or prefix.startswith(name) for prefix in selected):
+                continue
+            benchmark()
+        return self.results
+
+    def close(self):
+        os.chdir(self.original_directory)
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path, threshold, scale):
+    """
+    Print the change in each benchmark's median against an earlier results file.
+
+    Returns:
+        list: The names of the benchmarks that got slower by more than threshold (a fraction).
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline.get('commit', 'unknown')} ({baseline_path}):")
+    if baseline.get("scale") != scale:
+        print(f"  (the baseline ran at scale {baseline.get('scale')}, this run at {scale}; the inputs differ in size)")
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if "median" not in result or not old or "median" not in old:
+            continue
+        change = result["median"] / old["median"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  <-- slower"
+            regressions.append(name)
+        print(f"  {name:<34} {old['median'] * 1000:>10.3f} ms -> {result['median'] * 1000:>10.3f} ms  {change * 100:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oracle Interpreter microbenchmarks (offline, with a fake LLM provider)")
+    parser.add_argument("benchmarks", nargs="*", help="only run the benchmarks whose names start with these (e.g. chat gui)")
+    parser.add_argument("--out", help="JSON file to write the results to (default: oracleTests/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repeats per benchmark (default: 5)")
+    parser.add_argument("--quick", action="store_true", help="run on inputs a tenth of the size, for a smoke test")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown (as a fraction of the baseline median) counted as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    # The Oracle logs every request at INFO
+    logging.disable(logging.INFO)
+
+    commit = git_commit()
+    print(f"Oracle benchmarks at {commit}")
+    suite = BenchmarkSuite(scale=0.1 if args.quick else 1.0, repeat=args.repeat)
+    try:
+        results = suite.run(args.benchmarks)
+    finally:
+        suite.close()
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": suite.scale,
+        "token_counter": suite.token_counter,
+        "results": results
+    }
+    out = args.out or os.path.join(RESULTS_DIRECTORY, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold, suite.scale)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold * 100:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# fake_provider.py
+# Deterministic in-process LLM provider for the Oracle Easy Open Source Modular Interpreter System benchmarks
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Stands in for litellm's completion and Open Interpreter's chat so the benchmarks run offline and
+# measure the Oracle, not the network. Responses are generated from a seed, so every run (and every
+# commit) sees the same text, split into the same chunks, after the same configured delays. The time
+# spent inside the fake provider is tracked, so the Oracle's own overhead can be told apart from it.
+
+
+import time
+import random
+from types import SimpleNamespace
+
+
+WORDS = (
+    "oracle antikythera alexandria aetherion athenium acheron memory directory workspace interpreter stream "
+    "token latency cache history summary circuit breaker retry provider model response message code console "
+    "python function result error file path search index segment profile benchmark the a of to and in is it"
+).split()
+
+
+def generate_prose(rng, words):
+    """
+    Generate deterministic filler prose.
+
+    Args:
+        rng (random.Random): The seeded generator.
+        words (int): About how many words to generate.
+
+    Returns:
+        str: Sentences of filler words.
+    """
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(6, 18))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def generate_code(rng, lines):
+    """
+    Generate a deterministic, harmless Python snippet (assignments and arithmetic only).
+    """
+    return "\n".join(f"value_{index} = {rng.randint(0, 999)} * {rng.randint(1, 99)} + sum(range({rng.randint(1, 50)}))" for index in range(lines))
+
+
+def generate_response(shape="text", words=300, code_blocks=2, code_lines=8, seed=0):
+    """
+    Generate a deterministic model response.
+
+    Args:
+        shape (str): "text" for prose only, or "code" for prose with fenced Python code blocks.
+        words (int): About how many words of prose.
+        code_blocks (int): How many code blocks, for the "code" shape.
+        code_lines (int): Lines per code block.
+        seed (int): The random seed.
+
+    Returns:
+        str: The response text.
+    """
+    rng = random.Random(seed)
+    if shape == "text":
+        return generate_prose(rng, words)
+    if shape != "code":
+        raise ValueError(f"Unknown response shape '{shape}'; use 'text' or 'code'.")
+
+    parts = []
+    per_part = max(words // (code_blocks + 1), 1)
+    for _ in range(code_blocks):
+        parts.append(generate_prose(rng, per_part))
+        parts.append(f"```python\n{generate_code(rng, code_lines)}\n```")
+    parts.append(generate_prose(rng, per_part))
+    return "\n\n".join(parts)
+
+
+class FakeProvider:
+    """
+    A drop-in replacement for litellm's completion that streams a fixed response.
+
+    Streaming calls return litellm-shaped chunks (chunk.choices[0].delta.content), with the usage block on a
+    final chunk with no choices, as litellm sends it with stream_options={"include_usage": True}. Other calls
+    return a complete response (response.choices[0].message.content).
+
+    Attributes:
+        response (str): The text every call answers with.
+        chunk_size (int): Characters per streamed chunk.
+        first_token_latency (float): Seconds to wait before the first chunk (or before a non-streamed reply).
+        chunk_latency (float): Seconds to wait between chunks.
+        calls (int): How many calls were made.
+        provider_seconds (float): Time spent inside the provider, delays included.
+    """
+
+    def __init__(self, response, chunk_size=16, first_token_latency=0.0, chunk_latency=0.0):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+        self.provider_seconds = 0.0
+
+    def reset(self):
+        self.calls = 0
+        self.provider_seconds = 0.0
+
+    def usage(self):
+        completion_tokens = len(self.response) // 4 + 1
+        return SimpleNamespace(prompt_tokens=1000, completion_tokens=completion_tokens, total_tokens=1000 + completion_tokens, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+
+    def completion(self, *args, stream=False, **kwargs):
+        """
+        The fake litellm.completion.
+        """
+        self.calls += 1
+        started = time.perf_counter()
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        self.provider_seconds += time.perf_counter() - started
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.response))], usage=self.usage())
+        return self.stream()
+
+    def stream(self):
+        for offset in range(0, len(self.response), self.chunk_size):
+            started = time.perf_counter()
+            if self.chunk_latency and offset:
+                time.sleep(self.chunk_latency)
+            chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.response[offset:offset + self.chunk_size]))], usage=None)
+            self.provider_seconds += time.perf_counter() - started
+            yield chunk
+        yield SimpleNamespace(choices=[], usage=self.usage())
+
+
+class FakeInterpreter:
+    """
+    A drop-in replacement for Open Interpreter that streams a fixed turn as LMC messages.
+
+    Assign it to OracleInterpreter.interpreter; load_open_interpreter then uses it as the loaded interpreter.
+    Each turn streams an assistant message, one code block per code block in the response, and the console
+    output of each, with the "start" and "end" flags Open Interpreter sends.
+
+    Attributes:
+        provider (FakeProvider): Supplies the response text, chunk size and delays.
+        llm (SimpleNamespace): The LLM settings OracleInterpreter reads and writes.
+        messages (list): The conversation so far, in LMC format.
+        system_message (str): The system message.
+        os (bool): The OS mode flag.
+        auto_run (bool): Whether generated code runs without confirmation.
+    """
+
+    def __init__(self, provider, model_name="gpt-4-turbo"):
+        self.provider = provider
+        self.llm = SimpleNamespace(model_name=model_name, context_window=8000, max_tokens=2000, temperature=1, model_config={}, supports_functions=True)
+        self.messages = []
+        self.system_message = ""
+        self.os = False
+        self.auto_run = True
+
+    def chat(self, message, display=False, stream=True):
+        """
+        The fake interpreter.chat; only streaming is supported, as the Oracle only streams.
+        """
+        self.provider.calls += 1
+        started = time.perf_counter()
+        if self.provider.first_token_latency:
+            time.sleep(self.provider.first_token_latency)
+        self.provider.provider_seconds += time.perf_counter() - started
+
+        user = {"role": "user", "type": "message", "content": message}
+        self.messages.append(user)
+        yield dict(user)
+
+        parts = self.provider.response.split("```")
+        for index, part in enumerate(parts):
+            if index % 2:
+                language, _, code = part.partition("\n")
+                yield from self.stream_item("code", code, format=language or "python")
+                yield from self.stream_item("console", "ok", format="output")
+            elif part.strip():
+                yield from self.stream_item("message", part.strip())
+
+    def stream_item(self, item_type, content, **extra):
+        role = "computer" if item_type == "console" else "assistant"
+        yield dict(role=role, type=item_type, start=True, **extra)
+        for offset in range(0, len(content), self.provider.chunk_size):
+            started = time.perf_counter()
+            if self.provider.chunk_latency and offset:
+                time.sleep(self.provider.chunk_latency)
+            self.provider.provider_seconds += time.perf_counter() - started
+            yield dict(role=role, type=item_type, content=content[offset:offset + self.provider.chunk_size], **extra)
+        yield dict(role=role, type=item_type, end=True, **extra)
+        self.messages.append(dict(role=role, type=item_type, content=content, **extra))
+
+
+def generate_transcript(messages=10000, seed=0):
+    """
+    Generate a deterministic Open Interpreter transcript (LMC messages), as json_to_markdown takes.
+
+    Args:
+        messages (int): How many messages.
+        seed (int): The random seed.
+
+    Returns:
+        list: Messages cycling through user, assistant, code and console items.
+    """
+    rng = random.Random(seed)
+    transcript = []
+    for index in range(messages):
+        kind = index % 4
+        if kind == 0:
+            transcript.append({"role": "user", "type": "message", "content": generate_prose(rng, 20)})
+        elif kind == 1:
+            transcript.append({"role": "assistant", "type": "message", "content": generate_prose(rng, 60)})
+        elif kind == 2:
+            transcript.append({"role": "assistant", "type": "code", "format": "python", "content": generate_code(rng, 6)})
+        else:
+            transcript.append({"role": "computer", "type": "console", "format": "output", "content": generate_prose(rng, 10)})
+    return transcript
+
+
+def generate_terminal_lines(lines=100000, seed=0):
+    """
+    Generate deterministic terminal output lines, as the GUI's terminal capture sees them.
+
+    The mix includes conversation lines, code fences, pygame and pydantic warnings, and ANSI-colored lines.
+    """
+    rng = random.Random(seed)
+    templates = [
+        lambda: "User: " + generate_prose(rng, 12),
+        lambda: "Oracle: " + generate_prose(rng, 30),
+        lambda: "```" + generate_code(rng, 1) + "```",
+        lambda: generate_prose(rng, 15),
+        lambda: "UserWarning: Field \"model_name\" has conflict with protected namespace \"model_\".",
+        lambda: "Hello from the pygame community. https://www.pygame.org/contribute.html",
+        lambda: "\033[38;5;77m " + generate_prose(rng, 5) + " \033[0m",
+    ]
+    weights = [20, 20, 5, 45, 4, 2, 4]
+    return [rng.choices(templates, weights)[0]() for _ in range(lines)]
+
+
+def generate_conversation_buffer(pairs=20000, seed=0):
+    """
+    Generate a deterministic conversation buffer, as the GUI's conversation text widget holds it.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(pairs):
+        lines.append("User: " + generate_prose(rng, 15))
+        lines.append("Oracle: " + generate_prose(rng, 25))
+        for _ in range(rng.randint(0, 4)):
+            lines.append(generate_prose(rng, 12))
+    return "\n".join(lines)
@@ -0,0 +1,177 @@
+# oracle_audio.py
+# Audio service for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# The GUI used to start pygame's mixer and decode se_1.mp3 from disk on the Tk thread every time it played
+# the confirmation sound, so every provider switch hitched the window. Now a single audio thread owns the
+# mixer: it imports pygame and starts the mixer once, decodes the effects up front, and then plays whatever
+# it is asked to. Playing an effect or starting the background music only queues a request, so the caller
+# never waits. On a machine with no audio device (or no pygame) every request is quietly dropped.
+
+
+import os
+import queue
+import atexit
+import logging
+import threading
+
+
+logger = logging.getLogger("audio")
+
+AUDIO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# The sound effects decoded at startup: name -> file (relative to AUDIO_DIRECTORY)
+EFFECTS = {"confirm": "se_1.mp3"}
+
+
+class AudioService:
+    """
+    Plays sound effects and looping background music from a thread of its own.
+
+    Every method only queues a request and returns at once; the audio thread starts the mixer on first use and
+    decodes all the effects before playing anything. If pygame is missing or the mixer can't start (no audio
+    device), available becomes False and requests are dropped.
+
+    Attributes:
+        effects (dict): Effect name -> path of its file.
+        sounds (dict): Effect name -> decoded pygame Sound, filled in by the audio thread.
+        available (bool): Whether the mixer works; None until the audio thread has tried it.
+        music (str): The background music file playing, or None.
+    """
+
+    def __init__(self, effects=None, directory=AUDIO_DIRECTORY):
+        effects = EFFECTS if effects is None else effects
+        self.effects = {name: os.path.join(directory, path) for name, path in effects.items()}
+        self.sounds = {}
+        self.available = None
+        self.music = None
+        self.requests = queue.Queue()
+        self.ready = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the audio thread, which starts the mixer and decodes the effects in the background.
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="oracle-audio", daemon=True)
+                self.thread.start()
+
+    def request(self, *request):
+        self.start()
+        self.requests.put(request)
+
+    def play_effect(self, name, volume=1.0):
+        """
+        Play a sound effect.
+
+        Args:
+            name (str): The effect, e.g. "confirm".
+            volume (float): 0.0 to 1.0.
+        """
+        self.request("effect", name, volume)
+
+    def play_music(self, path, loops=-1, fade_ms=1000, volume=0.5):
+        """
+        Start (or switch) the background music.
+
+        Args:
+            path (str): The music file (anything pygame.mixer.music plays: mp3, ogg, wav...).
+            loops (int): How many times to repeat it; -1 repeats forever.
+            fade_ms (int): Milliseconds to fade it in over.
+            volume (float): 0.0 to 1.0.
+        """
+        self.request("music", path, loops, fade_ms, volume)
+
+    def stop_music(self, fade_ms=1000):
+        """
+        Fade out the background music, if any.
+        """
+        self.request("stop_music", fade_ms)
+
+    def close(self):
+        """
+        Stop the music and shut the mixer down.
+        """
+        if self.thread is not None:
+            self.requests.put(("close",))
+            self.thread.join(2)
+
+    def run(self):
+        """
+        The audio thread: start the mixer, decode the effects, then serve requests until closed.
+        """
+        mixer = self.open_mixer()
+        self.available = mixer is not None
+        if mixer is not None:
+            for name, path in self.effects.items():
+                try:
+                    self.sounds[name] = mixer.Sound(path)
+                except Exception as e:
+                    logger.warning(f"Couldn't load sound effect '{name}' from {path}: {e}")
+        self.ready.set()
+
+        while True:
+            request = self.requests.get()
+            kind = request[0]
+            if kind == "close":
+                if mixer is not None:
+                    mixer.quit()
+                return
+            if mixer is None:
+                continue
+            try:
+                self.serve(mixer, request)
+            except Exception as e:
+                logger.warning(f"Audio request {kind} failed: {e}")
+
+    def open_mixer(self):
+        # Keep pygame's greeting out of the terminal (and the GUI)
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        try:
+            import pygame
+            pygame.mixer.init()
+        except Exception as e:
+            logger.info(f"No audio; sound effects and music are off ({e})")
+            return None
+        return pygame.mixer
+
+    def serve(self, mixer, request):
+        kind = request[0]
+        if kind == "effect":
+            _, name, volume = request
+            sound = self.sounds.get(name)
+            if sound is not None:
+                channel = sound.play()
+                if channel is not None:
+                    channel.set_volume(volume)
+        elif kind == "music":
+            _, path, loops, fade_ms, volume = request
+            mixer.music.load(path)
+            mixer.music.set_volume(volume)
+            mixer.music.play(loops=loops, fade_ms=fade_ms)
+            self.music = path
+        elif kind == "stop_music":
+            mixer.music.fadeout(request[1])
+            self.music = None
+
+
+# One audio service per process, shared by every GUI in it
+default_audio = None
+default_audio_lock = threading.Lock()
+
+
+def get_default_audio():
+    """
+    Return the process-wide audio service, starting its thread on first use.
+    """
+    global default_audio
+    with default_audio_lock:
+        if default_audio is None:
+            default_audio = AudioService()
+            default_audio.start()
+            atexit.register(default_audio.close)
+        return default_audio
@@ -0,0 +1,571 @@
+# oracle_backend.py
+# Supervised backend process for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# The auxiliary GUI used to start a whole second 'python oracle.py' just to scrape its stdout line by
+# line, the controller's Start button started a third, and none of them could be sent a command. Now the
+# GUI has one backend process, run by a supervisor, and the two talk over a multiprocessing pipe in whole
+# messages (dicts, length-prefixed by the Connection) instead of text:
+#
+#   GUI -> backend   chat {turn, message}   configure {settings}   ping {id}   stop
+#   backend -> GUI   text / code / console / execution_result {turn, content}   The reply, as chat_stream yields it
+#                    error {turn, content}   done {turn}   metrics {turn, metrics}   profile {turn, stages}
+#                    status {state}   log {stream, content}   pong {id}
+#
+# The GUI's profiling mode travels with the settings, so with profiling on the backend times its own stages
+# (the LLM call, code execution, rendering) and sends them back to be added to the GUI's record of the turn.
+#
+# Anything the backend prints arrives as log events. Pausing sends SIGSTOP to the backend and the code
+# workers it started (SIGCONT resumes them), so a paused turn really stops. The supervisor pings the
+# backend every few seconds and restarts it, replaying its settings, if it dies, stops answering, or
+# spends longer than the turn timeout on one turn (pings are answered even while a turn is wedged).
+
+
+import io
+import os
+import sys
+import time
+import queue
+import signal
+import atexit
+import logging
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+
+import oracle_profile
+
+
+logger = logging.getLogger("backend")
+
+# The OracleInterpreter attributes copied into the backend, besides the LLM settings and the OS flag
+COPIED_ATTRIBUTES = ["cache_mode", "failover", "memory_context_tokens", "execution_timeout"]
+
+# Where the backend writes its cProfile and tracemalloc captures (the GUI keeps the session file of turns)
+BACKEND_PROFILES_DIRECTORY = os.path.join(oracle_profile.PROFILES_DIRECTORY, "backend")
+
+# OracleInterpreter's directory attributes, in its argument order
+DIRECTORY_ATTRIBUTES = ["allowed_directory", "storage_directory", "aetherion_directory", "athenium_directory", "acheron_directory", "open_interpreter_directory"]
+
+LLM_SETTINGS = ["model_name", "temperature", "max_tokens"]
+
+# The events chat() yields: the reply's chunks, and errors
+CHUNK_TYPES = ("text", "code", "console", "execution_result", "error")
+
+
+def interpreter_settings(oracle_interpreter):
+    """
+    Take the settings a backend needs from an OracleInterpreter.
+
+    Returns:
+        dict: "directories" (its constructor arguments), "attributes", "llm", "os" and "profile" (this
+            process's profiling mode, see Profiler.mode).
+    """
+    return {
+        "directories": [getattr(oracle_interpreter, name) for name in DIRECTORY_ATTRIBUTES],
+        "attributes": {name: getattr(oracle_interpreter, name) for name in COPIED_ATTRIBUTES},
+        "llm": {name: getattr(oracle_interpreter.interpreter.llm, name) for name in LLM_SETTINGS},
+        "os": oracle_interpreter.interpreter.os,
+        "profile": oracle_profile.profiler.mode
+    }
+
+
+def apply_interpreter_settings(oracle_interpreter, settings):
+    """
+    Apply settings from interpreter_settings to an OracleInterpreter (the directories are only used to create it).
+    """
+    for name, value in settings.get("attributes", {}).items():
+        setattr(oracle_interpreter, name, value)
+    for name, value in settings.get("llm", {}).items():
+        setattr(oracle_interpreter.interpreter.llm, name, value)
+    if "os" in settings:
+        oracle_interpreter.apply_settings(os=settings["os"])
+    if "profile" in settings:
+        if settings["profile"]:
+            oracle_profile.profiler.enable(settings["profile"])
+        else:
+            oracle_profile.profiler.disable()
+
+
+class Channel:
+    """
+    One end of the pipe between the GUI and the backend. Messages can be sent from any thread.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.connection.send(message)
+
+    def recv(self):
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.close()
+
+
+class ChannelWriter(io.TextIOBase):
+    """
+    Stands in for the backend's stdout or stderr, sending each line written as a log event.
+    """
+
+    def __init__(self, channel, stream):
+        self.channel = channel
+        self.stream = stream
+        self.buffer = ""
+        self.lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self.lock:
+            self.buffer += text
+            if "\n" not in self.buffer:
+                return len(text)
+            *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            self.send(line)
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            line, self.buffer = self.buffer, ""
+        if line:
+            self.send(line)
+
+    def send(self, line):
+        try:
+            self.channel.send({"type": "log", "stream": self.stream, "content": line})
+        except (OSError, ValueError):
+            pass
+
+
+def backend_main(connection, interpreter_class, settings):
+    """
+    The backend process: create an OracleInterpreter and serve the GUI's messages until told to stop.
+
+    Pings are answered here while turns run one at a time on a thread of their own, so a long turn doesn't
+    look like a hung backend. Settings changes queue up behind the turns, so they apply from the next turn.
+    """
+    # The supervisor decides when the backend stops, not a Ctrl+C meant for the terminal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    channel = Channel(connection)
+    sys.stdout = ChannelWriter(channel, "stdout")
+    sys.stderr = ChannelWriter(channel, "stderr")
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setStream(sys.stderr)
+
+    channel.send({"type": "status", "state": "starting", "pid": os.getpid()})
+    oracle_profile.profiler.directory = BACKEND_PROFILES_DIRECTORY
+    oracle_interpreter = interpreter_class(*settings["directories"])
+    apply_interpreter_settings(oracle_interpreter, settings)
+
+    turns = queue.Queue()
+    threading.Thread(target=run_turns, args=(channel, oracle_interpreter, turns), name="backend-turns", daemon=True).start()
+    channel.send({"type": "status", "state": "ready", "pid": os.getpid()})
+
+    while True:
+        try:
+            message = channel.recv()
+        except (EOFError, OSError):
+            break
+        kind = message["type"]
+        if kind == "ping":
+            channel.send({"type": "pong", "id": message["id"]})
+        elif kind in ("chat", "configure"):
+            turns.put(message)
+        elif kind == "stop":
+            break
+    turns.put(None)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def run_turns(channel, oracle_interpreter, turns):
+    """
+    The backend's turn thread: run each chat and send its chunks, then its metrics and a done event.
+    """
+    while True:
+        message = turns.get()
+        if message is None:
+            return
+        if message["type"] == "configure":
+            try:
+                apply_interpreter_settings(oracle_interpreter, message["settings"])
+            except Exception as e:
+                logger.error(f"Couldn't apply the GUI's settings: {e}")
+            continue
+
+        turn = message["turn"]
+        channel.send({"type": "status", "state": "busy", "turn": turn})
+        with oracle_profile.profiler.turn(message["message"]) as record:
+            try:
+                for chunk in oracle_interpreter.chat_stream(message["message"]):
+                    channel.send(dict(chunk, turn=turn))
+            except Exception as e:
+                channel.send({"type": "error", "turn": turn, "content": f"\nError: {type(e).__name__}: {e}\n"})
+        if record is not None:
+            channel.send({"type": "profile", "turn": turn, "stages": record["stages"]})
+        sys.stdout.flush()
+        metrics = getattr(oracle_interpreter, "last_request_metrics", None)
+        if metrics is not None:
+            channel.send({"type": "metrics", "turn": turn, "metrics": metrics.as_dict()})
+        channel.send({"type": "status", "state": "ready"})
+        channel.send({"type": "done", "turn": turn})
+
+
+class BackendSupervisor:
+    """
+    Runs one backend process and keeps it alive.
+
+    Listeners given to subscribe() receive every event from the backend, plus the supervisor's own status
+    events ("paused", "restarting", "failed", "stopped"), on the thread that received them; chat() yields
+    just the events of its own turn. If the backend exits or stops answering pings for health_timeout
+    seconds, or spends more than turn_timeout seconds on one turn (paused time aside), it is restarted and the
+    turns in flight fail. That happens at most max_restarts times in restart_window seconds; after that the
+    supervisor gives up and its state is "failed".
+
+    Attributes:
+        interpreter_class (type): The OracleInterpreter class the backend creates.
+        settings (dict): What the backend is created with (see interpreter_settings); replayed on restart.
+        process (multiprocessing.Process): The backend process, or None while stopped.
+        state (str): "stopped", "starting", "ready", "busy", "paused", "restarting" or "failed".
+        restarts (int): How many times the backend has been restarted.
+        turn_timeout (float): Seconds a turn may run before the backend is restarted; None for no limit.
+        last_metrics (dict): The measurements of the last turn (see oracle_metrics.RequestMetrics).
+    """
+
+    def __init__(self, interpreter_class, settings=None, health_interval=5.0, health_timeout=30.0, turn_timeout=600.0, max_restarts=5, restart_window=300.0):
+        self.interpreter_class = interpreter_class
+        self.settings = dict(settings or {})
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.turn_timeout = turn_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+
+        # Spawned, not forked: the GUI process has Tk and plenty of threads running
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.channel = None
+        self.state = "stopped"
+        self.paused = False
+        self.resume_state = "ready"
+        self.restarts = 0
+        self.restart_times = deque()
+        self.last_heard = 0.0
+        self.last_metrics = None
+
+        # The turn the backend is busy with, and since when (from its busy status, less any time paused)
+        self.busy_turn = None
+        self.busy_since = 0.0
+        self.paused_at = 0.0
+        self.stopping = threading.Event()
+        self.lock = threading.RLock()
+
+        self.turns = {}
+        self.turn_ids = itertools.count(1)
+        self.ping_ids = itertools.count(1)
+        self.listeners = []
+        atexit.register(self.stop)
+
+    @property
+    def available(self):
+        """
+        Whether chat() can be used: the backend is running, or about to be.
+        """
+        return self.state not in ("stopped", "failed")
+
+    def subscribe(self, listener):
+        """
+        Call listener(event) with every event from now on.
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def configure(self, **settings):
+        """
+        Change the backend's settings (see interpreter_settings). They apply from the next turn, and to any
+        backend started later.
+        """
+        with self.lock:
+            for key, value in settings.items():
+                if isinstance(value, dict):
+                    self.settings.setdefault(key, {}).update(value)
+                else:
+                    self.settings[key] = value
+            if self.process is not None:
+                self.send({"type": "configure", "settings": settings})
+
+    def start(self):
+        """
+        Start the backend and its health checks, unless it is running already.
+
+        Raises:
+            ValueError: If the settings don't say which directories the backend's interpreter uses.
+        """
+        with self.lock:
+            if self.process is not None:
+                return
+            if "directories" not in self.settings:
+                raise ValueError("Configure the backend's directories (see interpreter_settings) before starting it")
+            self.stopping = threading.Event()
+            self.restart_times.clear()
+            self.spawn()
+            threading.Thread(target=self.monitor, args=(self.stopping,), name="backend-monitor", daemon=True).start()
+
+    def spawn(self):
+        connection, child = self.context.Pipe()
+        # Not a daemon: the backend starts code execution workers of its own
+        process = self.context.Process(target=backend_main, args=(child, self.interpreter_class, self.settings), name="oracle-backend")
+        process.start()
+        child.close()
+        self.process = process
+        self.channel = Channel(connection)
+        self.paused = False
+        self.busy_turn = None
+        self.last_heard = time.monotonic()
+        self.set_state("starting", pid=process.pid)
+        threading.Thread(target=self.receive, args=(process, self.channel), name="backend-receiver", daemon=True).start()
+
+    def send(self, message):
+        channel = self.channel
+        if channel is None:
+            return
+        try:
+            channel.send(message)
+        except (OSError, ValueError) as e:
+            # The receiver or the monitor notices the backend is gone and restarts it
+            logger.warning(f"Couldn't send {message['type']} to the backend: {e}")
+
+    def set_state(self, state, **details):
+        self.state = state
+        self.notify(dict({"type": "status", "state": state}, **details))
+
+    def notify(self, event):
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception:
+                logger.exception(f"Backend event listener failed on {event['type']}")
+
+    def receive(self, process, channel):
+        """
+        Receive the backend's events until its end of the pipe closes.
+        """
+        while True:
+            try:
+                event = channel.recv()
+            except (EOFError, OSError):
+                break
+            self.last_heard = time.monotonic()
+            kind = event["type"]
+            if kind == "pong":
+                continue
+            if kind == "status":
+                self.state = event["state"]
+                if self.state == "busy":
+                    self.busy_turn, self.busy_since = event.get("turn"), time.monotonic()
+                elif self.state == "ready":
+                    self.busy_turn = None
+            elif kind == "metrics":
+                self.last_metrics = event["metrics"]
+            elif "turn" in event:
+                events = self.turns.get(event["turn"])
+                if events is not None:
+                    events.put(event)
+            self.notify(event)
+        with self.lock:
+            if process is self.process:
+                process.join(1)
+                self.restart(f"the backend exited (code {process.exitcode})")
+
+    def monitor(self, stopping):
+        """
+        Ping the backend every health_interval seconds, restarting it if it has died, stopped answering, or
+        overrun turn_timeout on a turn.
+        """
+        while not stopping.wait(self.health_interval):
+            with self.lock:
+                process = self.process
+                if process is None or self.paused:
+                    continue
+                if not process.is_alive():
+                    self.restart(f"the backend exited (code {process.exitcode})")
+                elif time.monotonic() - self.last_heard > self.health_timeout:
+                    self.restart(f"the backend hasn't answered for {self.health_timeout:.0f} seconds")
+                elif self.busy_turn is not None and self.turn_timeout is not None and time.monotonic() - self.busy_since > self.turn_timeout:
+                    self.restart(f"the turn ran for more than {self.turn_timeout:.0f} seconds")
+                else:
+                    self.send({"type": "ping", "id": next(self.ping_ids)})
+
+    def restart(self, reason):
+        # Called with the lock held
+        logger.warning(f"Restarting the backend: {reason}")
+        self.kill(self.process)
+        self.fail_turns(reason)
+        now = time.monotonic()
+        self.restart_times.append(now)
+        while now - self.restart_times[0] > self.restart_window:
+            self.restart_times.popleft()
+        if len(self.restart_times) > self.max_restarts:
+            self.process = None
+            self.channel = None
+            self.stopping.set()
+            self.set_state("failed", detail=f"{reason}; gave up after {self.max_restarts} restarts in {self.restart_window:.0f} seconds")
+            return
+        self.restarts += 1
+        self.set_state("restarting", detail=reason)
+        self.spawn()
+
+    def fail_turns(self, reason):
+        for turn, events in list(self.turns.items()):
+            events.put({"type": "error", "turn": turn, "content": f"\nError: {reason}\n"})
+            events.put({"type": "done", "turn": turn})
+
+    def tree(self, process):
+        """
+        Return the pids of the backend and every process under it (its code execution workers).
+        """
+        import psutil
+        try:
+            return [process.pid] + [child.pid for child in psutil.Process(process.pid).children(recursive=True)]
+        except psutil.Error:
+            return [process.pid]
+
+    def signal_tree(self, process, pause):
+        if hasattr(signal, "SIGSTOP"):
+            for pid in self.tree(process):
+                try:
+                    os.kill(pid, signal.SIGSTOP if pause else signal.SIGCONT)
+                except OSError:
+                    pass
+        else:
+            # No SIGSTOP on Windows; psutil suspends the process's threads instead
+            import psutil
+            for pid in self.tree(process):
+                try:
+                    if pause:
+                        psutil.Process(pid).suspend()
+                    else:
+                        psutil.Process(pid).resume()
+                except psutil.Error:
+                    pass
+
+    def pause(self):
+        """
+        Stop the backend where it is, code workers included (SIGSTOP). Health checks wait until it resumes.
+        """
+        with self.lock:
+            if self.process is None or self.paused:
+                return
+            self.signal_tree(self.process, True)
+            self.paused = True
+            self.paused_at = time.monotonic()
+            self.resume_state = self.state
+            self.set_state("paused")
+
+    def resume(self):
+        """
+        Let a paused backend carry on (SIGCONT).
+        """
+        with self.lock:
+            if self.process is None or not self.paused:
+                return
+            self.signal_tree(self.process, False)
+            self.paused = False
+            self.last_heard = time.monotonic()
+            # Time spent paused doesn't count towards the turn timeout
+            self.busy_since += self.last_heard - self.paused_at
+            self.set_state(self.resume_state)
+
+    def chat(self, message):
+        """
+        Send a message to the backend and yield the events of its reply.
+
+        With profiling on, the backend's stage timings are added to the turn being profiled in this process.
+
+        Yields:
+            dict: Chunks like OracleInterpreter.chat_stream's ("text", "code", "console" and
+                "execution_result"), and "error" events if the turn fails or the backend goes down.
+
+        Raises:
+            RuntimeError: If the backend hasn't been started, has failed or has been stopped.
+        """
+        if not self.available:
+            raise RuntimeError("The backend is not running")
+        turn = next(self.turn_ids)
+        events = queue.Queue()
+        self.turns[turn] = events
+        try:
+            self.send({"type": "chat", "turn": turn, "message": message})
+            while True:
+                try:
+                    event = events.get(timeout=self.health_interval)
+                except queue.Empty:
+                    # A restart or stop fails the turn; this only catches a backend that is gone for good
+                    if not self.available:
+                        yield {"type": "error", "turn": turn, "content": "\nError: the backend is not running\n"}
+                        return
+                    continue
+                if event["type"] == "done":
+                    return
+                if event["type"] == "profile":
+                    oracle_profile.profiler.merge(event["stages"])
+                elif event["type"] in CHUNK_TYPES:
+                    yield event
+        finally:
+            self.turns.pop(turn, None)
+
+    def kill(self, process):
+        if process is None:
+            return
+        pids = self.tree(process)[1:] if process.is_alive() else []
+        if self.paused:
+            self.signal_tree(process, False)
+            self.paused = False
+        if process.is_alive():
+            process.terminate()
+            process.join(2)
+        if process.is_alive():
+            process.kill()
+            process.join(1)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def stop(self):
+        """
+        Stop the backend and its health checks.
+        """
+        with self.lock:
+            self.stopping.set()
+            process, channel = self.process, self.channel
+            if process is None:
+                return
+            self.process = None
+            self.channel = None
+            if self.paused:
+                self.signal_tree(process, False)
+                self.paused = False
+            try:
+                channel.send({"type": "stop"})
+            except (OSError, ValueError):
+                pass
+            process.join(3)
+            self.kill(process)
+            channel.close()
+            self.fail_turns("the backend was stopped")
+            self.set_state("stopped")
@@ -0,0 +1,263 @@
+# oracle_batch.py
+# Batch prompt runner for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Start it with 'python oracle.py batch requests.jsonl --concurrency 8 --out results.jsonl'.
+#
+# Each input line is a JSON object with an "id" and a "message", and optionally "provider",
+# "temperature", "max_tokens" and "os" to override the defaults for that request:
+#
+#   {"id": "eval-001", "message": "What is 2 + 2?", "provider": "Anthropic", "temperature": 0}
+#
+# Each output line carries the input's id together with the response (or the error), written as
+# soon as that request finishes. Requests whose id already has a successful result in the output
+# file are skipped, so an interrupted run can simply be started again.
+
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+
+logger = logging.getLogger("batch")
+
+
+def read_requests(input_path):
+    """
+    Stream the requests from a JSONL file, one line at a time.
+
+    Blank lines are ignored. Lines that aren't valid requests are yielded with an "error" so they are
+    reported in the output rather than silently dropped.
+
+    Args:
+        input_path (str): The JSONL file to read.
+
+    Yields:
+        dict: The request, with "id" and "message" (and "line", its line number).
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{line_number}", "line": line_number, "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(request, dict):
+                yield {"id": f"line-{line_number}", "line": line_number, "error": "Each line must be a JSON object."}
+                continue
+
+            request.setdefault("id", request.get("request_id", f"line-{line_number}"))
+            request.setdefault("message", request.get("prompt"))
+            request["line"] = line_number
+            if not isinstance(request["message"], str) or not request["message"]:
+                request["error"] = "The request has no 'message'."
+            yield request
+
+
+def completed_ids(output_path):
+    """
+    Collect the ids that already have a successful result in an output file.
+
+    Args:
+        output_path (str): The JSONL output file. It doesn't have to exist yet.
+
+    Returns:
+        set: The ids (as strings) to skip.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run; that request runs again
+                continue
+            if isinstance(result, dict) and "error" not in result and "id" in result:
+                done.add(str(result["id"]))
+    return done
+
+
+class BatchRunner:
+    """
+    Runs a JSONL file of requests through OracleInterpreter.chat with bounded concurrency.
+
+    Each worker thread owns one OracleInterpreter (with its own Open Interpreter instance), reset before every
+    request so requests don't share history. Per-provider limits cap how many requests to a provider run at
+    once, on top of the overall worker count.
+
+    Attributes:
+        interpreter_factory (callable): Builds an OracleInterpreter for a worker; called with no arguments.
+        concurrency (int): The number of worker threads.
+        provider_limits (dict): The most requests in flight per provider, e.g. {"Anthropic": 4}.
+        defaults (dict): Default provider, temperature, max_tokens and os for requests that don't set them.
+        counters (dict): completed, failed and skipped request counts.
+        worker_errors (list): Why each worker that couldn't start (its interpreter failed to build) stopped.
+    """
+
+    def __init__(self, interpreter_factory, concurrency=4, provider_limits=None, defaults=None):
+        self.interpreter_factory = interpreter_factory
+        self.concurrency = max(1, concurrency)
+        self.provider_limits = {provider: threading.BoundedSemaphore(limit) for provider, limit in (provider_limits or {}).items()}
+        self.defaults = {key: value for key, value in (defaults or {}).items() if value is not None}
+        self.counters = {"completed": 0, "failed": 0, "skipped": 0}
+        self.worker_errors = []
+        self.write_lock = threading.Lock()
+
+    def run(self, input_path, output_path):
+        """
+        Run every request in input_path that doesn't already have a result in output_path.
+
+        Args:
+            input_path (str): The JSONL file of requests.
+            output_path (str): The JSONL file results are appended to.
+
+        Returns:
+            dict: The completed, failed and skipped counts.
+
+        Raises:
+            RuntimeError: If every worker failed to start, so no request can run.
+        """
+        skip = completed_ids(output_path)
+        pending = queue.Queue(maxsize=self.concurrency * 2)
+
+        with open(output_path, "a", encoding="utf-8") as output:
+            workers = [threading.Thread(target=self.work, args=(pending, output), daemon=True) for _ in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+
+            # Feed the workers as they free up, so the input is never held in memory all at once
+            for request in read_requests(input_path):
+                if str(request["id"]) in skip:
+                    self.counters["skipped"] += 1
+                    continue
+                self.feed(pending, request, workers)
+
+            for _ in workers:
+                self.feed(pending, None, workers)
+            for worker in workers:
+                worker.join()
+
+        if len(self.worker_errors) == len(workers):
+            raise RuntimeError(f"No batch worker could start: {self.worker_errors[0]}")
+
+        logger.info(f"Batch finished: {self.counters['completed']} completed, {self.counters['failed']} failed, {self.counters['skipped']} skipped")
+        return dict(self.counters)
+
+    def feed(self, pending, request, workers):
+        """
+        Queue a request for the workers, waiting while the queue is full, but not for workers that are all gone.
+
+        Raises:
+            RuntimeError: If every worker has stopped.
+        """
+        while True:
+            try:
+                pending.put(request, timeout=0.5)
+                return
+            except queue.Full:
+                if not any(worker.is_alive() for worker in workers):
+                    reason = self.worker_errors[0] if self.worker_errors else "they stopped"
+                    raise RuntimeError(f"No batch worker could start: {reason}")
+
+    def work(self, pending, output):
+        """
+        Worker loop: run requests from the queue until a None arrives.
+        """
+        try:
+            interpreter = self.interpreter_factory()
+            baseline = {
+                "provider": "OpenAI",
+                "temperature": interpreter.interpreter.llm.temperature,
+                "max_tokens": interpreter.interpreter.llm.max_tokens,
+                "os": interpreter.interpreter.os,
+            }
+        except Exception as e:
+            logger.error(f"A batch worker couldn't create its interpreter: {e}")
+            with self.write_lock:
+                self.worker_errors.append(f"{type(e).__name__}: {e}")
+            return
+
+        while True:
+            request = pending.get()
+            if request is None:
+                break
+            self.write(output, self.run_request(interpreter, baseline, request))
+
+    def run_request(self, interpreter, baseline, request):
+        """
+        Run one request on a worker's interpreter.
+
+        Returns:
+            dict: The result line for the output file.
+        """
+        if "error" in request:
+            return {"id": request["id"], "line": request["line"], "error": request["error"]}
+
+        settings = dict(baseline, **self.defaults)
+        settings.update({key: request[key] for key in ("provider", "temperature", "max_tokens", "os") if key in request})
+        result = {"id": request["id"], "line": request["line"], "provider": settings["provider"]}
+
+        started = time.perf_counter()
+        try:
+            interpreter.reset_conversation()
+            interpreter.apply_settings(**settings)
+            result["model"] = interpreter.interpreter.llm.model_name
+
+            limit = self.provider_limits.get(settings["provider"])
+            if limit is None:
+                result["response"] = interpreter.chat(request["message"])
+            else:
+                with limit:
+                    result["response"] = interpreter.chat(request["message"])
+        except Exception as e:
+            logger.error(f"Request {request['id']} failed: {e}")
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def write(self, output, result):
+        """
+        Append one result to the output file and flush it, so it survives an interrupted run.
+        """
+        with self.write_lock:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            if "error" in result:
+                self.counters["failed"] += 1
+            else:
+                self.counters["completed"] += 1
+            logger.info(f"[{self.counters['completed'] + self.counters['failed']}] {result['id']}: {'failed' if 'error' in result else 'done'} in {result.get('latency', 0)}s")
+
+
+def parse_provider_limits(values, providers):
+    """
+    Parse --provider-limit values such as "Anthropic=4".
+
+    Args:
+        values (list): The PROVIDER=N strings.
+        providers (list): The valid provider names (OracleInterpreter.PROVIDERS).
+
+    Returns:
+        dict: The limits, keyed by provider.
+
+    Raises:
+        ValueError: If a value isn't PROVIDER=N with N at least 1, or names an unknown provider.
+    """
+    limits = {}
+    for value in values or []:
+        provider, _, limit = value.partition("=")
+        if not provider or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid provider limit '{value}'; expected PROVIDER=N, e.g. Anthropic=4.")
+        if provider not in providers:
+            raise ValueError(f"Unknown provider '{provider}' in provider limit '{value}'. Choose one of: {', '.join(providers)}")
+        limits[provider] = int(limit)
+    return limits
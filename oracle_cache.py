@@ -0,0 +1,214 @@
+# oracle_cache.py
+# Response cache for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Exact-match cache for LLM replies. A bounded in-memory LRU sits in front of a SQLite file
+# with a size cap and a TTL, so identical prompts (scripted runs, regression re-runs) come back
+# in milliseconds instead of paying for another provider round-trip.
+
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Two-tier exact-match cache for LLM responses.
+
+    Entries are looked up in memory first, then on disk; disk hits are promoted back into memory.
+    Values are any JSON-serializable object (OracleInterpreter stores the list of response chunks).
+
+    Attributes:
+        path (str): The SQLite file backing the disk tier, or None for a memory-only cache.
+        max_entries (int): How many entries the in-memory LRU holds.
+        max_disk_bytes (int): The disk tier is pruned (least recently used first) above this size.
+        ttl (float): Seconds an entry stays valid.
+        counters (dict): memory_hits, disk_hits, misses, stores and evictions.
+    """
+
+    def __init__(self, path=os.path.join("oracleData", "response_cache.sqlite3"), max_entries=256, max_disk_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.connection = None
+        self.disk_bytes = 0
+
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self.connection.commit()
+            self.disk_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name, system_message, messages, temperature, max_tokens):
+        """
+        Build the cache key for a request.
+
+        Args:
+            model_name (str): The model the request is sent to.
+            system_message (str): The system message (hashed into the key).
+            messages (list): The message list sent to the model.
+            temperature (float): The sampling temperature.
+            max_tokens (int): The completion token limit.
+
+        Returns:
+            str: A SHA-256 hex digest identifying the request.
+        """
+        system_hash = hashlib.sha256((system_message or "").encode("utf-8")).hexdigest()
+        payload = json.dumps([model_name, system_hash, messages, temperature, max_tokens], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): The cache key, from make_key.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self.memory[key]
+
+            if self.connection is not None:
+                row = self.connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                    self.connection.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.counters["disk_hits"] += 1
+                    return value
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Store a value in both tiers.
+
+        Args:
+            key (str): The cache key, from make_key.
+            value: The JSON-serializable value to cache.
+        """
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, value)
+            self.counters["stores"] += 1
+
+            if self.connection is not None:
+                encoded = json.dumps(value)
+                old = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, encoded, len(encoded), now, now)
+                )
+                self.disk_bytes += len(encoded) - (old[0] if old else 0)
+                self._prune_disk(now)
+                self.connection.commit()
+
+    def clear(self):
+        """
+        Drop every entry from both tiers. The counters are kept.
+        """
+        with self.lock:
+            self.memory.clear()
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM responses")
+                self.connection.commit()
+                self.disk_bytes = 0
+
+    def stats(self):
+        """
+        Report the hit/miss counters and the size of each tier.
+
+        Returns:
+            dict: The counters plus memory_entries, disk_bytes and hit_rate.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memory)
+            stats["disk_bytes"] = self.disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """
+        Close the disk tier.
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _remember(self, key, created, value):
+        # Add to the in-memory LRU, dropping the least recently used entries past max_entries
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _prune_disk(self, now):
+        # Drop expired entries, then the least recently used ones until the file is under its size cap
+        expired = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (now - self.ttl,)).fetchone()
+        if expired[0]:
+            self.connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self.disk_bytes -= expired[1]
+            self.counters["evictions"] += expired[0]
+
+        if self.disk_bytes <= self.max_disk_bytes:
+            return
+        doomed = []
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            doomed.append((key,))
+            self.disk_bytes -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.counters["evictions"] += len(doomed)
+
+
+# One cache per process, shared by every OracleInterpreter (and every server session)
+default_cache = None
+default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the process-wide response cache, creating it on first use.
+
+    Returns:
+        ResponseCache: The shared cache.
+    """
+    global default_cache
+    with default_cache_lock:
+        if default_cache is None:
+            default_cache = ResponseCache()
+        return default_cache
@@ -0,0 +1,437 @@
+# oracle_executor.py
+# Code execution worker pool for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Code blocks from the model used to be exec'd inside the Oracle itself, after a process-wide os.chdir:
+# two GUI threads could pull each other's working directory out from under them, and one runaway loop
+# froze everything. Now each block runs in a worker process from a small pre-warmed pool, in its own
+# working directory, with a timeout (a worker that overruns is killed and replaced), its stdout and
+# stderr captured, and an ExecutionResult coming back. Workers are forked from a fork server that has
+# already imported the common modules, so a block doesn't pay for interpreter startup. Independent
+# blocks from one response run in parallel.
+
+
+import io
+import ast
+import os
+import re
+import sys
+import time
+import queue
+import atexit
+import logging
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger("executor")
+
+# Imported once by the fork server, so every worker starts with them loaded
+PRELOAD_MODULES = ["oracle_executor", "json", "re", "math", "random", "datetime", "collections", "itertools", "pathlib", "shutil", "subprocess", "csv", "statistics"]
+
+# Captured output is cut to this many bytes per stream
+MAX_OUTPUT_BYTES = 64 * 1024
+
+# Blocks that look like they touch the filesystem, other processes or the Oracle itself run in order;
+# the rest of a response's blocks run in parallel
+SIDE_EFFECT_PATTERN = re.compile(r"\bopen\(|\bos\.|\bshutil\b|\bpathlib\b|\bPath\(|\bsubprocess\b|\bsystem\(|\bself\.|\binput\(")
+
+
+def uses_oracle(code):
+    """
+    Tell whether a code block calls back into the Oracle, i.e. uses a module-level name self (as in
+    self.interpreter.computer.browser.search(...)). The self of a method the block defines doesn't count.
+
+    Args:
+        code (str): The code block.
+
+    Returns:
+        bool: True if the block needs the OracleInterpreter; False otherwise, or if it doesn't parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+
+    def free_self(node):
+        if isinstance(node, ast.Name):
+            return node.id == "self"
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            arguments = node.args
+            names = [argument.arg for argument in arguments.posonlyargs + arguments.args + arguments.kwonlyargs]
+            names += [argument.arg for argument in (arguments.vararg, arguments.kwarg) if argument is not None]
+            if "self" in names:
+                # Only the defaults and decorators are evaluated outside the function
+                outside = arguments.defaults + [default for default in arguments.kw_defaults if default is not None]
+                outside += getattr(node, "decorator_list", [])
+                return any(free_self(child) for child in outside)
+        return any(free_self(child) for child in ast.iter_child_nodes(node))
+
+    return free_self(tree)
+
+
+def plan_batches(codes):
+    """
+    Split a response's code blocks into batches that may run in parallel, in order.
+
+    A block with side effects (see SIDE_EFFECT_PATTERN) gets a batch of its own, so it runs after every block
+    before it and before every block after it. The blocks between two such blocks share a batch.
+
+    Args:
+        codes (list): The code blocks, in the order they appear.
+
+    Returns:
+        list: Batches of indexes into codes.
+    """
+    batches = []
+    current = []
+    for index, code in enumerate(codes):
+        if SIDE_EFFECT_PATTERN.search(code):
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([index])
+        else:
+            current.append(index)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class ExecutionResult:
+    """
+    The outcome of running one code block.
+
+    Attributes:
+        status (str): "ok", "error" (the code raised), "timeout" (it was stopped) or "crashed" (the worker died).
+        stdout (str): What the code printed, including the output of any processes it ran.
+        stderr (str): What it wrote to stderr, including the traceback if it raised.
+        error (str): The exception message, or why the code was stopped.
+        seconds (float): How long it ran.
+        cwd (str): The directory it ran in.
+    """
+
+    def __init__(self, status, stdout="", stderr="", error="", seconds=0.0, cwd=""):
+        self.status = status
+        self.stdout = stdout
+        self.stderr = stderr
+        self.error = error
+        self.seconds = seconds
+        self.cwd = cwd
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    def as_dict(self):
+        return {"status": self.status, "stdout": self.stdout, "stderr": self.stderr, "error": self.error, "seconds": self.seconds, "cwd": self.cwd}
+
+    def __str__(self):
+        if self.status == "ok":
+            text = "Code executed successfully."
+        elif self.status == "error":
+            text = f"Error occurred during code execution: {self.error}"
+        elif self.status == "timeout":
+            text = f"Code execution was stopped after {self.seconds:.0f} seconds."
+        else:
+            text = f"Code execution failed: {self.error}"
+        if self.stdout.strip():
+            text += f"\nOutput:\n{self.stdout.rstrip()}"
+        if self.status != "error" and self.stderr.strip():
+            text += f"\nErrors:\n{self.stderr.rstrip()}"
+        return text
+
+    def __repr__(self):
+        return f"ExecutionResult(status={self.status!r}, seconds={self.seconds:.3f}, cwd={self.cwd!r})"
+
+
+def read_capture(f):
+    f.seek(0)
+    data = f.read(MAX_OUTPUT_BYTES + 1)
+    text = data[:MAX_OUTPUT_BYTES].decode("utf-8", errors="replace")
+    if len(data) > MAX_OUTPUT_BYTES:
+        text += "\n... (output truncated)"
+    return text
+
+
+def run_block(code, cwd, out, err):
+    """
+    Run one code block in this process, in cwd, capturing its output at the file descriptor level (so the
+    output of os.system and subprocesses is caught too). Called in the worker processes.
+
+    Args:
+        code (str): The code.
+        cwd (str): The directory to run it in.
+        out (file): The binary file stdout is captured into; emptied first.
+        err (file): The binary file stderr is captured into; emptied first.
+
+    Returns:
+        dict: The fields of an ExecutionResult.
+    """
+    started = time.perf_counter()
+    status, error = "ok", ""
+    for f in (out, err):
+        f.seek(0)
+        f.truncate()
+    for stream in (sys.stdout, sys.stderr):
+        if stream is not None:
+            stream.flush()
+    saved = os.dup(1), os.dup(2)
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    try:
+        os.chdir(cwd)
+        exec(code, {"__name__": "__oracle_block__", "__builtins__": __builtins__})
+    except BaseException as e:
+        status, error = "error", str(e) or type(e).__name__
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            if stream is not None:
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+    return {"status": status, "stdout": read_capture(out), "stderr": read_capture(err), "error": error, "seconds": time.perf_counter() - started, "cwd": cwd}
+
+
+def worker_main(connection):
+    """
+    The worker process: run the blocks sent over connection until it is closed.
+    """
+    # Line-buffered Python output, so prints land in the capture in order with subprocess output
+    for stream in (sys.stdout, sys.stderr):
+        if isinstance(stream, io.TextIOWrapper):
+            stream.reconfigure(line_buffering=True)
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        while True:
+            try:
+                code, cwd = connection.recv()
+            except (EOFError, OSError):
+                return
+            connection.send(run_block(code, cwd, out, err))
+
+
+class Worker:
+    """
+    One worker process and its end of the pipe.
+    """
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), name="oracle-exec-worker", daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self):
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+
+
+class ExecutionPool:
+    """
+    A pool of pre-warmed worker processes that run code blocks.
+
+    Workers are forked from a fork server with PRELOAD_MODULES already imported (where the platform has one;
+    elsewhere they are spawned). Each block runs in its own working directory with a timeout. A worker that
+    times out or dies is replaced, and workers are recycled after max_jobs blocks, so state a block leaves
+    behind (imports, globals, environment variables) doesn't build up. If a worker fails to start or to be
+    replaced, the next block that finds no idle worker starts one; if that fails too, the block comes back
+    "crashed" instead of waiting for a worker that will never arrive.
+
+    Attributes:
+        size (int): The number of workers.
+        timeout (float): The default seconds a block may run before it is stopped.
+        max_jobs (int): Blocks a worker runs before it is replaced.
+    """
+
+    def __init__(self, size=None, timeout=60.0, max_jobs=50):
+        # Blocks spend much of their time waiting (on sleeps, files, the network), so even one CPU gets two workers
+        self.size = size or max(2, min(4, os.cpu_count() or 1))
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload(PRELOAD_MODULES)
+        else:
+            self.context = multiprocessing.get_context("spawn")
+
+        self.idle = queue.Queue()
+        self.workers = []
+        self.spawning = 0
+        self.lock = threading.Lock()
+        self.started = False
+        self.closed = False
+
+    def start(self, wait=False):
+        """
+        Start the workers on a background thread, so they are warm by the time the first block arrives.
+
+        Args:
+            wait (bool): Wait until every worker has started.
+        """
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+
+        def start_workers():
+            for _ in range(self.size):
+                if not self.short():
+                    break
+                worker = self.spawn()
+                if worker is not None:
+                    self.idle.put(worker)
+
+        if wait:
+            start_workers()
+        else:
+            threading.Thread(target=start_workers, name="exec-pool-starter", daemon=True).start()
+
+    def short(self):
+        # Whether the pool has fewer workers (counting those starting) than it should: still warming up, or some
+        # failed to start or to be replaced
+        with self.lock:
+            return len(self.workers) + self.spawning < self.size
+
+    def spawn(self):
+        with self.lock:
+            self.spawning += 1
+        try:
+            worker = Worker(self.context)
+        except Exception as e:
+            logger.error(f"Failed to start a code execution worker: {e}")
+            return None
+        finally:
+            with self.lock:
+                self.spawning -= 1
+        with self.lock:
+            if self.closed:
+                worker.stop()
+                return None
+            self.workers.append(worker)
+        return worker
+
+    def retire(self, worker):
+        worker.stop()
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+
+    def acquire(self):
+        """
+        Take an idle worker, starting a new one if the pool is short of workers and none is idle.
+
+        Returns:
+            Worker: The worker, or None if one was needed and couldn't be started.
+        """
+        while True:
+            if self.idle.empty() and self.short():
+                return self.spawn()
+            try:
+                return self.idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def run(self, code, cwd, timeout=None):
+        """
+        Run a code block in a worker.
+
+        Args:
+            code (str): The code.
+            cwd (str): The directory to run it in.
+            timeout (float, optional): Seconds it may run; defaults to the pool's timeout.
+
+        Returns:
+            ExecutionResult: The outcome.
+        """
+        if self.closed:
+            raise RuntimeError("The execution pool is closed")
+        self.start()
+        timeout = self.timeout if timeout is None else timeout
+        cwd = os.path.abspath(cwd)
+
+        worker = self.acquire()
+        if worker is None:
+            return ExecutionResult("crashed", error="no code execution worker could be started", cwd=cwd)
+        started = time.perf_counter()
+        try:
+            worker.connection.send((code, cwd))
+            if worker.connection.poll(timeout):
+                result = ExecutionResult(**worker.connection.recv())
+            else:
+                logger.warning(f"Code block ran for more than {timeout} seconds; stopping its worker")
+                result = ExecutionResult("timeout", error=f"timed out after {timeout} seconds", seconds=time.perf_counter() - started, cwd=cwd)
+                worker.jobs = self.max_jobs
+        except (EOFError, OSError) as e:
+            worker.process.join(1)
+            result = ExecutionResult("crashed", error=f"the worker exited (code {worker.process.exitcode})", seconds=time.perf_counter() - started, cwd=cwd)
+            worker.jobs = self.max_jobs
+            logger.warning(f"Code execution worker died: {type(e).__name__}")
+
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            self.retire(worker)
+            worker = self.spawn()
+        if worker is not None:
+            self.idle.put(worker)
+        return result
+
+    def run_many(self, jobs, timeout=None):
+        """
+        Run several code blocks at once, as many in parallel as there are workers.
+
+        Args:
+            jobs (list): (code, cwd) pairs.
+            timeout (float, optional): Seconds each block may run.
+
+        Returns:
+            list: The ExecutionResults, in the order of jobs.
+        """
+        if len(jobs) == 1:
+            return [self.run(jobs[0][0], jobs[0][1], timeout)]
+        with ThreadPoolExecutor(max_workers=min(len(jobs), self.size), thread_name_prefix="exec-pool") as executor:
+            return list(executor.map(lambda job: self.run(job[0], job[1], timeout), jobs))
+
+    def close(self):
+        """
+        Stop every worker.
+        """
+        with self.lock:
+            self.closed = True
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+
+# One pool per process, shared by every OracleInterpreter in it
+default_pool = None
+default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """
+    Return the process-wide execution pool, creating (and starting to warm) it on first use.
+    """
+    global default_pool
+    with default_pool_lock:
+        if default_pool is None:
+            default_pool = ExecutionPool()
+            default_pool.start()
+            atexit.register(default_pool.close)
+        return default_pool
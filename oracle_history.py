@@ -0,0 +1,248 @@
+# oracle_history.py
+# Conversation history manager for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Keeps every request a predictable size. Tokens are counted locally (tiktoken when its encoding is
+# available, an estimate until then), the most recent turns that fit the budget are sent as they are,
+# and the turns that fall out of the window are folded into a rolling summary by a background thread,
+# so nobody waits for the summary and long sessions never overflow the context window.
+
+
+import re
+import logging
+import threading
+from functools import lru_cache
+
+
+logger = logging.getLogger("history")
+
+
+# Tokens added per message for the role and separators
+MESSAGE_OVERHEAD = 4
+
+encoder = None
+encoder_lock = threading.Lock()
+encoder_state = "unloaded"
+
+
+def load_encoder():
+    """
+    Load tiktoken's cl100k_base encoding on a background thread.
+
+    The encoding may have to be downloaded the first time, so nothing waits for it: count_tokens estimates
+    until it is ready, and keeps estimating if tiktoken isn't installed or the download fails.
+    """
+    global encoder_state
+    with encoder_lock:
+        if encoder_state != "unloaded":
+            return
+        encoder_state = "loading"
+
+    def load():
+        global encoder, encoder_state
+        try:
+            import tiktoken
+            encoder = tiktoken.get_encoding("cl100k_base")
+            encoder_state = "ready"
+            count_tokens.cache_clear()
+        except Exception as e:
+            logger.info(f"Token counts are estimated; tiktoken is unavailable ({type(e).__name__})")
+            encoder_state = "failed"
+
+    threading.Thread(target=load, name="tiktoken-loader", daemon=True).start()
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    """
+    Count the tokens in a piece of text.
+
+    Counts are cached per string, so the history already sent is never counted twice.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The number of tokens (exact with tiktoken, otherwise estimated).
+    """
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    load_encoder()
+    # About four characters per token for English prose; code and punctuation run denser
+    return max(len(text) // 4, len(re.findall(r"\w+|[^\w\s]", text)) * 3 // 4) + 1
+
+
+def message_tokens(message):
+    """
+    Count the tokens a chat message takes, including its per-message overhead.
+
+    Args:
+        message (dict): A message with a "content" string (OpenAI, Anthropic and Open Interpreter formats).
+
+    Returns:
+        int: The number of tokens.
+    """
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = str(content) if content is not None else ""
+    return count_tokens(content) + MESSAGE_OVERHEAD
+
+
+class ConversationHistory:
+    """
+    Sliding-window conversation history with a rolling summary of the turns that fell out of it.
+
+    The messages can be this object's own (the Anthropic path keeps its history here) or someone else's list
+    (Open Interpreter's messages), trimmed with fit. Trimmed messages are handed to a background thread that
+    folds them into summary with the summarizer; until it finishes, they are simply left out.
+
+    Attributes:
+        messages (list): The turns kept, oldest first, as {"role", "content"} dicts.
+        summary (str): The rolling summary of the turns dropped so far.
+        summary_tokens (int): The most tokens the summary may take.
+        summarizer (callable): Called as summarizer(summary, messages) to produce a new summary; if it is None
+            or fails, the summary is extended with the start of each dropped message instead.
+    """
+
+    def __init__(self, summarizer=None, summary_tokens=500):
+        self.messages = []
+        self.summary = ""
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.lock = threading.Lock()
+        self.pending = []
+        self.worker = None
+        # Bumped by clear(), so a summary still being written for the old conversation is thrown away
+        self.generation = 0
+
+    def add(self, role, content):
+        """
+        Append a message to the history.
+
+        Args:
+            role (str): "user" or "assistant".
+            content (str): The message text.
+        """
+        with self.lock:
+            self.messages.append({"role": role, "content": content})
+
+    def window(self, budget):
+        """
+        Trim this history to the most recent turns that fit in budget tokens, and return them.
+
+        Args:
+            budget (int): The most tokens the kept messages may take.
+
+        Returns:
+            list: The kept messages, oldest first.
+        """
+        with self.lock:
+            messages = list(self.messages)
+        kept = self.fit(messages, budget)
+        with self.lock:
+            # Messages added while fitting are kept too
+            self.messages = kept + self.messages[len(messages):]
+            return list(kept)
+
+    def fit(self, messages, budget):
+        """
+        Keep the most recent messages of a list that fit in budget tokens, queueing the rest to be summarized.
+
+        The window always starts at a user message, so it never opens with a reply (or, for Open Interpreter,
+        with code output) whose question was dropped.
+
+        Args:
+            messages (list): The messages, oldest first.
+            budget (int): The most tokens the kept messages may take.
+
+        Returns:
+            list: The kept messages, oldest first.
+        """
+        used = 0
+        start = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            used += message_tokens(messages[index])
+            if used > budget:
+                break
+            start = index
+        while start < len(messages) and messages[start].get("role") != "user":
+            start += 1
+
+        if start:
+            self.summarize_later(messages[:start])
+        return messages[start:]
+
+    def summarize_later(self, dropped):
+        """
+        Queue dropped messages to be folded into the summary by the background thread.
+        """
+        with self.lock:
+            self.pending.extend(dropped)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.summarize_pending, name="history-summarizer", daemon=True)
+                self.worker.start()
+
+    def summarize_pending(self):
+        """
+        Background thread: fold queued messages into the summary until none are left.
+        """
+        while True:
+            # Everything that queued up meanwhile is folded in with a single summarizer call
+            with self.lock:
+                if not self.pending:
+                    self.worker = None
+                    return
+                dropped, self.pending = self.pending, []
+                summary, generation = self.summary, self.generation
+
+            new_summary = None
+            if self.summarizer is not None:
+                try:
+                    new_summary = self.summarizer(summary, dropped)
+                except Exception as e:
+                    logger.warning(f"Summarizing the conversation history failed: {e}")
+            if not new_summary:
+                new_summary = self.extend_summary(summary, dropped)
+            new_summary = self.truncate(new_summary)
+
+            with self.lock:
+                if generation == self.generation:
+                    self.summary = new_summary
+
+    def extend_summary(self, summary, dropped):
+        """
+        The fallback summary: the old summary followed by the start of each dropped message.
+        """
+        lines = [summary] if summary else []
+        for message in dropped:
+            text = " ".join(str(message.get("content", "")).split())
+            if text:
+                lines.append(f"{message.get('role', 'user')}: {text[:200]}")
+        return "\n".join(lines)
+
+    def truncate(self, summary):
+        """
+        Cut a summary down to summary_tokens, keeping its end (the most recent part).
+        """
+        while summary and count_tokens(summary) > self.summary_tokens:
+            summary = summary[len(summary) // 4:]
+        return summary
+
+    def wait(self, timeout=None):
+        """
+        Wait for the background summarizer to catch up (for tests and shutdown).
+        """
+        worker = self.worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def clear(self):
+        """
+        Forget the history and its summary.
+        """
+        with self.lock:
+            self.messages = []
+            self.summary = ""
+            self.pending = []
+            self.generation += 1
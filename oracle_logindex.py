@@ -0,0 +1,301 @@
+# oracle_logindex.py
+# Full-text search over the session logs for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Search it with 'python oracle.py logs search "circuit breaker" --since 30d --model gpt-4o'.
+#
+# The session_*.jsonl and dir_log_*.jsonl files in oracle_logs (plain, or rotated and compressed
+# to .jsonl.gz/.jsonl.xz) are ingested into a SQLite FTS5 index. Every file's byte offset is
+# remembered, so re-indexing only reads what was appended since last time, and a segment that has
+# been compressed since carries on from where its plain-text self left off.
+
+
+import os
+import re
+import json
+import gzip
+import lzma
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# Log files worth indexing; the writer's .tmp archives are ignored until they are renamed into place
+LOG_FILE_PATTERN = re.compile(r"^(session|dir_log)_.*\.jsonl(\.gz|\.xz)?$")
+
+# Relative --since values such as "7d", "12h" or "2w"
+SINCE_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_since(value):
+    """
+    Parse a --since value into a Unix timestamp.
+
+    Args:
+        value (str): A relative age such as "30m", "12h", "7d" or "2w", or a date such as "2024-05-01"
+            or "2024-05-01T09:30".
+
+    Returns:
+        float: The earliest timestamp to include.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    match = re.fullmatch(r"(\d+)\s*([mhdw])", value.strip().lower())
+    if match:
+        return time.time() - int(match.group(1)) * SINCE_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid --since '{value}'; use an age such as 7d or 12h, or a date such as 2024-05-01.")
+
+
+def parse_log_timestamp(value):
+    """
+    Parse the "%Y%m%d_%H%M%S" timestamps used in log records and file names.
+
+    Returns:
+        float: The Unix timestamp, or None if value isn't one.
+    """
+    try:
+        return datetime.strptime(value, "%Y%m%d_%H%M%S").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def open_log(path):
+    """
+    Open a log file for binary reading, decompressing .gz and .xz segments on the fly.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".xz"):
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+
+class LogIndex:
+    """
+    Incremental SQLite FTS5 index of the user/bot message pairs in oracle_logs.
+
+    Both log layouts are understood: {"user_message", "bot_response"} records (the terminal's session logs and the
+    GUI's saved conversations) and {"role", "content"} messages (the GUI's session logs), which are paired up as
+    they are read. Legacy session logs written as one indented JSON array are indexed whole.
+
+    Attributes:
+        path (str): The SQLite file holding the index.
+        logs_directory (str): The folder of logs to index.
+    """
+
+    def __init__(self, path=os.path.join("oracleData", "log_index.sqlite3"), logs_directory="oracle_logs"):
+        self.path = path
+        self.logs_directory = logs_directory
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, offset INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, mtime REAL NOT NULL, pending TEXT)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, timestamp REAL, model TEXT)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS messages_file ON messages (file_id)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp)")
+        # The text lives only in the FTS table, keyed by the message id
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            "user_message, bot_response, tokenize='porter unicode61')"
+        )
+        self.connection.commit()
+
+    def update(self):
+        """
+        Bring the index up to date with oracle_logs, reading only what changed since the last update.
+
+        Returns:
+            dict: files (scanned), updated (files read) and pairs (message pairs added).
+        """
+        counts = {"files": 0, "updated": 0, "pairs": 0}
+        with self.lock:
+            on_disk = {}
+            if os.path.isdir(self.logs_directory):
+                for entry in os.scandir(self.logs_directory):
+                    if entry.is_file() and LOG_FILE_PATTERN.match(entry.name):
+                        on_disk[entry.path] = entry.stat()
+            counts["files"] = len(on_disk)
+
+            known = {row[1]: row for row in self.connection.execute("SELECT id, path, offset, size, mtime, pending FROM files")}
+
+            # A segment that was rotated and compressed keeps its offset: its decompressed stream is the same bytes
+            for path in sorted(on_disk):
+                if path not in known and path.endswith((".gz", ".xz")):
+                    plain = path[:-3]
+                    if plain in known and plain not in on_disk:
+                        self.connection.execute("UPDATE files SET path = ?, size = -1 WHERE path = ?", (path, plain))
+                        row = known.pop(plain)
+                        known[path] = (row[0], path, row[2], -1, row[4], row[5])
+
+            for path, row in list(known.items()):
+                if path not in on_disk:
+                    self.forget(row[0])
+                    del known[path]
+
+            for path, stat in sorted(on_disk.items()):
+                row = known.get(path)
+                if row is not None and row[3] == stat.st_size and row[4] == stat.st_mtime:
+                    continue
+                counts["pairs"] += self.ingest(path, stat, row)
+                counts["updated"] += 1
+
+            self.connection.commit()
+        return counts
+
+    def forget(self, file_id):
+        self.connection.execute("DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages WHERE file_id = ?)", (file_id,))
+        self.connection.execute("DELETE FROM messages WHERE file_id = ?", (file_id,))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def ingest(self, path, stat, row):
+        """
+        Read one log file from its stored offset and index the pairs in it.
+
+        Returns:
+            int: The number of pairs added.
+        """
+        compressed = path.endswith((".gz", ".xz"))
+        if row is not None and not compressed and stat.st_size < row[2]:
+            # Truncated or replaced; start over
+            self.forget(row[0])
+            row = None
+        if row is None:
+            cursor = self.connection.execute(
+                "INSERT INTO files (path, offset, size, mtime, pending) VALUES (?, 0, -1, 0, NULL)", (path,)
+            )
+            file_id, offset, pending = cursor.lastrowid, 0, None
+        else:
+            file_id, offset, pending = row[0], row[2], row[5]
+
+        with open_log(path) as f:
+            f.seek(offset)
+            data = f.read()
+
+        # Legacy session logs are one indented JSON array rather than one record per line
+        legacy = offset == 0 and data.lstrip()[:1] == b"["
+
+        # Plain logs may be mid-write; only whole lines are consumed, the rest is read next time
+        end = len(data) if compressed or legacy else data.rfind(b"\n") + 1
+
+        match = re.search(r"(\d{8}_\d{6})", os.path.basename(path))
+        file_timestamp = parse_log_timestamp(match.group(1)) if match else stat.st_mtime
+
+        pairs = []
+        if legacy:
+            try:
+                records = json.loads(data)
+            except json.JSONDecodeError:
+                records = []
+        else:
+            records = []
+            for line in data[:end].splitlines():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            timestamp = parse_log_timestamp(record.get("timestamp")) or file_timestamp
+            if "user_message" in record:
+                pairs.append((timestamp, record.get("model"), str(record["user_message"]), str(record.get("bot_response", ""))))
+            elif record.get("role") == "user":
+                pending = str(record.get("content", ""))
+            elif record.get("role") == "assistant" and pending is not None:
+                pairs.append((timestamp, record.get("model"), pending, str(record.get("content", ""))))
+                pending = None
+
+        for timestamp, model, user_message, bot_response in pairs:
+            message_id = self.connection.execute(
+                "INSERT INTO messages (file_id, timestamp, model) VALUES (?, ?, ?)", (file_id, timestamp, model)
+            ).lastrowid
+            self.connection.execute(
+                "INSERT INTO messages_fts (rowid, user_message, bot_response) VALUES (?, ?, ?)",
+                (message_id, user_message, bot_response)
+            )
+
+        self.connection.execute(
+            "UPDATE files SET offset = ?, size = ?, mtime = ?, pending = ? WHERE id = ?",
+            (offset + end, stat.st_size, stat.st_mtime, pending, file_id)
+        )
+        return len(pairs)
+
+    def search(self, query, since=None, model=None, limit=10, refresh=True):
+        """
+        Find the message pairs that best match a query, best first.
+
+        The query uses FTS5 syntax (words, "quoted phrases", AND/OR/NOT, prefix*). If it isn't valid FTS5, such
+        as a question with punctuation in it, its words are searched for as plain terms instead.
+
+        Args:
+            query (str): The search query.
+            since (float, optional): Only pairs logged at or after this Unix timestamp.
+            model (str, optional): Only pairs answered by this model.
+            limit (int): The most results to return.
+            refresh (bool): Index anything new in oracle_logs first.
+
+        Returns:
+            list: One dict per pair, with user_message, bot_response, timestamp (ISO format), model, file,
+            snippet and score (lower is better).
+        """
+        if refresh:
+            self.update()
+
+        sql = (
+            "SELECT messages_fts.user_message, messages_fts.bot_response, messages.timestamp, messages.model, files.path, "
+            "snippet(messages_fts, -1, '[', ']', '...', 16), bm25(messages_fts) AS score "
+            "FROM messages_fts JOIN messages ON messages.id = messages_fts.rowid JOIN files ON files.id = messages.file_id "
+            "WHERE messages_fts MATCH ?"
+        )
+        parameters = []
+        if since is not None:
+            sql += " AND messages.timestamp >= ?"
+            parameters.append(since)
+        if model is not None:
+            sql += " AND messages.model = ?"
+            parameters.append(model)
+        sql += " ORDER BY score LIMIT ?"
+        parameters.append(limit)
+
+        with self.lock:
+            try:
+                rows = self.connection.execute(sql, [query] + parameters).fetchall()
+            except sqlite3.OperationalError:
+                terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+                rows = self.connection.execute(sql, [terms] + parameters).fetchall() if terms else []
+
+        return [
+            {
+                "user_message": user_message,
+                "bot_response": bot_response,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(timespec="seconds") if timestamp else None,
+                "model": model_name,
+                "file": path,
+                "snippet": snippet,
+                "score": round(score, 3)
+            }
+            for user_message, bot_response, timestamp, model_name, path, snippet, score in rows
+        ]
+
+    def close(self):
+        """
+        Close the index database.
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,277 @@
+# oracle_logwriter.py
+# Crash-safe session log writer for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Records are appended to oracle_logs as line-delimited JSON by a background thread, so a session's
+# log is on disk as it happens (not just when the user types 'quit') and memory stays flat however
+# long the session runs. Writes are fsynced in batches, and segments are rotated by size and age
+# and then compressed. A write that fails (a full disk, say) is logged and the thread carries on;
+# writing never blocks on a writer thread that has stopped.
+
+
+import os
+import json
+import gzip
+import lzma
+import queue
+import logging
+import shutil
+import threading
+import time
+from datetime import datetime
+
+
+logger = logging.getLogger("logwriter")
+
+# File extensions for each compression option
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "xz": ".xz"}
+
+
+class SessionLogWriter:
+    """
+    Append-only JSONL writer with a background thread, batched fsync, rotation and compression.
+
+    write() only queues the record; the writer thread appends everything queued, flushes and fsyncs once
+    per batch (at most flush_interval seconds apart), and starts a new segment when the current one grows
+    past max_bytes or gets older than max_age. Finished segments are compressed in the background.
+
+    Segments are named '{prefix}_{YYYYmmdd_HHMMSS}.jsonl' like the rest of oracle_logs. The first segment
+    is only created when the first record is written. If a batch can't be written, the error is logged, that
+    segment is closed and the next batch starts a new one.
+
+    Attributes:
+        directory (str): The folder segments are written to.
+        prefix (str): The segment file name prefix, e.g. "session".
+        max_bytes (int): Rotate once a segment reaches this size.
+        max_age (float): Rotate once a segment is this many seconds old.
+        flush_interval (float): The longest a queued record waits before being written and fsynced.
+        compression (str): "gzip", "xz" or None for rotated segments.
+        path (str): The segment currently being written, or None before the first record.
+        segments (list): Every segment path this writer has finished, in order (compressed names).
+        dropped (int): Records discarded because they couldn't be written or the writer thread had stopped.
+    """
+
+    def __init__(self, prefix="session", directory="oracle_logs", max_bytes=8 * 1024 * 1024, max_age=24 * 3600, flush_interval=1.0, compression="gzip", max_queued=10000):
+        if compression not in (None, *COMPRESSION_EXTENSIONS):
+            raise ValueError(f"Unknown compression '{compression}'. Choose gzip, xz or None.")
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.path = None
+        self.segments = []
+
+        # Bounded, so a stalled disk slows writers down instead of growing memory
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.file = None
+        self.opened_at = None
+        self.compressors = []
+        self.closed = False
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name=f"{prefix}-log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        """
+        Queue a record to be appended as one JSON line.
+
+        Blocks while the queue is full (a slow disk), but if the writer thread has stopped the record is
+        dropped instead, so callers such as the GUI's Tk thread can never hang here.
+
+        Args:
+            record (dict): The JSON-serializable record.
+
+        Raises:
+            ValueError: If the writer has been closed.
+        """
+        if self.closed:
+            raise ValueError("The session log writer is closed.")
+        while True:
+            if not self.thread.is_alive():
+                if self.dropped == 0:
+                    logger.error(f"The {self.prefix} log writer has stopped; records are being dropped.")
+                self.dropped += 1
+                return
+            try:
+                self.queue.put(("record", record), timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def flush(self, timeout=None):
+        """
+        Block until everything queued so far is written and fsynced.
+
+        Args:
+            timeout (float, optional): The most seconds to wait. Defaults to waiting indefinitely.
+
+        Returns:
+            bool: True if everything was written in time; False at once if the writer thread has stopped.
+        """
+        if not self.thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """
+        Write everything queued, close the current segment and wait for compression to finish.
+
+        The last segment is left uncompressed, like the active one, so it can still be read as plain JSONL.
+
+        Args:
+            timeout (float, optional): The most seconds to wait. Defaults to waiting indefinitely.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(("close", None))
+        self.thread.join(timeout)
+        for compressor in self.compressors:
+            compressor.join(timeout)
+
+    def run(self):
+        """
+        Writer thread: append queued records in batches until closed.
+        """
+        while True:
+            try:
+                kind, item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.rotate_if_due()
+                continue
+
+            waiters = []
+            closing = False
+            wrote = False
+            failed = 0
+            error = None
+            while True:
+                if kind == "record":
+                    if error is None:
+                        try:
+                            self.append(item)
+                            wrote = True
+                        except Exception as e:
+                            error = e
+                    if error is not None:
+                        failed += 1
+                elif kind == "flush":
+                    waiters.append(item)
+                else:
+                    closing = True
+                    break
+                try:
+                    kind, item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if wrote and error is None:
+                try:
+                    self.sync()
+                except Exception as e:
+                    error = e
+            if error is not None:
+                self.dropped += failed
+                logger.error(f"Couldn't write to the {self.prefix} log {self.path} ({failed} records dropped): {error}")
+                self.abandon_segment()
+            for waiter in waiters:
+                waiter.set()
+            if closing:
+                try:
+                    self.finish_segment(compress=False)
+                except Exception as e:
+                    logger.error(f"Couldn't close the {self.prefix} log {self.path}: {e}")
+                return
+            try:
+                self.rotate_if_due()
+            except Exception as e:
+                logger.error(f"Couldn't rotate the {self.prefix} log {self.path}: {e}")
+                self.abandon_segment()
+
+    def append(self, record):
+        # Open the first segment lazily, so sessions that log nothing leave no empty files
+        if self.file is None:
+            self.open_segment()
+        self.file.write(json.dumps(record, default=str) + "\n")
+        if self.file.tell() >= self.max_bytes:
+            self.sync()
+            self.finish_segment(compress=True)
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def rotate_if_due(self):
+        if self.file is not None and time.time() - self.opened_at >= self.max_age:
+            self.sync()
+            self.finish_segment(compress=True)
+
+    def open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = 0
+        while True:
+            name = f"{self.prefix}_{timestamp}.jsonl" if suffix == 0 else f"{self.prefix}_{timestamp}_{suffix}.jsonl"
+            path = os.path.join(self.directory, name)
+            # A finished segment's name is free again once it has been compressed, so check the archives too
+            if any(os.path.exists(path + extension) for extension in COMPRESSION_EXTENSIONS.values()):
+                suffix += 1
+                continue
+            try:
+                # Exclusive create, so two writers starting in the same second don't share a file
+                self.file = open(path, "x", encoding="utf-8")
+                break
+            except FileExistsError:
+                suffix += 1
+        self.path = path
+        self.opened_at = time.time()
+
+    def abandon_segment(self):
+        # After a failed write, close the segment as it stands (without compressing it) so the next batch starts afresh
+        if self.file is None:
+            return
+        try:
+            self.file.close()
+        except Exception:
+            pass
+        self.file = None
+        self.segments.append(self.path)
+
+    def finish_segment(self, compress):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        path = self.path
+        if compress and self.compression:
+            self.segments.append(path + COMPRESSION_EXTENSIONS[self.compression])
+            compressor = threading.Thread(target=compress_segment, args=(path, self.compression), daemon=True)
+            compressor.start()
+            self.compressors = [thread for thread in self.compressors if thread.is_alive()] + [compressor]
+        else:
+            self.segments.append(path)
+
+
+def compress_segment(path, compression):
+    """
+    Compress a finished segment next to itself and remove the original.
+
+    The compressed file is written under a temporary name and renamed into place, so a crash mid-way
+    never leaves a truncated archive in place of the segment.
+
+    Args:
+        path (str): The segment to compress.
+        compression (str): "gzip" or "xz".
+    """
+    target = path + COMPRESSION_EXTENSIONS[compression]
+    opener = gzip.open if compression == "gzip" else lzma.open
+    with open(path, "rb") as source, opener(target + ".tmp", "wb") as destination:
+        shutil.copyfileobj(source, destination)
+    os.replace(target + ".tmp", target)
+    os.remove(path)
@@ -0,0 +1,296 @@
+# oracle_memory.py
+# Memory retrieval for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# A local BM25 index over the memory directories (alexandria, aetherion, athenium, acheron), so the
+# passages relevant to a message can be handed to the model up front instead of the model spending
+# several code-execution round-trips listing and reading files to find them. No embeddings and no
+# network: files are split into passages, tokenized, and kept in an in-memory inverted index that
+# is refreshed from file mtimes and sizes, so only files that changed are read again.
+
+
+import os
+import re
+import math
+import heapq
+import threading
+import time
+from collections import Counter
+
+
+# Words too common to say anything about relevance
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is it its me my not of on or our "
+    "she so than that the their them then there these they this to was we were what when where which who will "
+    "with you your".split()
+)
+
+# Files bigger than this are skipped (they are rarely notes, and would dominate the index)
+MAX_FILE_BYTES = 1024 * 1024
+
+# Passages are cut at blank lines, and at about this many characters within long paragraphs
+PASSAGE_CHARS = 800
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens, dropping stopwords and single characters.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The tokens, in order.
+    """
+    return [token for token in re.findall(r"\w+", text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """
+    Roughly estimate how many model tokens a piece of text takes (about four characters each).
+    """
+    return len(text) // 4 + 1
+
+
+def split_passages(text):
+    """
+    Split a file's text into passages, each with the line number it starts on.
+
+    Args:
+        text (str): The file's text.
+
+    Yields:
+        tuple: The starting line number (1-based) and the passage text.
+    """
+    lines = []
+    start = 1
+    size = 0
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip() or size + len(line) > PASSAGE_CHARS:
+            if lines:
+                yield start, "\n".join(lines)
+            lines, size = [], 0
+            if not line.strip():
+                continue
+        if not lines:
+            start = number
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        yield start, "\n".join(lines)
+
+
+class MemoryIndex:
+    """
+    Incremental BM25 index over the files in a set of directories.
+
+    Each file is split into passages, and each passage is a document. The index is refreshed before a search
+    (at most once every refresh_interval seconds): files are only re-read when their mtime or size changed,
+    and deleted files are dropped.
+
+    Attributes:
+        directories (list): The directories indexed, searched recursively.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalization.
+        refresh_interval (float): The least time between two scans of the directories.
+    """
+
+    def __init__(self, directories, k1=1.2, b=0.75, refresh_interval=1.0):
+        self.directories = list(directories)
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+
+        # path -> (mtime, size, [passage ids])
+        self.files = {}
+        # passage id -> (path, line, text, length)
+        self.passages = {}
+        # term -> {passage id: term frequency}
+        self.postings = {}
+        self.total_length = 0
+        self.next_id = 0
+        self.scanned_at = None
+
+    def refresh(self, force=False):
+        """
+        Bring the index up to date with the directories.
+
+        Args:
+            force (bool): Scan even if the last scan was less than refresh_interval seconds ago.
+
+        Returns:
+            int: The number of files (re-)read.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.scanned_at is not None and now - self.scanned_at < self.refresh_interval:
+                return 0
+            self.scanned_at = now
+
+            seen = {}
+            for directory in self.directories:
+                for root, dirnames, filenames in os.walk(directory):
+                    # Skip hidden folders and Python caches
+                    dirnames[:] = [name for name in dirnames if not name.startswith(".") and name != "__pycache__"]
+                    for filename in filenames:
+                        path = os.path.join(root, filename)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        seen[path] = (stat.st_mtime, stat.st_size)
+
+            for path in list(self.files):
+                if path not in seen:
+                    self.remove_file(path)
+
+            read = 0
+            for path, (mtime, size) in seen.items():
+                known = self.files.get(path)
+                if known is not None and known[0] == mtime and known[1] == size:
+                    continue
+                if known is not None:
+                    self.remove_file(path)
+                self.add_file(path, mtime, size)
+                read += 1
+            return read
+
+    def add_file(self, path, mtime, size):
+        passage_ids = []
+        if size <= MAX_FILE_BYTES:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = b""
+            # Binary files (images, archives, audio) aren't indexed
+            if b"\0" not in data[:1024]:
+                for line, text in split_passages(data.decode("utf-8", errors="ignore")):
+                    tokens = tokenize(text)
+                    if not tokens:
+                        continue
+                    passage_id = self.next_id
+                    self.next_id += 1
+                    self.passages[passage_id] = (path, line, text, len(tokens))
+                    self.total_length += len(tokens)
+                    for term, frequency in Counter(tokens).items():
+                        self.postings.setdefault(term, {})[passage_id] = frequency
+                    passage_ids.append(passage_id)
+        self.files[path] = (mtime, size, passage_ids)
+
+    def remove_file(self, path):
+        _, _, passage_ids = self.files.pop(path)
+        for passage_id in passage_ids:
+            _, _, text, length = self.passages.pop(passage_id)
+            self.total_length -= length
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(passage_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def search(self, query, k=5):
+        """
+        Find the passages most relevant to a query, best first.
+
+        Args:
+            query (str): The query, such as the user's message.
+            k (int): The most passages to return.
+
+        Returns:
+            list: One dict per passage, with path, line, text and score.
+        """
+        self.refresh()
+        with self.lock:
+            count = len(self.passages)
+            if not count:
+                return []
+            average_length = self.total_length / count
+
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for passage_id, frequency in postings.items():
+                    length = self.passages[passage_id][3]
+                    weight = frequency * (self.k1 + 1) / (frequency + self.k1 * (1 - self.b + self.b * length / average_length))
+                    scores[passage_id] = scores.get(passage_id, 0.0) + idf * weight
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                {"path": self.passages[passage_id][0], "line": self.passages[passage_id][1], "text": self.passages[passage_id][2], "score": round(score, 3)}
+                for passage_id, score in best
+            ]
+
+    def context_for(self, query, max_tokens=1000, k=8):
+        """
+        Build a block of the passages most relevant to a query, to put in front of a message.
+
+        Passages are added best first for as long as they fit in max_tokens.
+
+        Args:
+            query (str): The query, such as the user's message.
+            max_tokens (int): The most (estimated) tokens the block may take.
+            k (int): The most passages to consider.
+
+        Returns:
+            str: The context block, or "" if nothing relevant was found.
+        """
+        header = "Relevant excerpts from your memory directories (retrieved automatically; open the files for more):\n\n"
+        budget = max_tokens - estimate_tokens(header)
+        sections = []
+        for passage in self.search(query, k=k):
+            section = f"[{passage['path']}:{passage['line']}]\n{passage['text']}\n\n"
+            cost = estimate_tokens(section)
+            if cost > budget:
+                continue
+            sections.append(section)
+            budget -= cost
+        if not sections:
+            return ""
+        return header + "".join(sections) + "---\n\n"
+
+
+# One index per set of directories, shared by every OracleInterpreter in the process that uses them
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def get_memory_index(directories):
+    """
+    Return the process-wide index for a set of directories, creating it on first use.
+
+    Args:
+        directories (list): The directories to index.
+
+    Returns:
+        MemoryIndex: The shared index.
+    """
+    key = tuple(os.path.abspath(directory) for directory in directories)
+    with indexes_lock:
+        if key not in indexes:
+            indexes[key] = MemoryIndex(directories)
+        return indexes[key]
+
+
+def release_memory_index(directories):
+    """
+    Drop the process-wide index for a set of directories, freeing its passages.
+
+    For directories that are going away, such as a closed server session's. An interpreter still using them
+    gets a fresh index on its next lookup.
+
+    Args:
+        directories (list): The directories the index was created for.
+
+    Returns:
+        bool: True if there was an index to drop.
+    """
+    key = tuple(os.path.abspath(directory) for directory in directories)
+    with indexes_lock:
+        return indexes.pop(key, None) is not None
@@ -0,0 +1,373 @@
+# oracle_metrics.py
+# Request metrics for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Every chat is measured: provider and model, time to first token, total latency, prompt/completion/
+# cached tokens, retries, response cache hits, code blocks executed (and how long they took) and
+# search calls. The numbers go into in-process counters and histograms, which can be read as
+# Prometheus text (GET /metrics on the server, or --metrics-file for node_exporter's textfile
+# collector) and summarized by the '!stats' command in the terminal.
+
+
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+
+# Histogram buckets, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+EXECUTION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    A monotonically increasing count, per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description shown in the Prometheus output.
+        labels (tuple): The label names.
+    """
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        return self.values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in cumulative buckets, per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description shown in the Prometheus output.
+        labels (tuple): The label names.
+        buckets (tuple): The bucket upper bounds, ascending.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [bucket counts..., sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self.lock:
+            series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket_labels = format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                bucket_labels = format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The set of metrics rendered together as Prometheus text.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition, ending with a newline.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the exposition to a file, replacing it atomically so a scraper never reads half of it.
+
+        Args:
+            path (str): The file to write, e.g. for node_exporter's textfile collector.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("oracle_requests_total", "Chat requests by provider, model and outcome (ok, error, cancelled).", ["provider", "model", "status"])
+REQUEST_SECONDS = registry.histogram("oracle_request_duration_seconds", "Total chat latency, including code execution.", ["provider", "model"])
+FIRST_TOKEN_SECONDS = registry.histogram("oracle_time_to_first_token_seconds", "Time from sending a chat to its first response chunk.", ["provider", "model"])
+TOKENS = registry.counter("oracle_tokens_total", "Tokens reported by the provider, by kind (prompt, completion, cached, cache_write).", ["provider", "model", "kind"])
+RETRIES = registry.counter("oracle_api_retries_total", "API calls retried by make_api_call.", ["provider"])
+CACHE_HITS = registry.counter("oracle_response_cache_hits_total", "Chats answered from the response cache.", ["provider", "model"])
+CODE_BLOCKS = registry.counter("oracle_code_blocks_executed_total", "Code blocks run by execute_code.")
+CODE_SECONDS = registry.histogram("oracle_code_execution_seconds", "Time spent running each code block.", buckets=EXECUTION_BUCKETS)
+SEARCHES = registry.counter("oracle_search_calls_total", "Search calls by kind (google, browser).", ["kind"])
+SEARCH_SECONDS = registry.histogram("oracle_search_duration_seconds", "Time spent in each search call.", ["kind"])
+
+
+# The request being measured in this thread or task; asyncio.to_thread carries it to worker threads
+current_request = contextvars.ContextVar("oracle_current_request", default=None)
+
+# The most recent finished requests, for the percentiles shown by '!stats'
+recent_requests = deque(maxlen=1000)
+
+
+class RequestMetrics:
+    """
+    The measurements of one chat request, filled in as it runs.
+
+    Attributes:
+        provider (str): "anthropic" or "openai" (updated if the request fails over).
+        model (str): The model answering.
+        ttft (float): Seconds to the first response chunk, or None if none arrived.
+        latency (float): Total seconds, set when the request finishes.
+        prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens (int): Token usage, when reported.
+        retries (int): API calls retried.
+        cache_hit (bool): Whether the response came from the response cache.
+        code_blocks (int): Code blocks executed.
+        code_seconds (float): Time spent executing them.
+        searches (int): Search calls made.
+        status (str): "ok", "error" or "cancelled" once finished.
+    """
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.latency = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.code_blocks = 0
+        self.code_seconds = 0.0
+        self.searches = 0
+        self.status = None
+
+    def first_chunk(self):
+        """
+        Note that a response chunk arrived; the first call sets the time to first token.
+        """
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def finish(self, status):
+        """
+        Stop the clock and add this request to the process-wide metrics.
+        """
+        self.latency = time.perf_counter() - self.started
+        self.status = status
+        labels = {"provider": self.provider, "model": self.model}
+        REQUESTS.inc(status=status, **labels)
+        REQUEST_SECONDS.observe(self.latency, **labels)
+        if self.ttft is not None:
+            FIRST_TOKEN_SECONDS.observe(self.ttft, **labels)
+        for kind in ("prompt", "completion", "cached", "cache_write"):
+            count = getattr(self, f"{kind}_tokens")
+            if count:
+                TOKENS.inc(count, kind=kind, **labels)
+        if self.cache_hit:
+            CACHE_HITS.inc(**labels)
+        recent_requests.append(self.as_dict())
+
+    def as_dict(self):
+        return {key: value for key, value in vars(self).items() if key != "started"}
+
+
+@contextmanager
+def track_request(provider, model):
+    """
+    Measure a chat request: everything inside the block counts towards it.
+
+    Args:
+        provider (str): The provider the request is sent to.
+        model (str): The model the request is sent to.
+
+    Yields:
+        RequestMetrics: The request's measurements, also available as current_request.get().
+    """
+    request = RequestMetrics(provider, model)
+    token = current_request.set(request)
+    status = "ok"
+    try:
+        yield request
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        request.finish(status)
+        try:
+            current_request.reset(token)
+        except ValueError:
+            # A streaming generator finished in a different context than it started in
+            current_request.set(None)
+
+
+def record_retry(provider):
+    """
+    Count an API call that is about to be retried.
+    """
+    RETRIES.inc(provider=provider or "unknown")
+    request = current_request.get()
+    if request is not None:
+        request.retries += 1
+
+
+def record_code_execution(seconds):
+    """
+    Count a code block run by execute_code and how long it took.
+    """
+    CODE_BLOCKS.inc()
+    CODE_SECONDS.observe(seconds)
+    request = current_request.get()
+    if request is not None:
+        request.code_blocks += 1
+        request.code_seconds += seconds
+
+
+def record_search(kind, seconds, calls=1):
+    """
+    Count search calls ("google" or "browser") and how long they took.
+    """
+    SEARCHES.inc(calls, kind=kind)
+    SEARCH_SECONDS.observe(seconds, kind=kind)
+    request = current_request.get()
+    if request is not None:
+        request.searches += calls
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def format_stats():
+    """
+    Summarize the recent requests for the '!stats' command.
+
+    Returns:
+        str: A small table per provider and model: requests, errors, TTFT and latency percentiles, tokens
+            (with the share read from the prompt cache), retries, response cache hits, code blocks and searches.
+    """
+    if not recent_requests:
+        return "No requests yet."
+
+    groups = {}
+    for request in recent_requests:
+        groups.setdefault((request["provider"], request["model"]), []).append(request)
+
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else "-"
+
+    lines = [f"Last {len(recent_requests)} requests:"]
+    for (provider, model), requests in sorted(groups.items()):
+        ttfts = [request["ttft"] for request in requests if request["ttft"] is not None]
+        latencies = [request["latency"] for request in requests]
+        prompt = sum(request["prompt_tokens"] for request in requests)
+        cached = sum(request["cached_tokens"] for request in requests)
+        lines.append("")
+        lines.append(f"  {provider} / {model}")
+        lines.append(f"    requests     {len(requests)} ({sum(request['status'] == 'error' for request in requests)} errors, {sum(request['cache_hit'] for request in requests)} from the response cache)")
+        lines.append(f"    first token  p50 {seconds(percentile(ttfts, 0.5))}  p95 {seconds(percentile(ttfts, 0.95))}")
+        lines.append(f"    latency      p50 {seconds(percentile(latencies, 0.5))}  p95 {seconds(percentile(latencies, 0.95))}")
+        lines.append(f"    tokens       {prompt} prompt ({cached * 100 // prompt if prompt else 0}% cached), {sum(request['completion_tokens'] for request in requests)} completion")
+        lines.append(f"    retries      {sum(request['retries'] for request in requests)}")
+        lines.append(f"    code blocks  {sum(request['code_blocks'] for request in requests)} ({sum(request['code_seconds'] for request in requests):.2f}s)")
+        lines.append(f"    searches     {sum(request['searches'] for request in requests)}")
+    return "\n".join(lines)
+
+
+def start_file_exporter(path, interval=15.0):
+    """
+    Write the metrics to a file every interval seconds on a background thread.
+
+    Args:
+        path (str): The file to write (e.g. a .prom file in node_exporter's textfile directory).
+        interval (float): Seconds between writes.
+
+    Returns:
+        threading.Thread: The exporter thread (a daemon).
+    """
+    def export():
+        while True:
+            try:
+                registry.write(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=export, name="metrics-exporter", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,189 @@
+# oracle_output.py
+# Terminal output classifier for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# The GUI reads the Oracle's terminal line by line, and a chatty code block can print tens of thousands
+# of lines. Each one used to go through six separate re.search calls to weed out library noise, then a
+# chain of startswith checks to tell the user's lines from the Oracle's, and the controller had its own
+# path that filtered nothing. Now there is one classifier, shared by both, that sorts a line into user,
+# oracle, code, console, warning or noise in one pass: the filters are precompiled into substring checks
+# and one combined regex, and the prefixes are found by their first character. The noise filters are
+# configurable, and a count is kept of each class.
+
+
+import re
+
+
+# The classes a line can fall into
+USER = "user"
+ORACLE = "oracle"
+CODE = "code"
+CONSOLE = "console"
+WARNING = "warning"
+NOISE = "noise"
+
+LINE_CLASSES = (USER, ORACLE, CODE, CONSOLE, WARNING, NOISE)
+
+# Lines matching any of these (anywhere in the line) are noise: library chatter nobody asked for
+DEFAULT_FILTERS = [
+    r"UserWarning: Field",
+    r"You may be able to resolve this warning",
+    r"pygame",
+    r"Hello from the pygame community",
+    r"warnings\.warn\(",
+    r"\[\d+;\d+;\d+m.*\[0m"
+]
+
+# Lines matching any of these (and no filter) are warnings and errors worth showing
+WARNING_PATTERNS = [
+    r"Warning: ",
+    r"Error: ",
+    r"Exception: ",
+    r"^Traceback \(most recent call last\)",
+    r"^WARNING:",
+    r"^ERROR:",
+    r"^CRITICAL:"
+]
+
+# The literal prefixes, by first character, and the class each marks
+PREFIXES = {"U": ("User: ", USER), "O": ("Oracle: ", ORACLE), "`": ("```", CODE)}
+
+REGEX_SPECIAL = set(".^$*+?{}[]|()")
+
+
+def literal_of(pattern):
+    """
+    Return the text a regular expression matches if it is a plain string (escaped punctuation allowed), or None.
+    """
+    text = []
+    index = 0
+    while index < len(pattern):
+        character = pattern[index]
+        if character == "\\":
+            if index + 1 < len(pattern) and not pattern[index + 1].isalnum():
+                text.append(pattern[index + 1])
+                index += 2
+                continue
+            return None
+        if character in REGEX_SPECIAL:
+            return None
+        text.append(character)
+        index += 1
+    return "".join(text)
+
+
+class PatternSet:
+    """
+    Tells whether a line matches any of a list of regular expressions, as cheaply as it can.
+
+    Plain strings are looked for with str's substring search, strings anchored with ^ with startswith, and
+    only the real regular expressions go through re, combined into one pattern searched once. Most filters
+    are plain strings, and a substring search is several times faster than re.search.
+
+    Attributes:
+        patterns (list): The regular expressions, as given.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        literals = []
+        prefixes = []
+        expressions = []
+        for pattern in self.patterns:
+            re.compile(pattern)  # Raises re.error for a bad pattern, whichever way it ends up being matched
+            if pattern.startswith("^") and literal_of(pattern[1:]):
+                prefixes.append(literal_of(pattern[1:]))
+            elif literal_of(pattern):
+                literals.append(literal_of(pattern))
+            else:
+                expressions.append(pattern)
+        # A literal containing another one never decides anything
+        self.literals = [literal for literal in literals if not any(other != literal and other in literal for other in literals)]
+        self.prefixes = tuple(prefixes)
+        self.expression = re.compile("|".join(f"(?:{pattern})" for pattern in expressions)) if expressions else None
+
+    def search(self, line):
+        for literal in self.literals:
+            if literal in line:
+                return True
+        if self.prefixes and line.startswith(self.prefixes):
+            return True
+        return self.expression is not None and self.expression.search(line) is not None
+
+
+class OutputClassifier:
+    """
+    Sorts terminal output lines into user, oracle, code, console, warning and noise.
+
+    classify() also follows code fences, so the lines between them are code; line_class() looks at a line on
+    its own. Noise wins over everything, so a filtered line is dropped even inside a code block.
+
+    Attributes:
+        filters (list): The noise patterns.
+        counts (dict): How many lines of each class classify() has seen.
+        in_code (bool): Whether classify() is inside a fenced code block.
+    """
+
+    def __init__(self, filters=None, warnings=None):
+        self.noise = PatternSet(DEFAULT_FILTERS if filters is None else filters)
+        self.warnings = PatternSet(WARNING_PATTERNS if warnings is None else warnings)
+        self.counts = dict.fromkeys(LINE_CLASSES, 0)
+        self.in_code = False
+
+    @property
+    def filters(self):
+        return self.noise.patterns
+
+    def set_filters(self, filters):
+        """
+        Replace the noise patterns.
+
+        Raises:
+            re.error: If a pattern doesn't compile; the old ones are kept.
+        """
+        self.noise = PatternSet(filters)
+
+    def line_class(self, line):
+        """
+        Classify one line on its own, without following code fences or counting it.
+
+        Returns:
+            str: USER, ORACLE, CODE (a fence line), CONSOLE, WARNING or NOISE.
+        """
+        if self.noise.search(line):
+            return NOISE
+        prefix = PREFIXES.get(line[:1])
+        if prefix is not None and line.startswith(prefix[0]):
+            return prefix[1]
+        if self.warnings.search(line):
+            return WARNING
+        return CONSOLE
+
+    def classify(self, line):
+        """
+        Classify the next line of a stream, following code fences, and count it.
+
+        Returns:
+            str: USER, ORACLE, CODE, CONSOLE, WARNING or NOISE.
+        """
+        kind = self.line_class(line)
+        if kind == CODE:
+            # A fence opens or closes a block, unless the code is on the fence line itself (```x = 1```)
+            stripped = line.strip()
+            if len(stripped) <= 6 or not stripped.endswith("```"):
+                self.in_code = not self.in_code
+        elif kind != NOISE and self.in_code:
+            kind = CODE
+        self.counts[kind] += 1
+        return kind
+
+    def reset(self):
+        self.counts = dict.fromkeys(LINE_CLASSES, 0)
+        self.in_code = False
+
+    def summary(self):
+        """
+        Return the counts as one line, such as "user 3, oracle 12, ... noise 40".
+        """
+        return ", ".join(f"{kind} {self.counts[kind]}" for kind in LINE_CLASSES)
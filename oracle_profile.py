@@ -0,0 +1,382 @@
+# oracle_profile.py
+# Turn profiler for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# For when "the Oracle is slow" and nobody can say whether the time went to the network, the exec'd
+# code or Tk. With --profile (or the GUI's profiling toggle) every turn is split into stages: command
+# parsing, the LLM call, rendering the stream to Markdown, code-block extraction, code execution and
+# printing or GUI insertion. Each stage is timed with perf_counter, and its time excludes the stages
+# nested inside it, so the stages of a turn add up. Optionally each turn is also captured with cProfile
+# (a .pstats file) and tracemalloc (a text file of the lines that allocated the most). Everything lands
+# in oracle_logs/profiles, and 'python oracle.py profile summary' ranks the slowest stages of a session.
+# With profiling off, a stage costs one attribute check.
+
+
+import os
+import glob
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
+
+from oracle_metrics import percentile
+
+
+PROFILES_DIRECTORY = os.path.join("oracle_logs", "profiles")
+
+# What --profile captures besides the stage timers
+CAPTURES = {"timers": (False, False), "cpu": (True, False), "memory": (False, True), "full": (True, True)}
+
+# The allocation report lists this many source lines
+ALLOCATION_LINES = 30
+
+# Shared by every stage while profiling is off
+NULL_STAGE = nullcontext()
+
+
+class Stage:
+    """
+    Times one stage; the stages nested inside it (on the same thread) are subtracted from its time.
+    """
+
+    __slots__ = ("profiler", "name", "started", "nested")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        stack.append(self)
+        self.nested = 0.0
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        stack = self.profiler.stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.profiler.record(self.name, elapsed - self.nested)
+        return False
+
+
+class Profiler:
+    """
+    Per-turn stage timings with optional cProfile and tracemalloc captures.
+
+    One turn is profiled at a time (the terminal and the GUI run one turn at a time). Stages may run on any
+    thread, such as the GUI's insertions on the Tk thread; they are added to the turn in progress, and to the
+    session totals only if no turn is.
+
+    Attributes:
+        enabled (bool): Whether stages and turns are recorded.
+        cpu (bool): Capture each turn with cProfile into a .pstats file.
+        memory (bool): Capture each turn's allocations with tracemalloc.
+        directory (str): Where the session file and captures are written.
+        records (list): The turns recorded this session, as written to the session file.
+        path (str): The session file (profile_<timestamp>.jsonl), created with the first turn.
+    """
+
+    def __init__(self, directory=PROFILES_DIRECTORY):
+        self.enabled = False
+        self.cpu = False
+        self.memory = False
+        self.directory = directory
+        self.records = []
+        self.path = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.current = None
+        # Stages that ran outside a turn: name -> [calls, seconds]
+        self.unattributed = {}
+
+    def enable(self, capture=None):
+        """
+        Turn profiling on.
+
+        Args:
+            capture (str, optional): "timers", or also capture each turn with cProfile ("cpu"), tracemalloc
+                ("memory") or both ("full"). Defaults to the captures set last time (none at first).
+        """
+        if capture is not None:
+            self.cpu, self.memory = CAPTURES[capture]
+        self.enabled = True
+
+    def disable(self):
+        """
+        Turn profiling off. The turn in progress, if any, is still written.
+        """
+        self.enabled = False
+
+    @property
+    def mode(self):
+        """
+        What enable() was last given, as a --profile value ("timers", "cpu", "memory" or "full"), or None while off.
+        """
+        if not self.enabled:
+            return None
+        return next(name for name, captures in CAPTURES.items() if captures == (self.cpu, self.memory))
+
+    def merge(self, stages):
+        """
+        Add stages timed elsewhere, such as in the GUI's backend process, to the current turn.
+
+        Args:
+            stages (dict): Stage name -> {"calls", "seconds"}, as in a turn record.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            target = self.current["stages"] if self.current is not None else self.unattributed
+            for name, stage in stages.items():
+                entry = target.setdefault(name, [0, 0.0])
+                entry[0] += stage["calls"]
+                entry[1] += stage["seconds"]
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def stage(self, name):
+        """
+        Time a stage of the current turn.
+
+        Args:
+            name (str): The stage, such as "llm" or "execute_code".
+
+        Returns:
+            A context manager.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def iterate(self, name, iterator):
+        """
+        Pass an iterator's items on, timing only the time spent producing them as a stage.
+
+        The consumer's time between items (printing, GUI insertion) isn't counted, which is what separates
+        waiting on the LLM from displaying its reply.
+
+        Args:
+            name (str): The stage.
+            iterator: The iterator, such as a streamed response.
+
+        Yields:
+            The iterator's items.
+        """
+        if not self.enabled:
+            yield from iterator
+            return
+        iterator = iter(iterator)
+        while True:
+            with Stage(self, name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, name, seconds):
+        with self.lock:
+            stages = self.current["stages"] if self.current is not None else self.unattributed
+            entry = stages.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    @contextmanager
+    def turn(self, message=""):
+        """
+        Profile one turn: its stages, and its cProfile and tracemalloc captures if enabled.
+
+        Args:
+            message (str): The user's message, the start of which is kept to tell turns apart.
+
+        Yields:
+            dict: The turn's record in progress, or None if profiling is off.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        with self.lock:
+            number = len(self.records) + 1
+            turn = {"turn": number, "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"), "message": message[:100], "stages": {}}
+            self.current = turn
+
+        profile = None
+        if self.cpu:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already running (a debugger, or python -m cProfile)
+                profile = None
+
+        snapshot = None
+        started_tracing = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            snapshot = tracemalloc.take_snapshot()
+
+        started = time.perf_counter()
+        try:
+            yield turn
+        finally:
+            turn["seconds"] = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+            with self.lock:
+                self.current = None
+            self.finish_turn(turn, profile, snapshot, started_tracing)
+
+    def finish_turn(self, turn, profile, snapshot, started_tracing):
+        """
+        Write a finished turn's captures and append its record to the session file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.path is None:
+            self.path = os.path.join(self.directory, f"profile_{turn['timestamp']}.jsonl")
+        prefix = f"{self.path[:-len('.jsonl')]}_turn{turn['turn']:03d}"
+
+        if snapshot is not None:
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            turn["allocated_bytes"], turn["allocations"] = self.write_allocations(prefix + "_alloc.txt", snapshot, after)
+        if profile is not None:
+            profile.dump_stats(prefix + ".pstats")
+            turn["pstats"] = prefix + ".pstats"
+
+        stages = turn["stages"]
+        turn["stages"] = {name: {"calls": calls, "seconds": round(seconds, 6)} for name, (calls, seconds) in stages.items()}
+        # Whatever no stage covered: history trimming, memory retrieval, logging, the cache
+        turn["untracked"] = round(max(turn["seconds"] - sum(seconds for _, seconds in stages.values()), 0.0), 6)
+        turn["seconds"] = round(turn["seconds"], 6)
+
+        self.records.append(turn)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(turn) + "\n")
+
+    def write_allocations(self, path, before, after):
+        """
+        Write the source lines whose allocations grew the most during a turn.
+
+        Returns:
+            tuple: The net bytes allocated during the turn, and the report's path.
+        """
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, __file__))
+        differences = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+        net = sum(difference.size_diff for difference in differences)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Net allocated during the turn: {net / 1024:.1f} KiB\n\n")
+            for difference in differences[:ALLOCATION_LINES]:
+                f.write(f"{difference}\n")
+        return net, path
+
+
+# The process-wide profiler; --profile and the GUI toggle turn it on
+profiler = Profiler()
+
+
+def load_session(path):
+    """
+    Read the turn records of a session file, skipping unreadable lines.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def latest_session(directory=PROFILES_DIRECTORY):
+    """
+    Return the most recent session file in directory, or None if there is none.
+    """
+    paths = glob.glob(os.path.join(directory, "profile_*.jsonl"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def summarize(records):
+    """
+    Rank the stages of a session by their total time, slowest first.
+
+    Args:
+        records (list): Turn records, as written to a session file.
+
+    Returns:
+        list: One dict per stage (untracked time included), with turns, calls, total, mean, p95 and max
+            (seconds per turn) and share (of all turn time).
+    """
+    per_turn = {}
+    calls = {}
+    for record in records:
+        for name, stage in record["stages"].items():
+            per_turn.setdefault(name, []).append(stage["seconds"])
+            calls[name] = calls.get(name, 0) + stage["calls"]
+        per_turn.setdefault("untracked", []).append(record.get("untracked", 0.0))
+        calls["untracked"] = calls.get("untracked", 0) + 1
+
+    overall = sum(record["seconds"] for record in records) or 1.0
+    rows = [
+        {
+            "stage": name,
+            "turns": len(seconds),
+            "calls": calls[name],
+            "total": sum(seconds),
+            "mean": sum(seconds) / len(seconds),
+            "p95": percentile(seconds, 0.95),
+            "max": max(seconds),
+            "share": sum(seconds) / overall
+        }
+        for name, seconds in per_turn.items()
+    ]
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def format_summary(records, slowest=5):
+    """
+    Summarize a session for the 'profile summary' and '!profile' commands.
+
+    Args:
+        records (list): Turn records, as written to a session file.
+        slowest (int): How many of the slowest turns to list.
+
+    Returns:
+        str: The stage ranking and the slowest turns.
+    """
+    if not records:
+        return "No profiled turns yet."
+
+    lines = [f"{len(records)} turn(s), {sum(record['seconds'] for record in records):.2f}s in total", ""]
+    lines.append(f"  {'stage':<14} {'turns':>5} {'calls':>7} {'total':>9} {'mean':>9} {'p95':>9} {'max':>9} {'share':>6}")
+    for row in summarize(records):
+        lines.append(
+            f"  {row['stage']:<14} {row['turns']:>5} {row['calls']:>7} {row['total']:>8.3f}s {row['mean']:>8.3f}s "
+            f"{row['p95']:>8.3f}s {row['max']:>8.3f}s {row['share'] * 100:>5.1f}%"
+        )
+
+    lines.append("")
+    lines.append("Slowest turns:")
+    for record in sorted(records, key=lambda record: record["seconds"], reverse=True)[:slowest]:
+        top = max(record["stages"].items(), key=lambda item: item[1]["seconds"], default=None)
+        top = f"{top[0]} {top[1]['seconds']:.3f}s" if top else "no stages"
+        lines.append(f"  #{record['turn']:<4} {record['seconds']:>8.3f}s  (mostly {top})  {record['message'][:60]!r}")
+        for key in ("pstats", "allocations"):
+            if record.get(key):
+                lines.append(f"        {record[key]}")
+    return "\n".join(lines)
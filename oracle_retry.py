@@ -0,0 +1,239 @@
+# oracle_retry.py
+# Retry policy and circuit breakers for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# make_api_call in oracle.py uses these to decide whether a failed request is worth retrying,
+# how long to wait before the next attempt, and when to stop sending requests to a provider
+# that keeps failing.
+
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors and Anthropic's 529 (overloaded)
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Exception class names (from litellm, openai, anthropic, httpx and requests) for failures that never
+# got an HTTP status back, such as dropped connections and timeouts
+RETRYABLE_ERROR_NAMES = ("Timeout", "Connection", "ServiceUnavailable", "RateLimit", "InternalServer", "Overloaded")
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+
+    Attributes:
+        provider (str): The provider that is being skipped.
+        retry_in (float): Seconds until the breaker lets a trial request through.
+    """
+
+    def __init__(self, provider, retry_in):
+        super().__init__(f"The circuit breaker for {provider} is open; retrying in {retry_in:.0f} seconds.")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def status_code_of(error):
+    """
+    Find the HTTP status code carried by an exception, if any.
+
+    Args:
+        error (Exception): The exception raised by the API call.
+
+    Returns:
+        int: The status code, or None.
+    """
+    for candidate in (error, getattr(error, "response", None)):
+        status = getattr(candidate, "status_code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def retry_after_of(error):
+    """
+    Read the Retry-After header from an exception's response, if it has one.
+
+    Both forms of the header are understood: a number of seconds and an HTTP date.
+
+    Args:
+        error (Exception): The exception raised by the API call.
+
+    Returns:
+        float: The number of seconds the provider asked us to wait, or None.
+    """
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Decides which failures to retry and how long to wait between attempts.
+
+    Errors with a retryable HTTP status (or none at all, such as dropped connections and timeouts) are retried
+    with exponential backoff and full jitter. Any other error, such as a 400 or 401, is raised straight away.
+    A Retry-After header from the provider replaces the computed backoff; if it asks for more than
+    max_retry_after seconds the request is given up on instead.
+
+    Attributes:
+        max_attempts (int): Attempts in total, including the first.
+        base_delay (float): The backoff before the second attempt, doubled for each attempt after that.
+        max_delay (float): The largest computed backoff.
+        max_retry_after (float): The longest Retry-After that will be waited out.
+        jitter (bool): Pick a random delay between zero and the backoff, so clients don't retry in lockstep.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, max_retry_after=60.0, jitter=True):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+
+    def is_retryable(self, error):
+        """
+        Classify an error as transient (worth retrying) or fatal.
+
+        Args:
+            error (Exception): The exception raised by the API call.
+
+        Returns:
+            bool: True if the request may succeed when retried.
+        """
+        if isinstance(error, CircuitOpenError):
+            return False
+        status = status_code_of(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        return any(name in type(error).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+    def delay(self, attempt, error):
+        """
+        Work out how long to wait before the next attempt.
+
+        Args:
+            attempt (int): The number of attempts made so far.
+            error (Exception): The exception raised by the last attempt.
+
+        Returns:
+            float: Seconds to wait, or None if the request shouldn't be retried.
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, backoff) if self.jitter else backoff
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a provider after repeated transient failures.
+
+    The breaker starts closed. After failure_threshold consecutive failures it opens, and requests are refused
+    (CircuitOpenError) for reset_timeout seconds. Then it is half-open: one trial request is let through, and
+    its outcome closes the breaker again or re-opens it.
+
+    Attributes:
+        provider (str): The provider the breaker guards.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a trial request.
+        failures (int): Consecutive failures so far.
+        opened_at (float): When the breaker opened (monotonic seconds), or None while closed.
+    """
+
+    def __init__(self, provider, failure_threshold=5, reset_timeout=30.0):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        "closed", "open" or "half-open".
+        """
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        """
+        Check that a request may be sent.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a trial request already running.
+        """
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+            raise CircuitOpenError(self.provider, retry_in)
+
+    def record_success(self):
+        """
+        Close the breaker after a successful request.
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        """
+        Count a transient failure, opening the breaker once failure_threshold is reached.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+# One breaker per provider, shared by every OracleInterpreter in the process
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    """
+    Return the circuit breaker for a provider, creating it on first use.
+
+    Args:
+        provider (str): The provider name, e.g. "anthropic" or "openai".
+
+    Returns:
+        CircuitBreaker: The provider's breaker.
+    """
+    with breakers_lock:
+        if provider not in breakers:
+            breakers[provider] = CircuitBreaker(provider)
+        return breakers[provider]
@@ -0,0 +1,148 @@
+# oracle_search.py
+# Google Custom Search client for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# One keep-alive connection pool per process, explicit timeouts, a short-lived result cache
+# keyed on the normalized query, and concurrent fan-out when a message asks for several searches.
+
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from oracle_cache import ResponseCache
+
+
+GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+
+def normalize_query(query):
+    """
+    Normalize a search query for caching: case and runs of whitespace don't change Google's results.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        str: The normalized query.
+    """
+    return " ".join(query.lower().split())
+
+
+class GoogleSearchClient:
+    """
+    Pooled, cached and concurrent client for the Google Custom Search API.
+
+    Attributes:
+        api_key (str): The Google API key.
+        search_engine_id (str): The Custom Search engine ID.
+        timeout (tuple): The (connect, read) timeout in seconds for each request.
+        max_workers (int): How many searches run at once in search_many.
+        cache (ResponseCache): Memory-only cache of results, keyed on the normalized query.
+        session (requests.Session): The keep-alive session every request goes through.
+    """
+
+    def __init__(self, api_key, search_engine_id, timeout=(3.05, 10), cache_ttl=600, cache_entries=256, max_workers=4):
+        self.api_key = api_key
+        self.search_engine_id = search_engine_id
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache = ResponseCache(path=None, max_entries=cache_entries, ttl=cache_ttl)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+
+    def search(self, query):
+        """
+        Run one search, serving repeats of a recent query from the cache.
+
+        Args:
+            query (str): The search query.
+
+        Returns:
+            dict: The decoded JSON response from the Custom Search API.
+
+        Raises:
+            requests.RequestException: If the request fails or times out.
+        """
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # requests URL-encodes the parameters, so queries with spaces, '&' or '#' survive intact
+        response = self.session.get(
+            GOOGLE_SEARCH_URL,
+            params={"key": self.api_key, "cx": self.search_engine_id, "q": query},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        results = response.json()
+
+        self.cache.put(key, results)
+        return results
+
+    def search_many(self, queries):
+        """
+        Run several searches concurrently, returning the results in the order of the queries.
+
+        Duplicate queries (after normalization) are only searched once. A search that fails is
+        reported as {"error": "..."} in its place instead of failing the others.
+
+        Args:
+            queries (list): The search queries.
+
+        Returns:
+            list: One result dict per query.
+        """
+        unique = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        if not unique:
+            return []
+
+        def run(query):
+            try:
+                return self.search(query)
+            except requests.RequestException as e:
+                return {"error": str(e)}
+
+        if len(unique) == 1:
+            results = {key: run(query) for key, query in unique.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique))) as executor:
+                futures = {key: executor.submit(run, query) for key, query in unique.items()}
+                results = {key: future.result() for key, future in futures.items()}
+
+        return [results[normalize_query(query)] for query in queries]
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
+
+
+# One client per process, so every OracleInterpreter (and server session) shares the pool and cache
+default_client = None
+default_client_lock = threading.Lock()
+
+
+def get_default_client(api_key, search_engine_id):
+    """
+    Return the process-wide search client, creating it on first use.
+
+    Args:
+        api_key (str): The Google API key.
+        search_engine_id (str): The Custom Search engine ID.
+
+    Returns:
+        GoogleSearchClient: The shared client.
+    """
+    global default_client
+    with default_client_lock:
+        if default_client is None:
+            default_client = GoogleSearchClient(api_key, search_engine_id)
+        return default_client
@@ -0,0 +1,535 @@
+# oracle_server.py
+# Headless multi-session server for the Oracle Easy Open Source Modular Interpreter System
+# An open source project by Mnemosyne Labs, a divison of Azoth Corp (2024)
+
+
+# Start it with 'python oracle.py serve'. Every session gets its own OracleInterpreter, its own
+# Open Interpreter instance and its own set of workspace directories, so one process can host many users.
+#
+#   GET    /sessions                  List sessions
+#   POST   /sessions                  Create a session    {"provider", "temperature", "max_tokens", "os"}
+#   GET    /sessions/{id}             Describe a session
+#   PATCH  /sessions/{id}             Change its settings (same fields as create)
+#   DELETE /sessions/{id}             Close it
+#   POST   /sessions/{id}/chat        {"message": "...", "stream": false}
+#                                     With "stream": true the reply is newline-delimited JSON chunks
+#   GET    /sessions/{id}/ws          WebSocket: send {"message": "..."}, receive chunks then {"type": "done"}
+#   GET    /metrics                   Request metrics in the Prometheus text format
+
+
+import os
+import json
+import asyncio
+import logging
+import shutil
+import time
+import uuid
+from aiohttp import web, WSMsgType
+import oracle_memory
+import oracle_metrics
+
+
+logger = logging.getLogger("server")
+
+# The directories each session gets, in OracleInterpreter's argument order
+SESSION_DIRECTORIES = ["antikythera", "alexandria", "aetherion", "athenium", "acheron", "OpenInterpreter"]
+
+
+class SessionClosedError(RuntimeError):
+    """
+    Raised by stream_chat when the session was closed while the chat waited for it.
+    """
+
+
+class OracleSession:
+    """
+    One isolated conversation hosted by the server.
+
+    Attributes:
+        id (str): The session ID.
+        interpreter (OracleInterpreter): The session's own interpreter.
+        provider (str): The selected LLM provider.
+        directory (str): The root of the session's workspace directories.
+        created (float): When the session was created (epoch seconds).
+        last_active (float): When the session was last used (epoch seconds).
+        lock (asyncio.Lock): Held while a chat is running, so turns happen one at a time.
+        closed (bool): Whether the session has been closed; a chat waiting for the lock then fails.
+    """
+
+    def __init__(self, session_id, interpreter, provider, directory):
+        self.id = session_id
+        self.interpreter = interpreter
+        self.provider = provider
+        self.directory = directory
+        self.created = time.time()
+        self.last_active = self.created
+        self.lock = asyncio.Lock()
+        self.closed = False
+
+    def touch(self):
+        """
+        Mark the session as used now.
+        """
+        self.last_active = time.time()
+
+    def describe(self):
+        """
+        Describe the session for API responses.
+
+        Returns:
+            dict: The session's ID, settings and timestamps.
+        """
+        llm = self.interpreter.interpreter.llm
+        return {
+            "id": self.id,
+            "provider": self.provider,
+            "model": llm.model_name,
+            "temperature": llm.temperature,
+            "max_tokens": llm.max_tokens,
+            "os": self.interpreter.interpreter.os,
+            "directory": self.directory,
+            "created": self.created,
+            "last_active": self.last_active,
+            "busy": self.lock.locked(),
+        }
+
+
+class SessionManager:
+    """
+    Creates, tracks and evicts server sessions.
+
+    The sessions dict is only changed on the event loop (register, detach, evict_idle); the slow parts, building
+    a session's interpreter (build) and closing it (dispose), run in worker threads and never touch it.
+
+    Attributes:
+        interpreter_factory (callable): Builds an OracleInterpreter (normally the OracleInterpreter class, whose
+            PROVIDERS are the providers a session can use); called with the six session directories and
+            shared_interpreter=False.
+        sessions_directory (str): Where session workspaces are created.
+        idle_timeout (float): Seconds of inactivity after which a session is evicted.
+        max_sessions (int): The most sessions that may be open at once.
+        keep_workspaces (bool): Keep a session's directories on disk after it is closed.
+        cache_mode (str): The response cache mode given to each session's interpreter.
+        failover (bool): Whether sessions fail over from Anthropic to OpenAI.
+        memory_context_tokens (int): The memory-excerpt budget given to each session's interpreter.
+        execution_timeout (float): Seconds a session's code block may run before it is stopped.
+        sessions (dict): The open sessions, keyed by ID.
+    """
+
+    def __init__(self, interpreter_factory, sessions_directory="oracle_sessions", idle_timeout=1800, max_sessions=100, keep_workspaces=True, cache_mode="auto", failover=False, memory_context_tokens=1000, execution_timeout=60):
+        self.interpreter_factory = interpreter_factory
+        self.sessions_directory = sessions_directory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.keep_workspaces = keep_workspaces
+        self.cache_mode = cache_mode
+        self.failover = failover
+        self.memory_context_tokens = memory_context_tokens
+        self.execution_timeout = execution_timeout
+        self.sessions = {}
+
+    def create(self, provider="OpenAI", **settings):
+        """
+        Create and register a session with its own interpreter and workspace directories.
+
+        Args:
+            provider (str, optional): One of OracleInterpreter.PROVIDERS. Defaults to "OpenAI".
+            **settings: Optional temperature, max_tokens and os settings; see apply_settings.
+
+        Returns:
+            OracleSession: The new session.
+
+        Raises:
+            ValueError: If the provider or a setting is invalid.
+            RuntimeError: If max_sessions sessions are already open.
+        """
+        return self.register(self.build(provider, **settings))
+
+    def build(self, provider="OpenAI", **settings):
+        """
+        Create a session, without registering it. Slow (it builds an interpreter), so the server runs it in a
+        worker thread.
+
+        Raises:
+            ValueError: If the provider or a setting is invalid.
+            RuntimeError: If max_sessions sessions are already open.
+        """
+        providers = self.interpreter_factory.PROVIDERS
+        if provider not in providers:
+            raise ValueError(f"Unknown provider '{provider}'. Choose one of: {', '.join(providers)}")
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"The server is already hosting {self.max_sessions} sessions.")
+
+        session_id = uuid.uuid4().hex
+        directory = os.path.join(self.sessions_directory, session_id)
+        directories = [os.path.join(directory, name) for name in SESSION_DIRECTORIES]
+        for path in directories:
+            os.makedirs(path, exist_ok=True)
+
+        interpreter = self.interpreter_factory(*directories, shared_interpreter=False)
+        interpreter.logs_directory = os.path.join(directory, "oracle_logs")
+        interpreter.cache_mode = self.cache_mode
+        interpreter.failover = self.failover
+        interpreter.memory_context_tokens = self.memory_context_tokens
+        interpreter.execution_timeout = self.execution_timeout
+
+        session = OracleSession(session_id, interpreter, provider, directory)
+        try:
+            self.apply_settings(session, provider=provider, **settings)
+        except (ValueError, TypeError):
+            self.dispose(session)
+            raise
+        return session
+
+    def register(self, session):
+        """
+        Add a built session to the open sessions.
+
+        Raises:
+            RuntimeError: If max_sessions sessions are already open; the session is not added.
+        """
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"The server is already hosting {self.max_sessions} sessions.")
+        self.sessions[session.id] = session
+        logger.info(f"Created session {session.id} ({session.provider})")
+        return session
+
+    def apply_settings(self, session, provider=None, temperature=None, max_tokens=None, os=None):
+        """
+        Change a session's provider and sampling settings. Settings left as None are unchanged.
+
+        Args:
+            session (OracleSession): The session to change.
+            provider (str, optional): One of OracleInterpreter.PROVIDERS.
+            temperature (float, optional): The sampling temperature, between 0 and 2.
+            max_tokens (int, optional): The completion token limit.
+            os (bool, optional): Enable OS mode (and with it the web browser).
+
+        Raises:
+            ValueError: If a setting is invalid.
+        """
+        session.interpreter.apply_settings(provider=provider, temperature=temperature, max_tokens=max_tokens, os=os)
+        if provider is not None:
+            session.provider = provider
+
+    def get(self, session_id):
+        """
+        Look up an open session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            OracleSession: The session, or None if there is no such session.
+        """
+        return self.sessions.get(session_id)
+
+    def list(self):
+        """
+        List the open sessions.
+
+        Returns:
+            list: The OracleSession objects, oldest first.
+        """
+        return sorted(self.sessions.values(), key=lambda session: session.created)
+
+    def close(self, session_id):
+        """
+        Close a session, saving its conversation log.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            bool: True if the session existed.
+        """
+        session = self.detach(session_id)
+        if session is None:
+            return False
+        self.dispose(session)
+        return True
+
+    def detach(self, session_id):
+        """
+        Remove a session from the open sessions and mark it closed, leaving its interpreter to dispose.
+
+        Returns:
+            OracleSession: The session, or None if there is no such session.
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.closed = True
+        return session
+
+    def dispose(self, session):
+        """
+        Close a detached session's interpreter, saving its conversation log, free its memory index, and remove
+        its workspace unless keep_workspaces is set. Slow, so the server runs it in a worker thread.
+        """
+        session.interpreter.close()
+        oracle_memory.release_memory_index(session.interpreter.memory_directories)
+        if not self.keep_workspaces:
+            shutil.rmtree(session.directory, ignore_errors=True)
+        logger.info(f"Closed session {session.id}")
+
+    def evict_idle(self):
+        """
+        Detach every session that has been idle for longer than idle_timeout. Busy sessions are kept.
+
+        Called on the event loop, so no chat can take a session's lock between the check and the detach.
+
+        Returns:
+            list: The evicted sessions, to dispose.
+        """
+        cutoff = time.time() - self.idle_timeout
+        evicted = [session for session in self.list() if session.last_active < cutoff and not session.lock.locked()]
+        for session in evicted:
+            logger.info(f"Evicting idle session {session.id}")
+            self.detach(session.id)
+        return evicted
+
+    def close_all(self):
+        """
+        Close every session.
+        """
+        for session_id in list(self.sessions):
+            self.close(session_id)
+
+    async def run_evictor(self, interval=60):
+        """
+        Evict idle sessions every interval seconds, forever. Only disposing of them runs in a worker thread.
+
+        Args:
+            interval (float, optional): Seconds between sweeps. Defaults to 60.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for session in self.evict_idle():
+                try:
+                    await asyncio.to_thread(self.dispose, session)
+                except Exception:
+                    logger.exception(f"Failed to close evicted session {session.id}")
+
+
+async def stream_chat(session, message):
+    """
+    Run one chat turn for a session, yielding its response chunks.
+
+    Turns within a session are serialized by its lock; the interaction is logged once the reply is complete.
+
+    Args:
+        session (OracleSession): The session.
+        message (str): The user's message.
+
+    Yields:
+        dict: The chunks from OracleInterpreter.achat_stream.
+    """
+    async with session.lock:
+        if session.closed:
+            raise SessionClosedError("The session was closed.")
+        session.touch()
+        response_parts = []
+        try:
+            async for chunk in session.interpreter.achat_stream(message):
+                response_parts.append(chunk["content"])
+                yield chunk
+        finally:
+            session.interpreter.log_interaction(message, "".join(response_parts))
+            session.touch()
+
+
+def session_settings(body):
+    """
+    Pick the session settings out of a request body.
+
+    Args:
+        body (dict): The JSON request body.
+
+    Returns:
+        dict: The provider, temperature, max_tokens and os fields that were given.
+    """
+    return {key: body[key] for key in ("provider", "temperature", "max_tokens", "os") if key in body}
+
+
+async def read_json(request):
+    """
+    Read a JSON object from a request body; an empty body reads as {}.
+
+    Raises:
+        web.HTTPBadRequest: If the body isn't a JSON object.
+    """
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "The request body must be JSON."}), content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({"error": "The request body must be a JSON object."}), content_type="application/json")
+    return body
+
+
+def error_response(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+def create_app(manager):
+    """
+    Build the aiohttp application serving the session API.
+
+    Args:
+        manager (SessionManager): The session manager to serve.
+
+    Returns:
+        web.Application: The application.
+    """
+    routes = web.RouteTableDef()
+
+    def find_session(request, touch=False):
+        session = manager.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "No such session."}), content_type="application/json")
+        if touch:
+            # A session about to chat isn't idle, even before its chat takes the lock
+            session.touch()
+        return session
+
+    @routes.get("/metrics")
+    async def metrics(request):
+        text = oracle_metrics.registry.render()
+        text += "# HELP oracle_sessions_open Sessions currently open.\n# TYPE oracle_sessions_open gauge\n"
+        text += f"oracle_sessions_open {len(manager.sessions)}\n"
+        return web.Response(text=text, content_type="text/plain", headers={"X-Prometheus-Format": "0.0.4"})
+
+    @routes.get("/sessions")
+    async def list_sessions(request):
+        return web.json_response({"sessions": [session.describe() for session in manager.list()]})
+
+    @routes.post("/sessions")
+    async def create_session(request):
+        body = await read_json(request)
+        try:
+            session = await asyncio.to_thread(manager.build, **session_settings(body))
+        except (ValueError, TypeError) as e:
+            return error_response(400, str(e))
+        except RuntimeError as e:
+            return error_response(503, str(e))
+        try:
+            manager.register(session)
+        except RuntimeError as e:
+            await asyncio.to_thread(manager.dispose, session)
+            return error_response(503, str(e))
+        return web.json_response(session.describe(), status=201)
+
+    @routes.get("/sessions/{session_id}")
+    async def get_session(request):
+        return web.json_response(find_session(request).describe())
+
+    @routes.patch("/sessions/{session_id}")
+    async def update_session(request):
+        session = find_session(request)
+        body = await read_json(request)
+        try:
+            manager.apply_settings(session, **session_settings(body))
+        except (ValueError, TypeError) as e:
+            return error_response(400, str(e))
+        return web.json_response(session.describe())
+
+    @routes.delete("/sessions/{session_id}")
+    async def close_session(request):
+        session = manager.detach(request.match_info["session_id"])
+        if session is None:
+            return error_response(404, "No such session.")
+        await asyncio.to_thread(manager.dispose, session)
+        return web.Response(status=204)
+
+    @routes.post("/sessions/{session_id}/chat")
+    async def chat(request):
+        session = find_session(request, touch=True)
+        body = await read_json(request)
+        message = body.get("message")
+        if not isinstance(message, str) or not message:
+            return error_response(400, "'message' must be a non-empty string.")
+
+        if not body.get("stream"):
+            try:
+                response_parts = [chunk["content"] async for chunk in stream_chat(session, message)]
+            except SessionClosedError as e:
+                return error_response(404, str(e))
+            return web.json_response({"session": session.id, "response": "".join(response_parts)})
+
+        # Stream the chunks as newline-delimited JSON
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        try:
+            async for chunk in stream_chat(session, message):
+                await response.write((json.dumps(chunk) + "\n").encode())
+            await response.write((json.dumps({"type": "done"}) + "\n").encode())
+        except Exception as e:
+            logger.error(f"Chat failed in session {session.id}: {e}")
+            await response.write((json.dumps({"type": "error", "content": str(e)}) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    @routes.get("/sessions/{session_id}/ws")
+    async def websocket(request):
+        session = find_session(request, touch=True)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                message = json.loads(msg.data).get("message")
+            except (json.JSONDecodeError, AttributeError):
+                message = None
+            if not isinstance(message, str) or not message:
+                await ws.send_json({"type": "error", "content": "Send {\"message\": \"...\"}."})
+                continue
+
+            try:
+                async for chunk in stream_chat(session, message):
+                    await ws.send_json(chunk)
+                await ws.send_json({"type": "done"})
+            except Exception as e:
+                logger.error(f"Chat failed in session {session.id}: {e}")
+                await ws.send_json({"type": "error", "content": str(e)})
+
+        return ws
+
+    app = web.Application()
+    app.add_routes(routes)
+
+    async def start_evictor(app):
+        app["evictor"] = asyncio.create_task(manager.run_evictor(min(60, manager.idle_timeout)))
+
+    async def stop_evictor(app):
+        app["evictor"].cancel()
+        sessions = [manager.detach(session_id) for session_id in list(manager.sessions)]
+        for session in sessions:
+            await asyncio.to_thread(manager.dispose, session)
+
+    app.on_startup.append(start_evictor)
+    app.on_cleanup.append(stop_evictor)
+    return app
+
+
+def serve(interpreter_factory, host="127.0.0.1", port=8765, sessions_directory="oracle_sessions", idle_timeout=1800, max_sessions=100, cache_mode="auto", failover=False, memory_context_tokens=1000, execution_timeout=60):
+    """
+    Run the session server until interrupted.
+
+    Args:
+        interpreter_factory (callable): Builds an OracleInterpreter (normally the OracleInterpreter class).
+        host (str, optional): The interface to listen on. Defaults to "127.0.0.1".
+        port (int, optional): The port to listen on. Defaults to 8765.
+        sessions_directory (str, optional): Where session workspaces are created. Defaults to "oracle_sessions".
+        idle_timeout (float, optional): Seconds of inactivity before a session is evicted. Defaults to 1800.
+        max_sessions (int, optional): The most sessions that may be open at once. Defaults to 100.
+        cache_mode (str, optional): The response cache mode for every session. Defaults to "auto".
+        failover (bool, optional): Fail over from Anthropic to OpenAI while Anthropic is unavailable. Defaults to False.
+        memory_context_tokens (int, optional): Estimated tokens of memory excerpts put in front of each message. Defaults to 1000.
+        execution_timeout (float, optional): Seconds a code block may run before it is stopped. Defaults to 60.
+    """
+    manager = SessionManager(interpreter_factory, sessions_directory, idle_timeout, max_sessions, cache_mode=cache_mode, failover=failover, memory_context_tokens=memory_context_tokens, execution_timeout=execution_timeout)
+    web.run_app(create_app(manager), host=host, port=port)